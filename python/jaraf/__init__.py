@@ -1,19 +1,44 @@
 """
 Application framework package.
+
+Optional subsystems (the event loop, metrics, parallel maps, profiling,
+resource sampling, schedules, checkpoints, manifests and atomic output) are
+imported when they are first used rather than with the package, so that
+applications that don't use them start faster.
 """
 
 import argparse
+import collections
 import logging
 import os
 import pwd
 import resource
+import signal
 import sys
+import threading
 import time
 import traceback
 
-from jaraf.codes import AppStatusOkay, AppStatusError
-from jaraf.errors import AppError
+from jaraf.codes import (AppStatusArgumentError,
+                         AppStatusError,
+                         AppStatusInitializationError,
+                         AppStatusInterrupted,
+                         AppStatusLocked,
+                         AppStatusOkay,
+                         AppStatusStalled)
+from jaraf.errors import (AppArgumentError,
+                          AppError,
+                          AppInitializationError,
+                          AppInterruptedError,
+                          AppLockedError)
+from jaraf.lock import (POLICIES as LOCK_POLICIES,
+                        InstanceLock,
+                        default_lock_dir)
+from jaraf.progress import Progress
+from jaraf.sharding import METHODS as SHARD_METHODS, shard_items
+from jaraf.timers import TimerRegistry
 from jaraf.version import VERSION
+from jaraf.watchdog import Watchdog
 
 # Default logger name.
 JARAF_LOGGER_NAME = "jaraf:app"
@@ -39,6 +64,167 @@ class App(object):
 
         app = MyApp(log_level="DEBUG", silent=True, log_level="DEBUG")
 
+    The :meth:`main()` method can be run under :mod:`cProfile` with the
+    ``--profile [PATH]`` option or the *profile* constructor parameter. The
+    stats are written to a ``.pstats`` file next to the log (or to PATH) and the
+    top functions are listed in the footer. The listing is controlled with the
+    ``--profile-sort`` (*profile_sort*, default="cumulative"),
+    ``--profile-top`` (*profile_top*, default=20) and ``--profile-restrict``
+    (*profile_restrict*, a list of regular expressions) options.
+
+    Memory allocations made while :meth:`main()` runs can be traced with
+    :mod:`tracemalloc` using the ``--trace-memory`` option or the
+    *trace_memory* constructor parameter. The footer lists the top allocation
+    sites and the sites that grew the most between the first and last
+    snapshots. Extra snapshots can be taken at points of interest with
+    :meth:`memory_snapshot()` or every N seconds with
+    ``--trace-memory-interval`` (*trace_memory_interval*). Snapshots can be
+    dumped to a directory for offline comparison with ``--trace-memory-dump``
+    (*trace_memory_dump*). The number of stored frames and listed sites are set
+    with ``--trace-memory-frames`` (*trace_memory_frames*, default=1) and
+    ``--trace-memory-top`` (*trace_memory_top*, default=10).
+
+    On Linux, a background thread can sample the RSS, CPU utilization, thread
+    count, open file descriptors and child process count of the application
+    while :meth:`main()` runs. Sampling is enabled with the
+    ``--sample-resources [PATH]`` option or the *sample_resources* constructor
+    parameter, and the interval is set with ``--sample-interval``
+    (*sample_interval*, default=1 second). Samples are written to a CSV file
+    next to the log (or to PATH, as JSON lines if it ends with ``.jsonl``) and
+    the peaks and percentiles are summarized in the footer.
+
+    A machine-readable JSON run report can be written at exit with the
+    ``--run-report PATH`` option or the *run_report* constructor parameter. It
+    contains the footer stats, the start and end timestamps, the arguments,
+    user, host, the process and child resource usage, and any custom values
+    recorded with :meth:`set_run_metric()`. The report is written atomically so
+    readers never see a partial file.
+
+    Long loops can report their progress by iterating over
+    :meth:`progress()`, which logs the item count, rate, ETA and per-item time
+    percentiles every few seconds at a negligible cost per item, and
+    summarizes each loop in the footer::
+
+        def main(self):
+            for record in self.progress(records, total=count, name="records"):
+                self.process(record)
+
+    Output files opened with :meth:`open_output()` are written atomically
+    through large buffers, and optionally compressed as they are written. The
+    number of output files, the bytes written before and after compression
+    and the write throughput are added to the run stats and the footer.
+
+    Counters, gauges and histograms can be registered with :meth:`counter()`,
+    :meth:`gauge()` and :meth:`histogram()` and updated from :meth:`main()`.
+    The run stats are registered automatically as ``jaraf_*`` gauges. Metrics
+    are exported in the Prometheus textfile collector format with the
+    ``--metrics-textfile PATH`` option (*metrics_textfile*) and to StatsD with
+    the ``--statsd HOST:PORT`` option (*statsd*, with *statsd_prefix*). They
+    are exported at exit and also every ``--metrics-interval`` seconds
+    (*metrics_interval*) if set.
+
+    Work can be spread over threads or processes with :meth:`map()`, which
+    logs the items that fail without stopping the others. Large line-oriented
+    files can be scanned the same way with :meth:`map_chunks()`, which
+    memory-maps the file and gives each worker newline-aligned chunks of it.
+    The item (or chunk) counts and throughput of each mapped function are
+    listed in the footer.
+
+    :meth:`main()` may be a coroutine function (``async def main(self)``), in
+    which case it is run on an event loop managed by the application, with the
+    same exception handling as a regular :meth:`main()`. Tasks that are still
+    pending when :meth:`main()` returns are cancelled. The loop is created
+    with the default event loop policy, or the policy given with
+    ``--loop-policy MODULE:NAME`` or the *loop_policy* constructor parameter
+    (a policy instance, class or "module:name" string). With
+    ``--loop-lag-interval SECS`` (*loop_lag_interval*), the loop lag (how late
+    the loop runs callbacks because of blocking code) is measured every SECS
+    seconds and summarized in the footer.
+
+    Instead of running :meth:`main()` once, an application can run as a
+    long-lived service that calls :meth:`main()` repeatedly, so that warm state
+    (e.g. connections and caches) is reused across runs. Service mode is
+    enabled with either ``--service-interval SECS`` (*service_interval*), which
+    runs every SECS seconds, or ``--service-schedule EXPR``
+    (*service_schedule*), which runs on a five field cron schedule. Runs never
+    overlap; a run that is still going when the next one is due causes the
+    missed runs to be skipped. A random delay of up to
+    ``--service-jitter SECS`` (*service_jitter*) is added to each start time,
+    and the service stops after ``--service-max-iterations N``
+    (*service_max_iterations*) runs or when a shutdown is requested. The
+    current run is always allowed to finish. An exception raised by
+    :meth:`main()` is logged and fails only that run; the application status
+    is the status of the last run.
+
+    While the application runs, SIGTERM and SIGINT request a cooperative
+    shutdown: :attr:`shutdown_requested` becomes True (and
+    :attr:`shutdown_event` is set) so that :meth:`main()` can stop at a
+    convenient point, and the footer is output as usual. A second SIGTERM or
+    SIGINT raises an :class:`~jaraf.errors.AppInterruptedError` with the
+    ``AppStatusInterrupted`` exit status. SIGUSR1 logs the stacks of all
+    threads, the current resource usage and the phase timers without stopping
+    the application. Signal handlers are only installed when :meth:`run()` is
+    called from the main thread, and can be disabled with the
+    *signal_handlers* constructor parameter.
+
+    Overlapping runs of the same application (e.g. a cron job that runs longer
+    than its interval) are prevented with ``--instance-lock POLICY``
+    (*instance_lock*), which takes an exclusive :func:`fcntl.flock` lock on
+    ``APPNAME.lock`` in ``--lock-dir`` (*lock_dir*, default=the per-user
+    directory returned by :func:`~jaraf.lock.default_lock_dir()`) before
+    :meth:`main()` runs. With ``--lock-by-args`` (*lock_by_args*), the lock
+    name also includes a hash of the command-line arguments so that runs
+    with different arguments may overlap. If another
+    instance holds the lock, the "skip" policy exits right away, "wait" waits
+    up to ``--lock-timeout SECS`` (*lock_timeout*, default=forever) and "kill"
+    waits up to the timeout (default=none), then terminates the other
+    instance. A run that doesn't get the lock exits with the
+    ``AppStatusLocked`` status. The time spent waiting is listed in the
+    footer.
+
+    Runs that stop making progress (e.g. on a hung network read or a deadlock)
+    are detected with ``--watchdog SECS`` (*watchdog*): :meth:`main()` calls
+    :meth:`heartbeat()` as it makes progress, and if no heartbeat arrives for
+    SECS seconds, the stacks of all threads and the current resource usage
+    are logged. With ``--watchdog-abort`` (*watchdog_abort*), the application
+    then exits immediately with the ``AppStatusStalled`` status.
+
+    Long jobs can record their progress in :attr:`checkpoint`, a durable
+    :class:`~jaraf.checkpoint.CheckpointStore` of completed work units and
+    small state values, stored next to the log (or in
+    ``--checkpoint PATH``/*checkpoint*). When a run with ``--resume``
+    (*resume*) follows a failed or interrupted run, the units completed by the
+    earlier run are skipped. Without ``--resume``, an existing checkpoint is
+    discarded. The checkpoint is deleted when a run succeeds::
+
+        def main(self):
+            for path in self.checkpoint.skip_done(self.input_paths):
+                self.process(path)
+
+    Large input lists can be given as a manifest file with ``--manifest PATH``
+    (*manifest*) instead of command-line arguments, which are limited in size
+    and kept in memory. The manifest lists one item per line, or per NUL
+    byte as written by ``find -print0``, may be gzip-compressed, and is read
+    from the standard input if PATH is "-". :attr:`manifest` iterates over
+    the items lazily, can count them and skip the first ones cheaply, and the
+    number of items read is listed in the footer::
+
+        $ find /data -name "*.csv" -print0 | myapp --manifest -
+
+    The same input can be split across several instances (e.g. on different
+    machines) with ``--shard-index I`` and ``--shard-count N``
+    (*shard_index*, *shard_count*): :meth:`shard()` then yields only the
+    items of shard I of N, from the manifest, the extra command-line arguments
+    or any iterable. Items are assigned by a stable hash of their key,
+    so every instance computes the same partition independently, or with
+    ``--shard-method range`` (*shard_method*), by contiguous position ranges,
+    which needs a manifest file rather than the standard input.
+    Without sharding options, :meth:`shard()` yields all of the items::
+
+        def main(self):
+            for path in self.shard():
+                self.process(path)
+
     """
 
     # __metaclass__ = abc.ABCMeta
@@ -70,6 +256,111 @@ class App(object):
         # Application exit code.
         self._status = AppStatusOkay
 
+        # Profiling parameters. A profile path of "" means that profiling is
+        # enabled with the default output path.
+        profile = kwargs.get("profile")
+        self._profile = "" if profile is True else profile
+        self._profile_sort = kwargs.get("profile_sort", "cumulative")
+        self._profile_top = kwargs.get("profile_top", 20)
+        self._profile_restrict = kwargs.get("profile_restrict", [])
+        self._profiler = None
+
+        # Memory tracing parameters.
+        self._trace_memory = kwargs.get("trace_memory", False)
+        self._trace_memory_dump = kwargs.get("trace_memory_dump")
+        self._trace_memory_frames = kwargs.get("trace_memory_frames", 1)
+        self._trace_memory_interval = kwargs.get("trace_memory_interval")
+        self._trace_memory_top = kwargs.get("trace_memory_top", 10)
+        self._memory_tracer = None
+
+        # Resource sampling parameters. A sample path of "" means that sampling
+        # is enabled with the default output path.
+        sample_resources = kwargs.get("sample_resources")
+        self._sample_resources = "" if sample_resources is True \
+            else sample_resources
+        self._sample_interval = kwargs.get("sample_interval", 1.0)
+        self._sampler = None
+
+        # Named phase timers.
+        self._timers = TimerRegistry()
+
+        # Checkpoint parameters.
+        self._checkpoint = None
+        self._checkpoint_path = kwargs.get("checkpoint")
+        self._checkpoint_removed = False
+        self._main_completed = False
+        self._resume = kwargs.get("resume", False)
+
+        # Watchdog parameters.
+        self._last_heartbeat = time.monotonic()
+        self._watchdog = None
+        self._watchdog_abort = kwargs.get("watchdog_abort", False)
+        self._watchdog_timeout = kwargs.get("watchdog")
+
+        # Event loop parameters, used when main() is a coroutine function.
+        self._loop = None
+        self._loop_lag_interval = kwargs.get("loop_lag_interval")
+        self._loop_lag_monitor = None
+        self._loop_policy = kwargs.get("loop_policy")
+
+        # Input manifest parameters.
+        self._manifest = None
+        self._manifest_path = kwargs.get("manifest")
+
+        # Loops wrapped with progress().
+        self._progress = []
+
+        # Totals of the output files committed by open_output().
+        self._output_files = 0
+        self._output_bytes = 0
+        self._output_stored_bytes = 0
+        self._output_secs = 0.0
+
+        # Parallel map stats, keyed by function name.
+        self._map_stats = collections.OrderedDict()
+
+        # Run report parameters.
+        self._run_args = None
+        self._run_metrics = {}
+        self._run_report = kwargs.get("run_report")
+        self._run_stats = None
+
+        # Metrics parameters.
+        self._metrics = None
+        self._metrics_exporters = None
+        self._metrics_interval = kwargs.get("metrics_interval")
+        self._metrics_textfile = kwargs.get("metrics_textfile")
+        self._statsd = kwargs.get("statsd")
+        self._statsd_prefix = kwargs.get("statsd_prefix", "")
+
+        # Service mode parameters.
+        self._service_interval = kwargs.get("service_interval")
+        self._service_schedule = kwargs.get("service_schedule")
+        self._service_jitter = kwargs.get("service_jitter", 0)
+        self._service_max_iterations = kwargs.get("service_max_iterations")
+        self._service_iteration = 0
+        self._service_failures = 0
+        self._service_overruns = 0
+
+        # Instance lock parameters.
+        self._instance_lock = kwargs.get("instance_lock")
+        self._lock = None
+        self._lock_by_args = kwargs.get("lock_by_args", False)
+        self._lock_dir = kwargs.get("lock_dir")
+        self._lock_timeout = kwargs.get("lock_timeout")
+
+        # Sharding parameters.
+        self._shard_count = kwargs.get("shard_count")
+        self._shard_index = kwargs.get("shard_index")
+        self._shard_method = kwargs.get("shard_method", "hash")
+        self._shard_items = 0
+
+        # Signal handling parameters.
+        self._signal_handlers = kwargs.get("signal_handlers", True)
+        self._previous_signal_handlers = {}
+        self._shutdown_event = threading.Event()
+        self._shutdown_signal = None
+
     def add_arguments(self, parser):
         """
         *Virtual.* Optional method that can be defined by subclasses to add
@@ -91,6 +382,49 @@ class App(object):
         """
         pass
 
+    @property
+    def checkpoint(self):
+        """
+        *Property.* Return the :class:`~jaraf.checkpoint.CheckpointStore` of
+        the application, opening it the first time. Completed units are
+        marked with :meth:`~jaraf.checkpoint.CheckpointStore.mark_done()` or
+        :meth:`~jaraf.checkpoint.CheckpointStore.skip_done()`, and state is
+        saved with :meth:`~jaraf.checkpoint.CheckpointStore.set_state()`.
+        """
+        if self._checkpoint is None:
+            from jaraf.checkpoint import CheckpointStore
+
+            path = self._get_checkpoint_path()
+            if not self._resume and os.path.exists(path):
+                self.log.warning("Discarding checkpoint %s (use --resume to "
+                                 "resume from it)", path)
+                CheckpointStore(path).remove()
+            self._checkpoint = CheckpointStore(path)
+            if self._checkpoint.resumed:
+                self.log.info("Resuming from checkpoint %s with %d completed "
+                              "units", path, self._checkpoint.resumed)
+        return self._checkpoint
+
+    def counter(self, name, help=""):
+        """
+        * *name* (str): Metric name.
+        * *help* (str): Metric description.
+
+        Return the named :class:`~jaraf.metrics.Counter`, registering it if
+        needed.
+        """
+        return self.metrics.counter(name, help)
+
+    def gauge(self, name, help=""):
+        """
+        * *name* (str): Metric name.
+        * *help* (str): Metric description.
+
+        Return the named :class:`~jaraf.metrics.Gauge`, registering it if
+        needed.
+        """
+        return self.metrics.gauge(name, help)
+
     def get_log_formatter(self):
         """
         Return a log formatter object.
@@ -126,6 +460,28 @@ class App(object):
         else:
             return logging.StreamHandler(sys.stdout)
 
+    def heartbeat(self):
+        """
+        Record that the application is making progress, for the stall
+        watchdog. This only stores a timestamp, so it is cheap enough to call
+        for every item of an inner loop.
+        """
+        self._last_heartbeat = time.monotonic()
+
+    def histogram(self, name, help="", buckets=None):
+        """
+        * *name* (str): Metric name.
+        * *help* (str): Metric description.
+        * *buckets* (list): Bucket upper bounds. Defaults to
+          :data:`jaraf.metrics.DEFAULT_BUCKETS`.
+
+        Return the named :class:`~jaraf.metrics.Histogram`, registering it if
+        needed.
+        """
+        if buckets is None:
+            return self.metrics.histogram(name, help)
+        return self.metrics.histogram(name, help, buckets)
+
     def init_logging(self):
         """
         Configure and initialize output logging. Subclasses should not call this
@@ -140,8 +496,11 @@ class App(object):
         handler.setFormatter(formatter)
         self.log.addHandler(handler)
 
-    def log_exception(self):
+    def log_exception(self, exc_text=None):
         """
+        * *exc_text* (str): Formatted exception to log instead of the current
+          exception, e.g. one raised in another process.
+
         Convenience method that can be used to log the current exception. This
         is typically used inside an except block, and ensures that the exception
         is logged with the proper formatting::
@@ -153,7 +512,9 @@ class App(object):
                 self.log_exception()
 
         """
-        for line in traceback.format_exc().split("\n"):
+        if exc_text is None:
+            exc_text = traceback.format_exc()
+        for line in exc_text.split("\n"):
             if line:
                 self.log.error("> %s", line)
 
@@ -171,6 +532,174 @@ class App(object):
         """
         raise NotImplementedError
 
+    @property
+    def manifest(self):
+        """
+        *Property.* Return the input :class:`~jaraf.manifest.Manifest` given
+        with ``--manifest``, or None.
+        """
+        if self._manifest is None and self._manifest_path is not None:
+            from jaraf.manifest import Manifest
+
+            self._manifest = Manifest(self._manifest_path)
+        return self._manifest
+
+    def map(self, func, iterable, workers=None, backend="thread",
+            chunksize=1, ordered=True):
+        """
+        * *func* (callable): Function called with each item. With the process
+          backend, the function and items must be picklable, so *func* should
+          be a module-level function rather than a method.
+        * *iterable*: Items to process. Items are read as workers become free,
+          so the iterable may be larger than memory.
+        * *workers* (int): Maximum number of worker threads or processes,
+          defaulting to the :mod:`concurrent.futures` executor default.
+        * *backend* (str): "thread" for I/O-bound work or "process" for
+          CPU-bound work.
+        * *chunksize* (int): Number of items sent to a worker at a time. Larger
+          chunks reduce the overhead of the process backend for small items.
+        * *ordered* (bool): If True, results are yielded in input order,
+          otherwise as soon as they are completed.
+
+        Call a function on every item in parallel and yield the results. An
+        item that raises an exception is logged with :meth:`log_exception()`,
+        sets the application status to an error and produces no result, but
+        doesn't stop the other items::
+
+            def main(self):
+                for result in self.map(fetch, urls, workers=16):
+                    self.save(result)
+
+        Results must be consumed for the work to progress. Stopping early
+        cancels the items that haven't started. If a worker process dies, the
+        items in flight are logged as failures and the rest are skipped.
+
+        *Returns:* A generator of the function results.
+        """
+        from jaraf.parallel import MapStats, parallel_map
+
+        name = getattr(func, "__name__", repr(func))
+        stats = self._map_stats.get(name)
+        if stats is None:
+            stats = self._map_stats[name] = MapStats()
+
+        def on_error(item, exc_text):
+            self._status = AppStatusError
+            self.log.error("Unable to process %s item %.200r", name, item)
+            self.log_exception(exc_text)
+
+        return parallel_map(func, iterable, workers=workers, backend=backend,
+                            chunksize=chunksize, ordered=ordered,
+                            on_error=on_error, stats=stats)
+
+    def map_chunks(self, path, func, workers=None, backend="process",
+                   chunk_size=None, ordered=True,
+                   encoding="utf-8"):
+        """
+        * *path* (str): Path of a line-oriented file.
+        * *func* (callable): Function called with the list of lines of each
+          chunk, without their newlines. With the process backend, the
+          function must be picklable, so it should be a module-level function.
+        * *workers* (int): Maximum number of worker processes or threads.
+        * *backend* (str): "process" for CPU-bound parsing or "thread" for
+          functions that release the GIL.
+        * *chunk_size* (int): Approximate chunk size in bytes
+          (default=:data:`~jaraf.reader.DEFAULT_CHUNK_SIZE`).
+        * *ordered* (bool): If True, results are yielded in file order,
+          otherwise as soon as they are completed.
+        * *encoding* (str): Encoding of the lines, or None to pass them as
+          bytes.
+
+        Scan a file in parallel, calling a function on newline-aligned chunks
+        of it with :func:`~jaraf.reader.map_chunks()`. Results are combined
+        by the caller, e.g. with a loop or :func:`functools.reduce()`::
+
+            def main(self):
+                counts = collections.Counter()
+                for chunk_counts in self.map_chunks(path, count_words):
+                    counts.update(chunk_counts)
+
+        A chunk that raises an exception is logged with
+        :meth:`log_exception()` and sets the application status to an error,
+        but doesn't stop the other chunks.
+
+        *Returns:* A generator of the function results, one per chunk.
+        """
+        from jaraf.parallel import MapStats
+        from jaraf.reader import DEFAULT_CHUNK_SIZE, map_chunks
+
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+
+        name = "%s chunks" % getattr(func, "__name__", repr(func))
+        stats = self._map_stats.get(name)
+        if stats is None:
+            stats = self._map_stats[name] = MapStats()
+
+        def on_error(chunk_range, exc_text):
+            self._status = AppStatusError
+            self.log.error("Unable to process bytes %d-%d of %s with %s",
+                           chunk_range[0], chunk_range[1], path, name)
+            self.log_exception(exc_text)
+
+        return map_chunks(path, func, workers=workers, backend=backend,
+                          chunk_size=chunk_size, ordered=ordered,
+                          encoding=encoding, on_error=on_error, stats=stats)
+
+    def memory_snapshot(self, label):
+        """
+        * *label* (str): Label identifying the snapshot.
+
+        Take a memory allocation snapshot if memory tracing is enabled,
+        otherwise do nothing. The footer reports the growth between the first
+        and last snapshots, so this is typically called at points where memory
+        use is expected to have returned to a baseline.
+        """
+        if self._memory_tracer is not None:
+            self._memory_tracer.snapshot(label)
+
+    @property
+    def metrics(self):
+        """
+        *Property.* Return the application
+        :class:`~jaraf.metrics.MetricsRegistry`, creating it with the built-in
+        run metrics the first time.
+        """
+        if self._metrics is None:
+            from jaraf.metrics import MetricsRegistry
+
+            self._metrics = MetricsRegistry()
+            self._register_run_metrics()
+        return self._metrics
+
+    def open_output(self, path, mode="wb", compression="auto", **kwargs):
+        """
+        * *path* (str): Output file path.
+        * *mode* (str): "wb" to write bytes or "w" to write text.
+        * *compression* (str): "gzip", "bz2", "xz", "auto" (the default) to
+          pick one from the file extension, or None.
+        * *kwargs*: Other :class:`~jaraf.atomic.AtomicWriter` parameters, such
+          as *level*, *buffer_size* and *fsync*.
+
+        Open an output file that is written to a temporary file in the same
+        directory, then flushed to disk and renamed over *path* when the block
+        exits normally, so that downstream readers never see a partial file.
+        If the block raises an exception, the temporary file is removed and
+        *path* is left untouched::
+
+            def main(self):
+                with self.open_output("results.csv.gz", "w") as fh:
+                    for row in self.rows():
+                        fh.write(",".join(row) + "\\n")
+
+        *Returns:* An :class:`~jaraf.atomic.AtomicWriter` context manager,
+        whose value is the file object to write to.
+        """
+        from jaraf.atomic import AtomicWriter
+
+        return AtomicWriter(path, mode, compression=compression,
+                            on_commit=self._add_output, **kwargs)
+
     def process_arguments(self, args, arg_extras):
         """
         *Virtual*. Optional method that can be defined by subclasses to add
@@ -208,6 +737,8 @@ class App(object):
         *Returns:* An integer representing the application exit code.
         """
 
+        self._run_args = list(sys.argv[1:] if args is None else args)
+
         try:
             # Add application arguments, first calling the base _add_arguments()
             # method then the optional add_arguments() method.
@@ -222,11 +753,12 @@ class App(object):
 
             # Initialize logging for the application.
             self.init_logging()
+            self._install_signal_handlers()
 
             # Output a header and execute the application.
             self.log.info("-" * 72)
             self.log.info("STARTING %s", self._program_name)
-            self.main()
+            self._run_main()
 
         except AppError:
             # When an AppError is raised, assume that the subclass has already
@@ -249,29 +781,127 @@ class App(object):
             self.log.error("Unhandled exception: %s", err)
             self.log_exception()
 
-        # Calculate some run stats.
-        elapsed_time = self.readable_elapsed_secs(time.time() - self._start_time)
-        rusage_self = resource.getrusage(resource.RUSAGE_SELF)
-        rusage_child = resource.getrusage(resource.RUSAGE_CHILDREN)
+        finally:
+            # Release any resources held by the application and its mixins.
+            # This is done even if an exception that we don't handle (e.g.
+            # KeyboardInterrupt) is propagating.
+            self._restore_signal_handlers()
+            self._shutdown()
+
+        # Calculate the run stats, output a footer, write the run report and
+        # return the application status code.
+        self._run_stats = self._get_run_stats()
+        self._log_footer()
+        self._stop_metrics_exporters()
+        if self._run_report is not None:
+            self._write_run_report()
 
-        # Calculate cpu time as combined user and system times.
-        cpu_time = rusage_self.ru_utime + rusage_self.ru_stime \
-                   + rusage_child.ru_utime + rusage_self.ru_stime
+        return self.status
 
-        # RSS units are in kb on Linux but bytes on OSX.
-        units = float(2 ** 10)
-        if sys.platform == "darwin":
-            units = float(2 ** 20)
-        max_rss = float(rusage_self.ru_maxrss + rusage_child.ru_maxrss) / units
+    def progress(self, iterable, total=None, every_secs=10.0, name="items"):
+        """
+        * *iterable*: Items to iterate over.
+        * *total* (int): Expected number of items, used for the percentage and
+          ETA. Defaults to ``len(iterable)`` if available.
+        * *every_secs* (float): Number of seconds between progress lines.
+        * *name* (str): Name of the items in the progress lines and footer.
+
+        Iterate over items, logging the number of items, the rate, the ETA and
+        the per-item time percentiles every *every_secs* seconds. The clock is
+        only read every few items, so wrapping even a fast loop costs little.
+        A summary of the loop is added to the footer.
+
+        *Returns:* A :class:`~jaraf.progress.Progress` iterable, which can
+        only be iterated over once.
+        """
+        progress = Progress(iterable, total=total, every_secs=every_secs,
+                            report=self._log_progress, name=name)
+        self._progress.append(progress)
+        return progress
 
-        # Output a footer and return the application status code.
-        self.log.info("FINISHED %s", self._program_name)
-        self.log.info("- exit status: %d", self.status)
-        self.log.info("- elapsed time: %s", elapsed_time)
-        self.log.info("- cpu time: %0.3f secs", cpu_time)
-        self.log.info("- max rss: %0.3f MiB", max_rss)
+    def request_shutdown(self):
+        """
+        Request a cooperative shutdown, as SIGTERM and SIGINT do. Service mode
+        stops after the current run, and :meth:`main()` should return soon
+        after it sees :attr:`shutdown_requested`. This is safe to call from any
+        thread.
+        """
+        self._shutdown_event.set()
 
-        return self.status
+    def set_run_metric(self, name, value):
+        """
+        * *name* (str): Metric name.
+        * *value*: JSON-serializable metric value.
+
+        Record a custom value to include in the ``metrics`` section of the run
+        report.
+        """
+        self._run_metrics[name] = value
+
+    @property
+    def service_iteration(self):
+        """
+        *Property.* Return the number of the current service mode run, starting
+        at 1, or 0 if the application is not running as a service.
+        """
+        return self._service_iteration
+
+    def shard(self, items=None, key=None, manifest=None):
+        """
+        * *items*: Items to shard, defaulting to the items of the manifest if
+          one was given, and to the extra command-line arguments otherwise.
+        * *key* (callable): Function returning the key of an item that is
+          hashed to select its shard. Defaults to the item itself.
+        * *manifest* (str): Path of a manifest listing the items to shard,
+          used instead of *items*.
+
+        Yield the items of the shard of this instance, in input order. The
+        number of yielded items is listed in the footer.
+
+        *Returns:* A generator of items.
+        """
+        from jaraf.manifest import Manifest
+
+        total = None
+        if manifest is not None:
+            items = Manifest(manifest)
+        elif items is None:
+            items = self._arg_extras if self.manifest is None \
+                else self.manifest
+        if isinstance(items, Manifest) and self._shard_count is not None \
+                and self._shard_method == "range":
+            total = items.count()
+
+        if self._shard_count is not None:
+            items = shard_items(items, self._shard_index, self._shard_count,
+                                self._shard_method, key, total)
+        for item in items:
+            self._shard_items += 1
+            yield item
+
+    @property
+    def shutdown_event(self):
+        """
+        *Property.* Return the :class:`threading.Event` that is set when a
+        shutdown is requested, which is useful for waiting with a timeout.
+        """
+        return self._shutdown_event
+
+    @property
+    def shutdown_requested(self):
+        """
+        *Property.* Return True if a shutdown has been requested, e.g. by
+        SIGTERM. Long-running :meth:`main()` methods should poll this and
+        return early::
+
+            def main(self):
+                for record in self.records():
+                    if self.shutdown_requested:
+                        break
+                    self.process(record)
+
+        """
+        return self._shutdown_event.is_set()
 
     @property
     def status(self):
@@ -280,6 +910,33 @@ class App(object):
         """
         return self._status
 
+    def timer(self, name, cpu=False):
+        """
+        * *name* (str): Name of the phase to time.
+        * *cpu* (bool): If True, CPU time is recorded along with wall time.
+          This only applies when the timer is first created.
+
+        Return the :class:`~jaraf.timers.PhaseTimer` for a named phase, which
+        is used as a context manager or function decorator. Timers can be
+        nested and re-entered, and the count, total, min, max, p50 and p95 of
+        each phase are listed in the footer::
+
+            def main(self):
+                with self.timer("load", cpu=True):
+                    records = self.load()
+
+                for record in records:
+                    with self.timer("process"):
+                        self.process(record)
+
+        Reading the CPU clock is relatively expensive, so CPU time is only
+        recorded for timers created with ``cpu=True``. A timer can be shared
+        by :meth:`map()` worker threads and asyncio tasks.
+
+        *Returns:* A :class:`~jaraf.timers.PhaseTimer` instance.
+        """
+        return self._timers.get(name, cpu)
+
     def _add_arguments(self):
         """
         Add base App command-line arguments.
@@ -292,6 +949,685 @@ class App(object):
                                       action="store_true",
                                       dest="silent")
 
+        self._arg_parser.add_argument("--checkpoint",
+                                      action="store",
+                                      dest="checkpoint",
+                                      metavar="PATH")
+
+        self._arg_parser.add_argument("--instance-lock",
+                                      action="store",
+                                      choices=LOCK_POLICIES,
+                                      dest="instance_lock",
+                                      metavar="POLICY")
+
+        self._arg_parser.add_argument("--lock-by-args",
+                                      action="store_true",
+                                      dest="lock_by_args")
+
+        self._arg_parser.add_argument("--lock-dir",
+                                      action="store",
+                                      dest="lock_dir",
+                                      metavar="DIR")
+
+        self._arg_parser.add_argument("--lock-timeout",
+                                      action="store",
+                                      dest="lock_timeout",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--loop-lag-interval",
+                                      action="store",
+                                      dest="loop_lag_interval",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--loop-policy",
+                                      action="store",
+                                      dest="loop_policy",
+                                      metavar="MODULE:NAME")
+
+        self._arg_parser.add_argument("--manifest",
+                                      action="store",
+                                      dest="manifest",
+                                      metavar="PATH")
+
+        self._arg_parser.add_argument("--metrics-interval",
+                                      action="store",
+                                      dest="metrics_interval",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--metrics-textfile",
+                                      action="store",
+                                      dest="metrics_textfile",
+                                      metavar="PATH")
+
+        self._arg_parser.add_argument("--profile",
+                                      action="store",
+                                      const="",
+                                      dest="profile",
+                                      metavar="PATH",
+                                      nargs="?")
+
+        self._arg_parser.add_argument("--profile-sort",
+                                      action="store",
+                                      dest="profile_sort")
+
+        self._arg_parser.add_argument("--profile-top",
+                                      action="store",
+                                      dest="profile_top",
+                                      type=int)
+
+        self._arg_parser.add_argument("--profile-restrict",
+                                      action="append",
+                                      dest="profile_restrict")
+
+        self._arg_parser.add_argument("--resume",
+                                      action="store_true",
+                                      dest="resume")
+
+        self._arg_parser.add_argument("--run-report",
+                                      action="store",
+                                      dest="run_report",
+                                      metavar="PATH")
+
+        self._arg_parser.add_argument("--sample-interval",
+                                      action="store",
+                                      dest="sample_interval",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--sample-resources",
+                                      action="store",
+                                      const="",
+                                      dest="sample_resources",
+                                      metavar="PATH",
+                                      nargs="?")
+
+        self._arg_parser.add_argument("--service-interval",
+                                      action="store",
+                                      dest="service_interval",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--service-jitter",
+                                      action="store",
+                                      dest="service_jitter",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--service-max-iterations",
+                                      action="store",
+                                      dest="service_max_iterations",
+                                      metavar="N",
+                                      type=int)
+
+        self._arg_parser.add_argument("--service-schedule",
+                                      action="store",
+                                      dest="service_schedule",
+                                      metavar="EXPR")
+
+        self._arg_parser.add_argument("--shard-count",
+                                      action="store",
+                                      dest="shard_count",
+                                      metavar="N",
+                                      type=int)
+
+        self._arg_parser.add_argument("--shard-index",
+                                      action="store",
+                                      dest="shard_index",
+                                      metavar="I",
+                                      type=int)
+
+        self._arg_parser.add_argument("--shard-method",
+                                      action="store",
+                                      choices=SHARD_METHODS,
+                                      dest="shard_method",
+                                      metavar="METHOD")
+
+        self._arg_parser.add_argument("--statsd",
+                                      action="store",
+                                      dest="statsd",
+                                      metavar="HOST:PORT")
+
+        self._arg_parser.add_argument("--statsd-prefix",
+                                      action="store",
+                                      dest="statsd_prefix")
+
+        self._arg_parser.add_argument("--watchdog",
+                                      action="store",
+                                      dest="watchdog",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--watchdog-abort",
+                                      action="store_true",
+                                      dest="watchdog_abort")
+
+        self._arg_parser.add_argument("--trace-memory",
+                                      action="store_true",
+                                      dest="trace_memory")
+
+        self._arg_parser.add_argument("--trace-memory-dump",
+                                      action="store",
+                                      dest="trace_memory_dump",
+                                      metavar="DIR")
+
+        self._arg_parser.add_argument("--trace-memory-frames",
+                                      action="store",
+                                      dest="trace_memory_frames",
+                                      type=int)
+
+        self._arg_parser.add_argument("--trace-memory-interval",
+                                      action="store",
+                                      dest="trace_memory_interval",
+                                      metavar="SECS",
+                                      type=float)
+
+        self._arg_parser.add_argument("--trace-memory-top",
+                                      action="store",
+                                      dest="trace_memory_top",
+                                      type=int)
+
+    def _add_output(self, writer):
+        """
+        * *writer* (:class:`~jaraf.atomic.AtomicWriter`): Committed writer.
+
+        Add a committed output file to the run totals. Only the totals are
+        kept, so that opening many outputs doesn't keep their writers alive.
+        """
+        self._output_files += 1
+        self._output_bytes += writer.bytes_written
+        self._output_stored_bytes += writer.bytes_stored
+        self._output_secs += writer.elapsed
+
+    def _abort(self):
+        """
+        Clean up what can't be left behind when the application aborts
+        without unwinding, e.g. on a watchdog stall. This is called from the
+        watchdog thread right before the process exits, while the main thread
+        may still be running, so it must not wait on anything the main thread
+        could be holding. Mixins may overload this method, but must call the
+        base method.
+        """
+        pass
+
+    def _acquire_instance_lock(self):
+        """
+        Take the instance lock if requested. If the lock is held by another
+        instance, log it and raise an :class:`~jaraf.errors.AppLockedError`.
+        If the lock file can't be opened, log it and raise an
+        :class:`~jaraf.errors.AppInitializationError`.
+        """
+        if self._instance_lock is None:
+            return
+
+        try:
+            self._lock = InstanceLock(self._get_lock_path())
+            acquired = self._lock.acquire(self._instance_lock,
+                                          self._lock_timeout)
+        except OSError as e:
+            self._lock = None
+            self._status = AppStatusInitializationError
+            self.log.error("Unable to open the instance lock: %s", e)
+            raise AppInitializationError(str(e))
+
+        if acquired:
+            if self._lock.killed_pid is not None:
+                self.log.warning("Terminated instance %d holding %s",
+                                 self._lock.killed_pid, self._lock.path)
+            return
+
+        self._status = AppStatusLocked
+        self.log.warning("Another instance (pid %s) holds %s, not running",
+                         self._lock.holder_pid, self._lock.path)
+        raise AppLockedError
+
+    def _call_main(self):
+        """
+        Call the :meth:`main()` method, running it on the event loop if it
+        returns a coroutine.
+        """
+        result = self.main()
+        if result is not None:
+            import inspect
+
+            if inspect.isawaitable(result):
+                self._run_coroutine(result)
+
+    def _check_shard_arguments(self):
+        """
+        Check the sharding parameters. Invalid parameters are logged and raise
+        an :class:`~jaraf.errors.AppArgumentError`.
+        """
+        count = self._shard_count
+        index = self._shard_index
+        if count is None and index is None:
+            return
+
+        if count is None or index is None:
+            error = "--shard-index and --shard-count must be used together"
+        elif count < 1:
+            error = "Invalid shard count %d" % count
+        elif not 0 <= index < count:
+            error = "Invalid shard index %d, expected 0 to %d" % (index,
+                                                                 count - 1)
+        elif self._shard_method not in SHARD_METHODS:
+            error = "Invalid shard method %s" % self._shard_method
+        elif self._shard_method == "range" and self._manifest_path == "-":
+            # Range shards need the number of items, and counting a manifest
+            # read from the standard input would consume it.
+            error = ("--shard-method range can't be used with a manifest "
+                     "read from the standard input")
+        else:
+            return
+
+        self.log.error(error)
+        self._status = AppStatusArgumentError
+        raise AppArgumentError(error)
+
+    def _close_event_loop(self):
+        """
+        Shut down and close the event loop, if one was created.
+        """
+        if self._loop is None:
+            return
+
+        import asyncio
+
+        loop = self._loop
+        self._loop = None
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def _get_checkpoint_path(self):
+        """
+        Return the path of the checkpoint database.
+        """
+        if self._checkpoint_path:
+            return os.path.abspath(self._checkpoint_path)
+        return self._get_side_file_path(".checkpoint.sqlite")
+
+    def _get_lock_path(self):
+        """
+        Return the path of the instance lock file.
+        """
+        name = self._app_name
+        if self._lock_by_args:
+            import hashlib
+
+            name += "-" + hashlib.sha1(
+                "\0".join(self._run_args).encode()).hexdigest()[:12]
+        return os.path.join(self._lock_dir or default_lock_dir(),
+                            name + ".lock")
+
+    def _get_profile_path(self):
+        """
+        Return the path of the profile stats output file.
+        """
+        if self._profile:
+            return os.path.abspath(self._profile)
+        return self._get_side_file_path(".pstats")
+
+    def _get_run_stats(self):
+        """
+        Calculate the run stats reported in the footer and run report.
+
+        *Returns:* A dictionary of run stats.
+        """
+        end_time = time.time()
+        (rusage_self, rusage_child, cpu_time, max_rss) = self._get_rusage()
+
+        return {"exit_status": self.status,
+                "start_time": self._start_time,
+                "end_time": end_time,
+                "elapsed_secs": end_time - self._start_time,
+                "cpu_secs": cpu_time,
+                "max_rss_mib": max_rss,
+                "output_files": self._output_files,
+                "output_bytes": self._output_bytes,
+                "output_stored_bytes": self._output_stored_bytes,
+                "output_secs": self._output_secs,
+                "rusage_self": self._rusage_to_dict(rusage_self),
+                "rusage_children": self._rusage_to_dict(rusage_child)}
+
+    @staticmethod
+    def _get_rusage():
+        """
+        Return a (rusage_self, rusage_children, cpu_secs, max_rss_mib) tuple
+        with the current resource usage of the application and its children.
+        """
+        rusage_self = resource.getrusage(resource.RUSAGE_SELF)
+        rusage_child = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # Calculate cpu time as combined user and system times.
+        cpu_time = rusage_self.ru_utime + rusage_self.ru_stime \
+                   + rusage_child.ru_utime + rusage_child.ru_stime
+
+        # RSS units are in kb on Linux but bytes on OSX.
+        units = float(2 ** 10)
+        if sys.platform == "darwin":
+            units = float(2 ** 20)
+        max_rss = float(rusage_self.ru_maxrss + rusage_child.ru_maxrss) / units
+
+        return (rusage_self, rusage_child, cpu_time, max_rss)
+
+    def _get_sample_path(self):
+        """
+        Return the path of the resource sample output file.
+        """
+        if self._sample_resources:
+            return os.path.abspath(self._sample_resources)
+        return self._get_side_file_path(".samples.csv")
+
+    def _get_service_schedule(self):
+        """
+        Return the service mode schedule, or None if service mode is not
+        enabled. An invalid schedule is logged and raises an
+        :class:`~jaraf.errors.AppArgumentError`.
+        """
+        if self._service_schedule is None and self._service_interval is None:
+            return None
+
+        from jaraf.schedule import CronSchedule, IntervalSchedule
+
+        try:
+            if self._service_schedule is not None:
+                return CronSchedule(self._service_schedule)
+            if self._service_interval is not None:
+                return IntervalSchedule(self._service_interval)
+        except ValueError as err:
+            self.log.error("Invalid service schedule: %s", err)
+            self._status = AppStatusArgumentError
+            raise AppArgumentError(str(err))
+        return None
+
+    def _get_side_file_path(self, suffix):
+        """
+        * *suffix* (str): File name suffix, including any extension.
+
+        Return the path of an output file that accompanies the application log
+        (e.g. profile stats). By default, this is a file named after the
+        application in the current directory, but mixins that change where the
+        log is written may overload this to keep the files together.
+        """
+        return os.path.abspath("{}{}".format(self._app_name, suffix))
+
+    def _handle_shutdown_signal(self, signum, frame):
+        """
+        Request a shutdown on the first SIGTERM or SIGINT, and interrupt the
+        application on the second.
+        """
+        if self._shutdown_signal is not None:
+            self._status = AppStatusInterrupted
+            self.log.error("Interrupted by %s", signal.Signals(signum).name)
+            raise AppInterruptedError
+
+        self._shutdown_signal = signum
+        self.log.warning("Received %s, shutting down (send again to "
+                         "interrupt)", signal.Signals(signum).name)
+        self.request_shutdown()
+
+    def _handle_stall(self, gap):
+        """
+        * *gap* (float): Number of seconds since the last heartbeat.
+
+        Log diagnostics for a stalled application, called from the watchdog
+        thread, and abort if requested. Aborting skips the normal cleanup
+        since the main thread can't be relied on to unwind, and only calls
+        :meth:`_abort()` before exiting.
+        """
+        self.log.error("No heartbeat for %s, the application appears to be "
+                       "stalled", self.readable_elapsed_secs(gap))
+        self._log_diagnostics("stalled")
+
+        if self._watchdog_abort:
+            self.log.error("Aborting with exit status %d", AppStatusStalled)
+            try:
+                self._abort()
+            finally:
+                for handler in self.log.handlers:
+                    handler.flush()
+                os._exit(AppStatusStalled)
+
+    def _handle_usr1_signal(self, signum, frame):
+        """
+        Log diagnostics from a helper thread, so that the main thread only
+        pauses for as long as it takes to start the thread.
+        """
+        # Report the main thread where it was interrupted rather than inside
+        # this handler.
+        frames = sys._current_frames()
+        frames[threading.main_thread().ident] = frame
+
+        thread = threading.Thread(target=self._log_diagnostics,
+                                  args=("SIGUSR1", frames),
+                                  name="jaraf-diagnostics")
+        thread.daemon = True
+        thread.start()
+
+    def _install_signal_handlers(self):
+        """
+        Install the shutdown and diagnostics signal handlers. Signal handlers
+        can only be installed from the main thread.
+        """
+        if not self._signal_handlers or \
+                threading.current_thread() is not threading.main_thread():
+            return
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._previous_signal_handlers[signum] = signal.signal(
+                signum, self._handle_shutdown_signal)
+        if hasattr(signal, "SIGUSR1"):
+            self._previous_signal_handlers[signal.SIGUSR1] = signal.signal(
+                signal.SIGUSR1, self._handle_usr1_signal)
+
+    def _log_diagnostics(self, reason, frames=None):
+        """
+        * *reason* (str): Why the diagnostics are logged.
+        * *frames* (dict): Current frame of each thread, keyed by thread id,
+          defaulting to :func:`sys._current_frames()`.
+
+        Log the stack of every thread, the current resource usage and the phase
+        timers of a running application. The calling thread is not listed.
+        """
+        stats = self._get_run_stats()
+        if frames is None:
+            frames = sys._current_frames()
+
+        self.log.info("DIAGNOSTICS (%s)", reason)
+        self.log.info("- elapsed time: %s",
+                      self.readable_elapsed_secs(stats["elapsed_secs"]))
+        self.log.info("- cpu time: %0.3f secs", stats["cpu_secs"])
+        self.log.info("- max rss: %0.3f MiB", stats["max_rss_mib"])
+
+        from jaraf.sampler import ResourceSampler
+
+        if ResourceSampler.is_supported():
+            sample = ResourceSampler().sample()
+            self.log.info("- rss: %0.3f MiB, threads: %d, fds: %d, "
+                          "children: %d", sample["rss"] / float(2 ** 20),
+                          sample["threads"], sample["fds"],
+                          sample["children"])
+
+        if len(self._timers):
+            self.log.info("- phase timers:")
+            for line in self._timers.table_lines():
+                self.log.info("  > %s", line)
+
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            if frame is None or thread is threading.current_thread():
+                continue
+            self.log.info("- thread %s (%d)%s:", thread.name, thread.ident,
+                          " [daemon]" if thread.daemon else "")
+            for entry in traceback.format_stack(frame):
+                for line in entry.rstrip().split("\n"):
+                    self.log.info("  > %s", line)
+
+    def _log_footer(self):
+        """
+        Output the application footer with the exit status and run stats.
+        Mixins may overload this method to append their own stats, but must
+        call the base method first.
+        """
+
+        stats = self._run_stats
+        if stats is None:
+            stats = self._get_run_stats()
+
+        self.log.info("FINISHED %s", self._program_name)
+        self.log.info("- exit status: %d", stats["exit_status"])
+        self.log.info("- elapsed time: %s",
+                      self.readable_elapsed_secs(stats["elapsed_secs"]))
+        self.log.info("- cpu time: %0.3f secs", stats["cpu_secs"])
+        self.log.info("- max rss: %0.3f MiB", stats["max_rss_mib"])
+
+        if stats["output_files"]:
+            mib = float(2 ** 20)
+            self.log.info("- output: %d files, %0.3f MiB written (%0.3f MiB "
+                          "stored), %0.1f MiB/sec", stats["output_files"],
+                          stats["output_bytes"] / mib,
+                          stats["output_stored_bytes"] / mib,
+                          stats["output_bytes"] / mib / stats["output_secs"]
+                          if stats["output_secs"] > 0 else 0.0)
+
+        if self._checkpoint is not None:
+            self.log.info("- checkpoint: %d units done, %d resumed (%s, %s)",
+                          len(self._checkpoint), self._checkpoint.resumed,
+                          self._checkpoint.path,
+                          "removed" if self._checkpoint_removed else "kept")
+
+        if self._lock is not None:
+            self.log.info("- instance lock: %s (%s, waited %s)",
+                          self._lock.path, self._instance_lock,
+                          self.readable_elapsed_secs(self._lock.wait_time))
+
+        if self._manifest is not None:
+            self.log.info("- manifest: %s, %d items read",
+                          self._manifest.path, self._manifest.items_read)
+
+        if self._shard_count is not None:
+            self.log.info("- shard: %d of %d (%s), %d items",
+                          self._shard_index, self._shard_count,
+                          self._shard_method, self._shard_items)
+
+        if self._watchdog is not None:
+            self.log.info("- watchdog: %d stalls, longest heartbeat gap %s",
+                          self._watchdog.stalls,
+                          self.readable_elapsed_secs(self._watchdog.max_gap))
+
+        if self._shutdown_signal is not None:
+            self.log.info("- shutdown requested by %s",
+                          signal.Signals(self._shutdown_signal).name)
+
+        # Service mode stats.
+        if self._service_iteration:
+            self.log.info("- service iterations: %d (%d failed, %d overran)",
+                          self._service_iteration, self._service_failures,
+                          self._service_overruns)
+
+        # Event loop lag.
+        monitor = self._loop_lag_monitor
+        if monitor is not None and monitor.count:
+            self.log.info("- event loop lag: %d checks, p50 %0.3f ms, "
+                          "p95 %0.3f ms, max %0.3f ms", monitor.count,
+                          monitor.percentile(50) * 1e3,
+                          monitor.percentile(95) * 1e3, monitor.max / 1e6)
+
+        # Parallel map stats.
+        for (name, map_stats) in self._map_stats.items():
+            self.log.info("- map %s: %d items (%d failed) in %s, "
+                          "%0.1f items/sec", name, map_stats.items,
+                          map_stats.failures,
+                          self.readable_elapsed_secs(map_stats.elapsed),
+                          map_stats.throughput)
+
+        # Progress summaries.
+        for progress in self._progress:
+            if progress.count:
+                self.log.info("- progress %s: %d items in %s, %0.1f/sec, "
+                              "item p50 %0.3f ms, p95 %0.3f ms, "
+                              "p99 %0.3f ms", progress.name, progress.count,
+                              self.readable_elapsed_secs(progress.elapsed),
+                              progress.rate,
+                              (progress.percentile(50) or 0) * 1e3,
+                              (progress.percentile(95) or 0) * 1e3,
+                              (progress.percentile(99) or 0) * 1e3)
+
+        # Phase timers.
+        if len(self._timers):
+            self.log.info("- phase timers:")
+            for line in self._timers.table_lines():
+                self.log.info("  > %s", line)
+
+        # Profiling results.
+        if self._profiler is not None and self._profiler.stats is not None:
+            self.log.info("- profile: %s", self._get_profile_path())
+            for line in self._profiler.top_lines():
+                self.log.info("  > %s", line)
+
+        # Resource sampling results.
+        if self._sampler is not None and self._sampler.count:
+            summary = self._sampler.summary()
+            mib = float(2 ** 20)
+            self.log.info("- resource samples: %d (%s)",
+                          self._sampler.count, self._sampler.path)
+            self.log.info("  > rss: peak %0.3f MiB, p50 %0.3f MiB, "
+                          "p95 %0.3f MiB", summary["rss"]["peak"] / mib,
+                          summary["rss"]["p50"] / mib,
+                          summary["rss"]["p95"] / mib)
+            self.log.info("  > cpu: peak %0.1f%%, p50 %0.1f%%, p95 %0.1f%%",
+                          summary["cpu"]["peak"], summary["cpu"]["p50"],
+                          summary["cpu"]["p95"])
+            for field in ("threads", "fds", "children"):
+                self.log.info("  > %s: peak %d, p50 %d, p95 %d", field,
+                              summary[field]["peak"], summary[field]["p50"],
+                              summary[field]["p95"])
+
+        # Memory tracing results.
+        if self._memory_tracer is not None:
+            tracer = self._memory_tracer
+            self.log.info("- traced memory peak: %0.3f MiB",
+                          tracer.peak / float(2 ** 20))
+            self.log.info("- traced memory snapshots:")
+            previous = None
+            for (label, total) in tracer.totals:
+                growth = 0 if previous is None else total - previous
+                self.log.info("  > %-10s %10.1f KiB %+10.1f KiB",
+                              label, total / 1024.0, growth / 1024.0)
+                previous = total
+            self.log.info("- top allocations:")
+            for line in tracer.top_lines():
+                self.log.info("  > %s", line)
+            growth_lines = tracer.growth_lines()
+            if growth_lines:
+                self.log.info("- allocation growth:")
+                for line in growth_lines:
+                    self.log.info("  > %s", line)
+
+    def _log_progress(self, progress):
+        """
+        Log a progress line for a loop wrapped with :meth:`progress()`.
+        """
+        if progress.total:
+            done = "%d/%d %s (%0.1f%%)" % (progress.count, progress.total,
+                                           progress.name, 100.0 *
+                                           progress.count / progress.total)
+        else:
+            done = "%d %s" % (progress.count, progress.name)
+        eta = progress.eta
+        self.log.info("Progress: %s, %0.1f/sec, ETA %s, item p50 %0.3f ms, "
+                      "p95 %0.3f ms", done, progress.rate,
+                      "unknown" if eta is None
+                      else self.readable_elapsed_secs(eta),
+                      (progress.percentile(50) or 0) * 1e3,
+                      (progress.percentile(95) or 0) * 1e3)
+
     def _process_arguments(self, args=None):
         """
         Process base App command-line arguments.
@@ -308,6 +1644,433 @@ class App(object):
         if self._args.silent:
             self._silent = True
 
+        # Checkpoints.
+        if self._args.checkpoint is not None:
+            self._checkpoint_path = self._args.checkpoint
+        if self._args.resume:
+            self._resume = True
+
+        # Instance lock.
+        if self._args.instance_lock is not None:
+            self._instance_lock = self._args.instance_lock
+        if self._args.lock_by_args:
+            self._lock_by_args = True
+        if self._args.lock_dir is not None:
+            self._lock_dir = self._args.lock_dir
+        if self._args.lock_timeout is not None:
+            self._lock_timeout = self._args.lock_timeout
+
+        # Event loop.
+        if self._args.loop_lag_interval is not None:
+            self._loop_lag_interval = self._args.loop_lag_interval
+        if self._args.loop_policy is not None:
+            self._loop_policy = self._args.loop_policy
+
+        # Input manifest.
+        if self._args.manifest is not None:
+            self._manifest_path = self._args.manifest
+
+        # Metrics.
+        if self._args.metrics_interval is not None:
+            self._metrics_interval = self._args.metrics_interval
+        if self._args.metrics_textfile is not None:
+            self._metrics_textfile = self._args.metrics_textfile
+        if self._args.statsd is not None:
+            self._statsd = self._args.statsd
+        if self._args.statsd_prefix is not None:
+            self._statsd_prefix = self._args.statsd_prefix
+
+        # Profiling.
+        if self._args.profile is not None:
+            self._profile = self._args.profile
+        if self._args.profile_sort is not None:
+            self._profile_sort = self._args.profile_sort
+        if self._args.profile_top is not None:
+            self._profile_top = self._args.profile_top
+        if self._args.profile_restrict is not None:
+            self._profile_restrict = self._args.profile_restrict
+
+        # Run report.
+        if self._args.run_report is not None:
+            self._run_report = self._args.run_report
+
+        # Resource sampling.
+        if self._args.sample_interval is not None:
+            self._sample_interval = self._args.sample_interval
+        if self._args.sample_resources is not None:
+            self._sample_resources = self._args.sample_resources
+
+        # Service mode.
+        if self._args.service_interval is not None:
+            self._service_interval = self._args.service_interval
+        if self._args.service_jitter is not None:
+            self._service_jitter = self._args.service_jitter
+        if self._args.service_max_iterations is not None:
+            self._service_max_iterations = self._args.service_max_iterations
+        if self._args.service_schedule is not None:
+            self._service_schedule = self._args.service_schedule
+
+        # Sharding.
+        if self._args.shard_count is not None:
+            self._shard_count = self._args.shard_count
+        if self._args.shard_index is not None:
+            self._shard_index = self._args.shard_index
+        if self._args.shard_method is not None:
+            self._shard_method = self._args.shard_method
+        self._check_shard_arguments()
+
+        # Watchdog.
+        if self._args.watchdog is not None:
+            self._watchdog_timeout = self._args.watchdog
+        if self._args.watchdog_abort:
+            self._watchdog_abort = True
+
+        # Memory tracing.
+        if self._args.trace_memory:
+            self._trace_memory = True
+        if self._args.trace_memory_dump is not None:
+            self._trace_memory_dump = self._args.trace_memory_dump
+        if self._args.trace_memory_frames is not None:
+            self._trace_memory_frames = self._args.trace_memory_frames
+        if self._args.trace_memory_interval is not None:
+            self._trace_memory_interval = self._args.trace_memory_interval
+        if self._args.trace_memory_top is not None:
+            self._trace_memory_top = self._args.trace_memory_top
+
+    def _run_main(self):
+        """
+        Call the :meth:`main()` method, once or repeatedly in service mode,
+        profiling it, tracing its memory allocations and sampling resource
+        usage if requested.
+        """
+        self._acquire_instance_lock()
+
+        schedule = self._get_service_schedule()
+        if schedule is None:
+            execute = self._call_main
+        else:
+            def execute():
+                self._run_service(schedule)
+
+        self._start_metrics_exporters()
+
+        if self._sample_resources is not None:
+            from jaraf.sampler import ResourceSampler
+
+            if ResourceSampler.is_supported():
+                self._sampler = ResourceSampler(self._get_sample_path(),
+                                                self._sample_interval)
+                self._sampler.start()
+            else:
+                self.log.warning("Resource sampling is not supported on %s",
+                                 sys.platform)
+
+        if self._watchdog_timeout:
+            self.heartbeat()
+            self._watchdog = Watchdog(self._watchdog_timeout,
+                                      lambda: self._last_heartbeat,
+                                      self._handle_stall)
+            self._watchdog.start()
+
+        if self._trace_memory:
+            from jaraf.profiling import MemoryTracer
+
+            self._memory_tracer = MemoryTracer(
+                frames=self._trace_memory_frames,
+                top=self._trace_memory_top,
+                dump_dir=self._trace_memory_dump,
+                dump_prefix=self._app_name)
+            self._memory_tracer.start(self._trace_memory_interval)
+
+        try:
+            if self._profile is None:
+                execute()
+            else:
+                from jaraf.profiling import Profiler
+
+                self._profiler = Profiler(sort=self._profile_sort,
+                                          top=self._profile_top,
+                                          restrictions=self._profile_restrict)
+                try:
+                    self._profiler.run(execute)
+                finally:
+                    self._profiler.dump(self._get_profile_path())
+            self._main_completed = True
+
+        finally:
+            if self._watchdog is not None:
+                self._watchdog.stop()
+            self._close_event_loop()
+            if self._memory_tracer is not None:
+                self._memory_tracer.stop()
+            if self._sampler is not None:
+                self._sampler.stop()
+
+    def _register_run_metrics(self):
+        """
+        Register the built-in run metrics.
+        """
+        start_time = self._start_time
+        self.gauge("jaraf_start_time_seconds",
+                   "Application start time.").set(start_time)
+        self.gauge("jaraf_elapsed_seconds",
+                   "Application elapsed time.").set_function(
+            lambda: time.time() - start_time)
+        self.gauge("jaraf_exit_status",
+                   "Application exit status.").set_function(lambda: self.status)
+        # Resource usage and output gauges are computed when they are read,
+        # so that periodic exports report the values during the run.
+        self.gauge("jaraf_cpu_seconds",
+                   "Application CPU time.").set_function(
+            lambda: self._get_rusage()[2])
+        self.gauge("jaraf_max_rss_bytes",
+                   "Application maximum resident set size.").set_function(
+            lambda: int(self._get_rusage()[3] * 2 ** 20))
+        self.gauge("jaraf_output_bytes",
+                   "Bytes written to committed output files.").set_function(
+            lambda: self._output_bytes)
+        # The end time is only known when the application exits.
+        self.gauge("jaraf_end_time_seconds", "Application end time.")
+
+    def _restore_signal_handlers(self):
+        """
+        Restore the signal handlers replaced by
+        :meth:`_install_signal_handlers()`.
+        """
+        for (signum, handler) in self._previous_signal_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_signal_handlers = {}
+
+    def _run_coroutine(self, coro):
+        """
+        * *coro*: Coroutine returned by :meth:`main()`.
+
+        Run a coroutine on the application event loop, creating the loop the
+        first time. The loop is reused by later service mode iterations. Tasks
+        left pending by the coroutine are cancelled when it finishes.
+        """
+        import asyncio
+
+        from jaraf.eventloop import (LoopLagMonitor,
+                                     cancel_pending_tasks,
+                                     load_loop_policy)
+
+        if self._loop is None:
+            if self._loop_policy is None:
+                policy = asyncio.get_event_loop_policy()
+            else:
+                policy = load_loop_policy(self._loop_policy)
+            self._loop = policy.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            if self._loop_lag_interval:
+                self._loop_lag_monitor = LoopLagMonitor(
+                    self._loop_lag_interval)
+
+        loop = self._loop
+        if self._loop_lag_monitor is not None:
+            self._loop_lag_monitor.start(loop)
+
+        try:
+            loop.run_until_complete(coro)
+
+        except asyncio.CancelledError:
+            # Cancellation is a BaseException, so handle it here rather than
+            # let it escape the exception handling in run().
+            self._status = AppStatusError
+            self.log.error("main() was cancelled")
+            raise AppError
+
+        finally:
+            # This also cancels main() itself if it was interrupted, e.g. by
+            # a KeyboardInterrupt.
+            if self._loop_lag_monitor is not None:
+                self._loop_lag_monitor.stop(loop)
+            cancelled = cancel_pending_tasks(loop)
+            if cancelled:
+                self.log.warning("Cancelled %d pending tasks", cancelled)
+
+    def _run_service(self, schedule):
+        """
+        * *schedule*: Schedule object with a ``next_time(previous, now)``
+          method, from :mod:`jaraf.schedule`.
+
+        Call :meth:`main()` on a schedule until the maximum number of
+        iterations is reached or a shutdown is requested.
+        """
+        self.log.info("Running as a service on schedule: %s",
+                      self._service_schedule or
+                      "every %g secs" % self._service_interval)
+
+        previous = None
+        while not self._shutdown_event.is_set():
+            next_time = schedule.next_time(previous, time.time())
+            if self._service_jitter:
+                import random
+
+                next_time += random.uniform(0, self._service_jitter)
+
+            # Waiting for the next run is not a stall.
+            self._last_heartbeat = float("inf")
+            if self._shutdown_event.wait(max(0, next_time - time.time())):
+                break
+
+            previous = time.time()
+            self.heartbeat()
+            self._run_service_iteration()
+
+            # A run that ends after the next one was due means that runs were
+            # skipped.
+            if schedule.next_time(previous, previous) < time.time():
+                self._service_overruns += 1
+                self.log.warning("Service iteration %d overran the schedule, "
+                                 "skipping missed runs",
+                                 self._service_iteration)
+
+            if self._service_max_iterations is not None and \
+                    self._service_iteration >= self._service_max_iterations:
+                break
+
+        if self._shutdown_event.is_set():
+            self.log.info("Service stopped")
+
+    def _run_service_iteration(self):
+        """
+        Call :meth:`main()` once in service mode. Exceptions are handled as in
+        :meth:`run()`, but only fail the current iteration, except for an
+        :class:`~jaraf.errors.AppInterruptedError`, which stops the service.
+        """
+        self._service_iteration += 1
+        self._status = AppStatusOkay
+        self.log.info("Starting service iteration %d", self._service_iteration)
+
+        start_time = time.time()
+        with self.timer("service iteration"):
+            try:
+                self._call_main()
+
+            except AppInterruptedError:
+                # Unlike other errors, an interruption stops the service.
+                self._service_failures += 1
+                raise
+
+            except AppError:
+                pass
+
+            except Exception as err:
+                self._status = AppStatusError
+                self.log.error("Unhandled exception: %s", err)
+                self.log_exception()
+
+        if self._status != AppStatusOkay:
+            self._service_failures += 1
+        self.log.info("Finished service iteration %d with status %d in %s",
+                      self._service_iteration, self._status,
+                      self.readable_elapsed_secs(time.time() - start_time))
+
+    def _shutdown(self):
+        """
+        Release resources held by the application before the footer is output.
+        This is always called when :meth:`run()` exits, even when an unhandled
+        exception is propagating. Mixins may overload this method to perform
+        their own cleanup, but must call the base method.
+        """
+        # Keep the checkpoint unless the job completed, which is not the case
+        # if main() was interrupted by an exception or returned early because
+        # of a shutdown request.
+        if self._checkpoint is not None:
+            if self._main_completed and self._status == AppStatusOkay and \
+                    not self.shutdown_requested:
+                self._checkpoint.remove()
+                self._checkpoint_removed = True
+            else:
+                self._checkpoint.close()
+
+        if self._lock is not None:
+            self._lock.release()
+
+    def _start_metrics_exporters(self):
+        """
+        Start the metrics exporters, if metrics are exported or included in a
+        run report.
+        """
+        if self._metrics_textfile is None and self._statsd is None \
+                and self._run_report is None:
+            return
+
+        from jaraf.metrics import PrometheusTextfileExporter, StatsDExporter
+
+        self._metrics_exporters = []
+
+        if self._metrics_textfile is not None:
+            self._metrics_exporters.append(PrometheusTextfileExporter(
+                self.metrics, self._metrics_textfile,
+                labels={"app": self._app_name},
+                interval=self._metrics_interval))
+
+        if self._statsd is not None:
+            (host, port) = self._parse_host_port(self._statsd, 8125)
+            self._metrics_exporters.append(StatsDExporter(
+                self.metrics, host, port, prefix=self._statsd_prefix,
+                interval=self._metrics_interval))
+
+        for exporter in self._metrics_exporters:
+            exporter.start()
+
+    def _stop_metrics_exporters(self):
+        """
+        Update the built-in run metrics with the final run stats and do a final
+        export. Export failures are logged but don't change the application
+        status.
+        """
+        if self._metrics is None:
+            return
+
+        stats = self._run_stats
+        self.gauge("jaraf_elapsed_seconds").set(stats["elapsed_secs"])
+        self.gauge("jaraf_exit_status").set(stats["exit_status"])
+        self.gauge("jaraf_cpu_seconds").set(stats["cpu_secs"])
+        self.gauge("jaraf_max_rss_bytes").set(
+            int(stats["max_rss_mib"] * 2 ** 20))
+        self.gauge("jaraf_end_time_seconds").set(stats["end_time"])
+        self.gauge("jaraf_output_bytes").set(stats["output_bytes"])
+
+        for exporter in self._metrics_exporters or ():
+            try:
+                exporter.stop()
+            except Exception as err:
+                self.log.error("Unable to export metrics: %s", err)
+        self._metrics_exporters = None
+
+    def _write_run_report(self):
+        """
+        Write the JSON run report. Failing to write the report is logged but
+        does not change the application status.
+        """
+        import json
+        import socket
+
+        from jaraf.atomic import atomic_write
+
+        report = {"app": self._app_name,
+                  "program": self._program_name,
+                  "argv": self._run_args,
+                  "user": self._user,
+                  "host": socket.gethostname(),
+                  "pid": os.getpid(),
+                  "metrics": self.metrics.snapshot()}
+        report["metrics"].update(self._run_metrics)
+        report.update(self._run_stats)
+        for key in ("start_time", "end_time"):
+            report[key + "_iso"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%S%z", time.localtime(report[key]))
+
+        try:
+            atomic_write(self._run_report,
+                         json.dumps(report, default=str, sort_keys=True))
+        except Exception as err:
+            self.log.error("Unable to write run report %s: %s",
+                           self._run_report, err)
+
     @staticmethod
     def get_logger(logger_name=JARAF_LOGGER_NAME):
         """Return the default jaraf logger."""
@@ -377,3 +2140,21 @@ class App(object):
             return "{:02d}:{:02d}:{:06.3f}".format(hours, mins, secs)
         else:
             return "{:.3f}s".format(elapsed)
+
+    @staticmethod
+    def _parse_host_port(address, default_port):
+        """
+        Split a "HOST:PORT" string, using the default port if it is missing.
+        """
+        (host, sep, port) = address.rpartition(":")
+        if not sep:
+            return (address, default_port)
+        return (host or "127.0.0.1", int(port))
+
+    @staticmethod
+    def _rusage_to_dict(rusage):
+        """
+        Convert a :func:`resource.getrusage()` result to a dictionary.
+        """
+        return dict((name, getattr(rusage, name))
+                    for name in dir(rusage) if name.startswith("ru_"))
@@ -0,0 +1,207 @@
+"""
+Helpers for writing files atomically, so that readers never see a partially
+written file.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import time
+
+# Compression formats, and the extensions used to pick one automatically.
+COMPRESSIONS = ("gzip", "bz2", "xz")
+_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+def atomic_write(path, data, fsync=True):
+    """
+    * *path* (str): Destination file path.
+    * *data* (str or bytes): File contents.
+    * *fsync* (bool): If True, flush the data to disk before renaming.
+
+    Write data to a temporary file in the destination directory and rename it
+    over the destination. Since the rename is atomic, readers see either the
+    old or the new file contents. The temporary file is removed if anything
+    goes wrong.
+    """
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with AtomicWriter(path, mode, fsync=fsync) as fh:
+        fh.write(data)
+
+
+class AtomicWriter(object):
+    """
+    Context manager for writing a large file atomically, optionally
+    compressing it as it is written.
+
+    * *path* (str): Destination file path.
+    * *mode* (str): "wb" to write bytes or "w" to write text.
+    * *compression* (str): "gzip", "bz2", "xz", "auto" to pick one from the
+      file extension, or None.
+    * *level* (int): Compression level, defaulting to the format default.
+    * *buffer_size* (int): Number of bytes buffered before they are
+      compressed and written, so that small writes are cheap.
+    * *fsync* (bool): If True, flush the data to disk before renaming.
+    * *encoding* (str): Text encoding, for the "w" mode.
+    * *on_commit* (callable): Called with the writer once the file has been
+      renamed over the destination.
+
+    The data is written to a temporary file in the destination directory,
+    which is renamed over the destination when the block exits normally, and
+    removed if it exits with an exception::
+
+        with AtomicWriter("out.csv.gz", "w", compression="auto") as fh:
+            for row in rows:
+                fh.write(",".join(row) + "\\n")
+
+    The number of bytes written before and after compression and the time
+    spent are kept in :attr:`bytes_written`, :attr:`bytes_stored` and
+    :attr:`elapsed`, and :attr:`committed` is set once the destination is
+    replaced.
+    """
+
+    def __init__(self, path, mode="wb", compression=None, level=None,
+                 buffer_size=2 ** 20, fsync=True, encoding="utf-8",
+                 on_commit=None):
+        if mode not in ("w", "wb"):
+            raise ValueError("Invalid output mode: %s" % mode)
+        if compression == "auto":
+            compression = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError("Invalid compression: %s" % compression)
+
+        self._path = os.path.abspath(path)
+        self._mode = mode
+        self._compression = compression
+        self._level = level
+        self._buffer_size = buffer_size
+        self._fsync = fsync
+        self._encoding = encoding
+        self._on_commit = on_commit
+        self._file = None
+        self._compressor = None
+        self._counter = None
+        self._stream = None
+        self._temp_path = None
+        self._start_time = None
+        self.bytes_written = 0
+        self.bytes_stored = 0
+        self.elapsed = 0.0
+        self.committed = False
+
+    def __enter__(self):
+        self._start_time = time.monotonic()
+        fd = self._create_temp_file()
+        try:
+            self._file = io.FileIO(fd, "wb")
+            target = self._file
+            if self._compression is not None:
+                target = self._compressor = self._open_compressor(target)
+            self._counter = _CountingWriter(target)
+            self._stream = io.BufferedWriter(self._counter, self._buffer_size)
+            if self._mode == "w":
+                self._stream = io.TextIOWrapper(self._stream,
+                                                encoding=self._encoding)
+        except BaseException:
+            self._abort()
+            raise
+        return self._stream
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is not None:
+            self._abort()
+            return
+
+        try:
+            self._stream.close()
+            if self._compressor is not None:
+                self._compressor.close()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            self.bytes_stored = self._file.tell()
+            self._file.close()
+            os.replace(self._temp_path, self._path)
+            self.committed = True
+        except BaseException:
+            self._abort()
+            raise
+        finally:
+            self.bytes_written = self._counter.count
+            self.elapsed = time.monotonic() - self._start_time
+
+        if self._on_commit is not None:
+            self._on_commit(self)
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the destination file path.
+        """
+        return self._path
+
+    def _abort(self):
+        """
+        Close the temporary file and remove it.
+        """
+        for stream in (self._stream, self._compressor, self._file):
+            if stream is not None:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+        try:
+            os.unlink(self._temp_path)
+        except OSError:
+            pass
+
+    def _create_temp_file(self):
+        """
+        Create a new temporary file next to the destination and return its
+        file descriptor. Unlike :func:`tempfile.mkstemp()`, which creates files
+        readable only by the owner, the file gets the usual permissions from
+        the umask, which the kernel applies, so the process umask is never
+        changed (which would affect files created by other threads).
+        """
+        directory = os.path.dirname(self._path)
+        prefix = ".{}.".format(os.path.basename(self._path))
+        while True:
+            self._temp_path = os.path.join(
+                directory, prefix + os.urandom(6).hex() + ".tmp")
+            try:
+                return os.open(self._temp_path, os.O_WRONLY | os.O_CREAT |
+                               os.O_EXCL | os.O_CLOEXEC, 0o666)
+            except FileExistsError:
+                continue
+
+    def _open_compressor(self, fileobj):
+        """
+        Return a compressed stream writing to a file object.
+        """
+        if self._compression == "gzip":
+            return gzip.GzipFile(filename="", mode="wb", fileobj=fileobj,
+                                 compresslevel=9 if self._level is None
+                                 else self._level)
+        if self._compression == "bz2":
+            return bz2.BZ2File(fileobj, "wb", compresslevel=9 if
+                               self._level is None else self._level)
+        return lzma.LZMAFile(fileobj, "wb", preset=self._level)
+
+
+class _CountingWriter(io.RawIOBase):
+    """
+    Raw stream that counts the bytes written to another stream.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self.count = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._target.write(data)
+        self.count += len(data)
+        return len(data)
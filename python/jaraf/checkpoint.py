@@ -0,0 +1,187 @@
+"""
+Durable checkpoints used by the :class:`~jaraf.App` class to resume long
+running jobs.
+
+Checkpoints are stored in an sqlite database in WAL mode. Completed units are
+buffered and committed in batches so that recording progress costs one fsync
+per batch rather than one per unit.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CheckpointStore(object):
+    """
+    Store of completed work units and small JSON-serializable state values.
+
+    * *path* (str): Database file path.
+    * *batch_size* (int): Maximum number of buffered completed units.
+    * *flush_secs* (float): Maximum number of seconds a completed unit stays
+      buffered.
+
+    Completed units are kept in memory as well, so :meth:`is_done()` doesn't
+    query the database. Units buffered when the process dies are lost and
+    redone by the next run, so the units should be idempotent.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_secs=5.0):
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_secs = flush_secs
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS units "
+                         "(key TEXT PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state "
+                         "(key TEXT PRIMARY KEY, value TEXT)")
+
+        self._done = set(row[0] for row in self._db.execute(
+            "SELECT key FROM units"))
+        self.resumed = len(self._done)
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._done)
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the database file path.
+        """
+        return self._path
+
+    def close(self):
+        """
+        Commit the buffered units and close the database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.close()
+                self._db = None
+
+    def flush(self):
+        """
+        Commit the buffered units.
+        """
+        with self._lock:
+            self._flush()
+
+    def get_state(self, key, default=None):
+        """
+        * *key* (str): State key.
+        * *default*: Value returned if the key has no value.
+
+        *Returns:* The state value saved with :meth:`set_state()`.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM state WHERE key = ?",
+                                   (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def is_done(self, key):
+        """
+        * *key* (str): Unit key.
+
+        *Returns:* True if the unit was marked as done.
+        """
+        return str(key) in self._done
+
+    def mark_done(self, key):
+        """
+        * *key* (str): Unit key.
+
+        Mark a unit as done. The unit is committed with the next batch.
+        """
+        key = str(key)
+        with self._lock:
+            if key in self._done:
+                return
+            self._done.add(key)
+            self._pending.append((key,))
+            if len(self._pending) >= self._batch_size or \
+                    time.monotonic() - self._last_flush >= self._flush_secs:
+                self._flush()
+
+    def remove(self):
+        """
+        Close the database and delete its files, e.g. once the job completed.
+        """
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.unlink(self._path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def set_state(self, key, value):
+        """
+        * *key* (str): State key.
+        * *value*: JSON-serializable value.
+
+        Save a state value, such as a cursor or partial totals. The value is
+        committed right away together with the buffered units, so a resumed
+        run never sees state that is newer than its completed units.
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._write_pending()
+                self._db.execute("INSERT OR REPLACE INTO state (key, value) "
+                                 "VALUES (?, ?)", (key, json.dumps(value)))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._last_flush = time.monotonic()
+
+    def skip_done(self, iterable, key=str):
+        """
+        * *iterable*: Work items.
+        * *key* (callable): Function returning the unit key of an item.
+
+        Yield the items that are not done, and mark each one as done when the
+        next item is requested, i.e. once the consumer finished processing it.
+        An item whose processing raises an exception is not marked::
+
+            for path in store.skip_done(paths):
+                process(path)
+
+        *Returns:* A generator of items.
+        """
+        for item in iterable:
+            item_key = key(item)
+            if self.is_done(item_key):
+                continue
+            yield item
+            self.mark_done(item_key)
+
+    def _flush(self):
+        """
+        Commit the buffered units. The lock must be held.
+        """
+        if self._pending:
+            self._db.execute("BEGIN")
+            try:
+                self._write_pending()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self._last_flush = time.monotonic()
+
+    def _write_pending(self):
+        """
+        Insert the buffered units in the current transaction.
+        """
+        self._db.executemany("INSERT OR IGNORE INTO units (key) VALUES (?)",
+                             self._pending)
+        self._pending = []
@@ -7,3 +7,6 @@ AppStatusOkay = 0
 AppStatusError = 1
 AppStatusArgumentError = 2
 AppStatusInitializationError = 3
+AppStatusInterrupted = 4
+AppStatusLocked = 5
+AppStatusStalled = 6
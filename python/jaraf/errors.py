@@ -5,6 +5,8 @@ Application error classes.
 from jaraf.codes import (AppStatusArgumentError,
                          AppStatusError,
                          AppStatusInitializationError,
+                         AppStatusInterrupted,
+                         AppStatusLocked,
                          AppStatusOkay)
 
 
@@ -42,3 +44,25 @@ class AppInitializationError(AppError):
     def __init__(self, *args, **kwargs):
         super(AppInitializationError, self).__init__(*args, **kwargs)
         self._status = kwargs.get("status", AppStatusInitializationError)
+
+
+class AppInterruptedError(AppError):
+    """
+    Exception raised when the application is interrupted by a second SIGTERM
+    or SIGINT before it finished shutting down.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AppInterruptedError, self).__init__(*args, **kwargs)
+        self._status = kwargs.get("status", AppStatusInterrupted)
+
+
+class AppLockedError(AppError):
+    """
+    Exception raised when the application doesn't run because another instance
+    holds the instance lock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AppLockedError, self).__init__(*args, **kwargs)
+        self._status = kwargs.get("status", AppStatusLocked)
@@ -0,0 +1,110 @@
+"""
+Event loop helpers used by the :class:`~jaraf.App` class to run coroutine
+:meth:`~jaraf.App.main()` methods.
+"""
+
+import asyncio
+import importlib
+import time
+
+from jaraf.timers import Histogram
+
+
+class LoopLagMonitor(object):
+    """
+    Measure how late an event loop wakes up from a sleep, which is the time
+    callbacks spend waiting for code that blocks the loop.
+
+    * *interval* (float): Number of seconds between checks.
+    """
+
+    def __init__(self, interval=0.1):
+        self._interval = interval
+        self._task = None
+        self.histogram = Histogram()
+        self.max = 0
+
+    @property
+    def count(self):
+        """
+        *Property.* Return the number of checks.
+        """
+        return self.histogram.count
+
+    def start(self, loop):
+        """
+        * *loop* (:class:`asyncio.AbstractEventLoop`): Loop to monitor.
+
+        Start monitoring the loop. Monitoring stops when the task is cancelled.
+        """
+        self._task = loop.create_task(self._monitor())
+
+    def percentile(self, pct):
+        """
+        * *pct* (float): Percentile to return, from 0 to 100.
+
+        *Returns:* An approximate lag percentile in seconds, or None if there
+        were no checks.
+        """
+        value = self.histogram.percentile(pct)
+        # The histogram returns bucket upper bounds, which may exceed the max.
+        return None if value is None else min(value, self.max) / 1e9
+
+    def stop(self, loop):
+        """
+        * *loop* (:class:`asyncio.AbstractEventLoop`): Monitored loop.
+
+        Stop monitoring the loop.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            loop.run_until_complete(asyncio.gather(self._task,
+                                                   return_exceptions=True))
+            self._task = None
+
+    async def _monitor(self):
+        """
+        Sleep for the interval and record the lag until cancelled.
+        """
+        while True:
+            expected = time.perf_counter_ns() + int(self._interval * 1e9)
+            await asyncio.sleep(self._interval)
+            lag = max(0, time.perf_counter_ns() - expected)
+            self.histogram.add(lag)
+            if lag > self.max:
+                self.max = lag
+
+
+def cancel_pending_tasks(loop):
+    """
+    * *loop* (:class:`asyncio.AbstractEventLoop`): Event loop.
+
+    Cancel all of the tasks of a loop that are still pending and wait for them
+    to finish, as :func:`asyncio.run()` does at exit.
+
+    *Returns:* The number of cancelled tasks.
+    """
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    return len(tasks)
+
+
+def load_loop_policy(policy):
+    """
+    * *policy*: An :class:`asyncio.AbstractEventLoopPolicy` instance or class,
+      or a "module:name" string naming one (e.g. "uvloop:EventLoopPolicy").
+
+    *Returns:* An event loop policy instance.
+    """
+    if isinstance(policy, str):
+        (module_name, sep, name) = policy.partition(":")
+        if not sep:
+            raise ValueError("Invalid loop policy %s, expected module:name"
+                             % policy)
+        policy = getattr(importlib.import_module(module_name), name)
+    if isinstance(policy, type):
+        policy = policy()
+    return policy
@@ -0,0 +1,260 @@
+"""
+Fork server that removes most of the startup latency of short-lived
+applications.
+
+A resident server process imports an :class:`~jaraf.App` subclass and its
+dependencies once and then waits for clients on a Unix socket. Each client
+sends its arguments, environment, working directory and stdio file
+descriptors, and the server forks a child that runs the application with them
+and reports the exit status back to the client::
+
+    # myapp_server.py
+    from jaraf.forkserver import ForkServer
+    from myapp import MyApp
+
+    ForkServer(MyApp, "/tmp/myapp.sock").serve_forever()
+
+The ``jaraf-fork-client`` command installed with the package then runs the
+application through the server::
+
+    $ jaraf-fork-client /tmp/myapp.sock --log-level DEBUG input.txt
+
+The client is the standalone :mod:`jaraf_forkclient` module, which only
+imports the standard library, so it pays the interpreter startup cost but
+not the cost of importing the jaraf package or warming up the
+application. Signals received by the client
+(e.g. Ctrl-C) are forwarded to the child.
+
+Unix only.
+"""
+
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+from jaraf.codes import AppStatusError
+# The client lives in a standalone module so that it starts without importing
+# the jaraf package. It is re-exported here for convenience.
+from jaraf_forkclient import INT as _INT, client_main, run_client
+
+# Maximum size of a request.
+_MAX_REQUEST_SIZE = 1 << 20
+
+LOG = logging.getLogger("jaraf:forkserver")
+
+
+class ForkServer(object):
+    """
+    Server that forks a child to run an application for every client
+    connection.
+
+    * *app_factory* (callable): Called without arguments in each child to
+      create the application, e.g. an :class:`~jaraf.App` subclass.
+    * *socket_path* (str): Path of the Unix socket to listen on. The socket is
+      only accessible by the user running the server.
+    * *preload* (callable): Optional function called once before serving, to
+      import modules or warm up caches that children inherit.
+    """
+
+    def __init__(self, app_factory, socket_path, preload=None):
+        self._app_factory = app_factory
+        self._socket_path = os.path.abspath(socket_path)
+        self._preload = preload
+        self._children = set()
+        self._stop = threading.Event()
+        self._socket = None
+
+    @property
+    def children(self):
+        """
+        *Property.* Return the set of pids of running children.
+        """
+        return set(self._children)
+
+    def serve_forever(self):
+        """
+        Serve clients until :meth:`stop()` is called or the server receives
+        SIGTERM or SIGINT. Children that are still running are left to finish.
+        """
+        if self._preload is not None:
+            self._preload()
+
+        self._listen()
+
+        # Signal handlers can only be installed from the main thread.
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(
+                    signum, lambda signum, frame: self.stop())
+
+        LOG.info("Fork server listening on %s", self._socket_path)
+        try:
+            while not self._stop.is_set():
+                self._reap_children()
+                try:
+                    (conn, address) = self._socket.accept()
+                except socket.timeout:
+                    continue
+                except InterruptedError:
+                    continue
+                with conn:
+                    self._handle(conn)
+
+        finally:
+            for (signum, handler) in previous_handlers.items():
+                signal.signal(signum, handler)
+            self._close()
+            self._reap_children()
+
+    def stop(self):
+        """
+        Stop serving after the current connection is handled. This is safe to
+        call from any thread.
+        """
+        self._stop.set()
+
+    def _close(self):
+        """
+        Close and remove the server socket.
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+
+    def _handle(self, conn):
+        """
+        Receive a request and fork a child to run it.
+        """
+        conn.settimeout(5)
+        try:
+            (request, fds) = _receive_request(conn)
+        except (OSError, ValueError) as err:
+            LOG.error("Invalid fork server request: %s", err)
+            return
+        if request is None:
+            return
+
+        try:
+            pid = os.fork()
+            if pid == 0:
+                self._run_child(conn, request, fds)
+            self._children.add(pid)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _listen(self):
+        """
+        Bind the server socket, replacing a stale socket file left by a server
+        that is no longer running.
+        """
+        if os.path.exists(self._socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self._socket_path)
+            else:
+                raise RuntimeError("A fork server is already listening on %s"
+                                   % self._socket_path)
+            finally:
+                probe.close()
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(self._socket_path)
+        finally:
+            os.umask(umask)
+        self._socket.listen(128)
+
+        # Wake up periodically to reap children and check for stop().
+        self._socket.settimeout(0.5)
+
+    def _reap_children(self):
+        """
+        Collect the exit status of children that finished.
+        """
+        for pid in list(self._children):
+            try:
+                (done, status) = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self._children.discard(pid)
+
+    def _run_child(self, conn, request, fds):
+        """
+        Run the application in the forked child and exit. This never returns.
+        """
+        status = AppStatusError
+        try:
+            self._socket.close()
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+
+            # Take over the client's stdio and environment.
+            for (target, fd) in enumerate(fds[:3]):
+                os.dup2(fd, target)
+            os.environ.clear()
+            os.environ.update(request["env"])
+            os.chdir(request["cwd"])
+            sys.argv = [request["program"]] + request["args"]
+
+            # Children must not share the server's random state.
+            random.seed()
+
+            conn.sendall(_INT.pack(os.getpid()))
+            status = self._app_factory().run(args=request["args"])
+
+        except BaseException:
+            traceback.print_exc()
+
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                conn.sendall(_INT.pack(status))
+            except Exception:
+                pass
+            os._exit(status & 0xFF)
+
+
+def _receive_request(conn):
+    """
+    Receive a request and the file descriptors sent with it. A connection
+    closed without a request (e.g. by a server checking for a running server)
+    returns a None request.
+    """
+    (data, fds, flags, address) = socket.recv_fds(conn, 65536, 3)
+    if not data and not fds:
+        return (None, [])
+    try:
+        if len(data) < _INT.size:
+            raise ValueError("Truncated request")
+        size = _INT.unpack(data[:_INT.size])[0]
+        if size > _MAX_REQUEST_SIZE:
+            raise ValueError("Request too large: %d bytes" % size)
+        data = data[_INT.size:]
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ValueError("Truncated request")
+            data += chunk
+        return (json.loads(data.decode()), fds)
+
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
@@ -0,0 +1,205 @@
+"""
+Lock file used by the :class:`~jaraf.App` class to prevent overlapping runs
+of the same application.
+
+The lock is an :func:`fcntl.flock` lock, so it is released by the kernel when
+the holder exits, even if it crashes, and a leftover lock file is never
+mistaken for a running instance. Lock files are opened without following
+symbolic links, and are kept by default in a directory private to the user,
+so that another user can't redirect or hold them.
+"""
+
+import fcntl
+import os
+import signal
+import stat
+import time
+
+# Lock policies.
+POLICIES = ("skip", "wait", "kill")
+
+
+def default_lock_dir():
+    """
+    Return the default lock directory: ``$XDG_RUNTIME_DIR`` if it is set,
+    otherwise a ``jaraf-UID`` directory in the temporary directory, which is
+    created with mode 0700 if needed.
+
+    Raises a :class:`PermissionError` if the directory is a symbolic link, is
+    owned by another user or is accessible by other users.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return runtime_dir
+
+    import tempfile
+
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), "jaraf-%d" % uid)
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+
+    st = os.lstat(path)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or
+            st.st_mode & (stat.S_IRWXG | stat.S_IRWXO)):
+        raise PermissionError("Unsafe lock directory %s: it must be a "
+                              "directory owned by uid %d with mode 0700"
+                              % (path, uid))
+    return path
+
+
+class InstanceLock(object):
+    """
+    Exclusive lock on a lock file. The pid of the holder is written to the
+    file so that other instances can report or kill it.
+
+    * *path* (str): Lock file path.
+    """
+
+    # Longest sleep between attempts to take the lock.
+    _MAX_POLL_SECS = 0.5
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = None
+        self.holder_pid = None
+        self.wait_time = 0.0
+        self.killed_pid = None
+
+    @property
+    def locked(self):
+        """
+        *Property.* Return True if the lock is held by this object.
+        """
+        return self._fd is not None
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the lock file path.
+        """
+        return self._path
+
+    def acquire(self, policy="skip", timeout=None, kill_grace=10.0):
+        """
+        * *policy* (str): What to do if another process holds the lock:
+          "skip" gives up immediately, "wait" waits up to *timeout* seconds,
+          and "kill" waits up to *timeout* seconds, then terminates the holder.
+        * *timeout* (float): Maximum number of seconds to wait, or None to wait
+          forever. With the "kill" policy, None means to kill the holder right
+          away.
+        * *kill_grace* (float): Number of seconds to wait after SIGTERM before
+          sending SIGKILL to the holder.
+
+        Take the lock. The time spent waiting is kept in :attr:`wait_time`,
+        and the pid of the process holding the lock in :attr:`holder_pid`.
+        Errors opening the lock file, e.g. if it is a symbolic link or belongs
+        to another user, raise an :class:`OSError`.
+
+        *Returns:* True if the lock was taken, False otherwise.
+        """
+        if policy not in POLICIES:
+            raise ValueError("Invalid lock policy: %s" % policy)
+
+        start_time = time.monotonic()
+        acquired = False
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT |
+                           os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+        if not stat.S_ISREG(os.fstat(self._fd).st_mode):
+            os.close(self._fd)
+            self._fd = None
+            raise OSError("Lock file %s is not a regular file" % self._path)
+        try:
+            if policy == "skip":
+                acquired = self._try_lock()
+            elif policy == "wait":
+                acquired = self._wait(timeout)
+            else:
+                acquired = self._wait(timeout or 0)
+                if not acquired and self.holder_pid is not None:
+                    self._kill_holder(kill_grace)
+                    acquired = self._wait(kill_grace)
+        finally:
+            self.wait_time = time.monotonic() - start_time
+            if not acquired:
+                # Closing the file also drops the lock if it was taken.
+                os.close(self._fd)
+                self._fd = None
+
+        if not acquired:
+            return False
+
+        # Record our pid for the next instance.
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, ("%d\n" % os.getpid()).encode(), 0)
+        return True
+
+    def release(self):
+        """
+        Release the lock. The lock file is left in place since removing it
+        would let two processes lock different files with the same path.
+        """
+        if self._fd is not None:
+            try:
+                os.ftruncate(self._fd, 0)
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def _kill_holder(self, grace):
+        """
+        Terminate the process holding the lock, killing it if it doesn't exit
+        within the grace period.
+        """
+        pid = self.holder_pid
+        self.killed_pid = pid
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + grace
+            while time.monotonic() < deadline:
+                if self._try_lock():
+                    return
+                time.sleep(0.05)
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _read_holder_pid(self):
+        """
+        Return the pid written to the lock file by its holder, or None.
+        """
+        try:
+            return int(os.pread(self._fd, 32, 0).decode().strip())
+        except ValueError:
+            return None
+
+    def _try_lock(self):
+        """
+        Try to take the lock without blocking.
+        """
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self.holder_pid = self._read_holder_pid()
+            return False
+
+    def _wait(self, timeout):
+        """
+        Try to take the lock until it succeeds or the timeout expires, backing
+        off between attempts.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.01
+        while not self._try_lock():
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            delay = min(delay * 2, self._MAX_POLL_SECS)
+        return True
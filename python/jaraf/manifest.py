@@ -0,0 +1,138 @@
+"""
+Input manifests used by the :class:`~jaraf.App` class to read large lists of
+inputs (e.g. file paths) without passing them as command-line arguments.
+
+A manifest is a file, or the standard input, listing one item per record.
+Records are separated by newlines, or by NUL bytes as written by
+``find -print0``, and the file may be gzip-compressed. Manifests are read in
+blocks as they are iterated, so the memory used doesn't depend on the number
+of items.
+"""
+
+import gzip
+import io
+import itertools
+import os
+import re
+import sys
+
+# Number of bytes read at a time.
+BLOCK_SIZE = 2 ** 20
+
+# Gzip magic number.
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class Manifest(object):
+    """
+    Lazy iterator over the items of a manifest.
+
+    * *path* (str): Manifest path, or "-" for the standard input.
+    * *separator* (bytes): Record separator, b"\\n" or b"\\0". By default, NUL
+      separators are used if the first block contains a NUL byte.
+
+    Gzip compression is detected from the content. Items are decoded with
+    :func:`os.fsdecode()`, so any file name can be represented, and empty
+    records (e.g. blank lines) are skipped. The standard input can only be
+    read once::
+
+        manifest = Manifest("inputs.txt.gz")
+        total = manifest.count()
+        for path in manifest.items(start=done):
+            process(path)
+
+    """
+
+    def __init__(self, path, separator=None):
+        if separator not in (None, b"\n", b"\0"):
+            raise ValueError("Invalid manifest separator: %r" % separator)
+        self._path = path
+        self._separator = separator
+        self.items_read = 0
+
+    def __iter__(self):
+        return self.items()
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the manifest path.
+        """
+        return self._path
+
+    def count(self):
+        """
+        Count the items without decoding them. This reads the whole manifest,
+        so it isn't possible with the standard input.
+
+        *Returns:* The number of items.
+        """
+        if self._path == "-":
+            raise ValueError("Unable to count the items of a manifest read "
+                             "from the standard input")
+
+        count = 0
+        pattern = None
+        continued = False
+        for (separator, block) in self._blocks():
+            if pattern is None:
+                pattern = re.compile(b"[^" + re.escape(separator) + b"]+")
+            count += sum(1 for _ in pattern.finditer(block))
+            # A record split between two blocks was counted twice.
+            if continued and block[:1] != separator:
+                count -= 1
+            continued = block[-1:] != separator
+        return count
+
+    def items(self, start=0):
+        """
+        * *start* (int): Number of items to skip. Skipped items are not
+          decoded.
+
+        *Returns:* A generator of the items, as strings.
+        """
+        for record in itertools.islice(self._records(), start, None):
+            self.items_read += 1
+            yield os.fsdecode(record)
+
+    def _blocks(self):
+        """
+        Yield (separator, block) tuples with the raw blocks of the manifest.
+        """
+        if self._path == "-":
+            raw = None
+            fh = sys.stdin.buffer
+        else:
+            raw = fh = open(self._path, "rb")
+
+        try:
+            if not isinstance(fh, io.BufferedReader):
+                fh = io.BufferedReader(fh)
+            if fh.peek(2)[:2] == _GZIP_MAGIC:
+                fh = gzip.GzipFile(fileobj=fh)
+
+            separator = self._separator
+            while True:
+                block = fh.read(BLOCK_SIZE)
+                if not block:
+                    break
+                if separator is None:
+                    separator = b"\0" if b"\0" in block else b"\n"
+                yield (separator, block)
+        finally:
+            if raw is not None:
+                raw.close()
+
+    def _records(self):
+        """
+        Yield the non-empty records of the manifest, as bytes.
+        """
+        tail = b""
+        for (separator, block) in self._blocks():
+            records = (tail + block).split(separator)
+            tail = records.pop()
+            for record in records:
+                if record:
+                    yield record
+        if tail:
+            yield tail
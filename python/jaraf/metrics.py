@@ -0,0 +1,471 @@
+"""
+Application metrics with exporters for the Prometheus node-exporter textfile
+collector and StatsD.
+
+Counters and histograms are updated from many places, possibly from several
+threads, so each thread records into its own cell and the cells are only
+summed when the metrics are exported. Recording never takes a lock.::
+
+    registry = MetricsRegistry()
+    records = registry.counter("records_total", "Records processed.")
+    latency = registry.histogram("request_seconds", "Request latency.")
+
+    records.inc()
+    latency.observe(0.25)
+
+    PrometheusTextfileExporter(registry, "/var/lib/node_exporter/app.prom",
+                               labels={"app": "myapp"}).export()
+"""
+
+import bisect
+import collections
+import math
+import re
+import socket
+import threading
+
+from jaraf.atomic import atomic_write
+
+# Default histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def sanitize_name(name):
+    """
+    * *name* (str): Metric name.
+
+    Replace characters that are not valid in Prometheus metric names with
+    underscores.
+
+    *Returns:* A valid metric name.
+    """
+    name = _INVALID_NAME_CHARS.sub("_", name)
+    if name[:1].isdigit():
+        name = "_" + name
+    return name
+
+
+class Counter(object):
+    """
+    Monotonically increasing counter.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._cells = {}
+
+    def inc(self, amount=1):
+        """
+        * *amount* (float): Amount to add to the counter.
+
+        Increment the counter.
+        """
+        try:
+            self._cells[threading.get_ident()][0] += amount
+        except KeyError:
+            self._cells[threading.get_ident()] = [amount]
+
+    @property
+    def value(self):
+        """
+        *Property.* Return the current counter value.
+        """
+        return sum(cell[0] for cell in list(self._cells.values()))
+
+
+class Gauge(object):
+    """
+    Value that can go up and down. A gauge is either set explicitly or, if a
+    function is given with :meth:`set_function()`, computed when it is read.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def dec(self, amount=1):
+        """
+        * *amount* (float): Amount to subtract from the gauge.
+
+        Decrement the gauge.
+        """
+        self.inc(-amount)
+
+    def inc(self, amount=1):
+        """
+        * *amount* (float): Amount to add to the gauge.
+
+        Increment the gauge. Unlike :meth:`set()`, this takes a lock so that
+        concurrent updates are not lost.
+        """
+        with self._lock:
+            self._value += amount
+
+    def set(self, value):
+        """
+        * *value* (float): New gauge value.
+
+        Set the gauge value.
+        """
+        self._function = None
+        self._value = value
+
+    def set_function(self, function):
+        """
+        * *function* (callable): Function returning the gauge value.
+
+        Compute the gauge value by calling a function whenever it is read.
+        """
+        self._function = function
+
+    @property
+    def value(self):
+        """
+        *Property.* Return the current gauge value.
+        """
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+
+class Histogram(object):
+    """
+    Histogram of observed values with fixed bucket upper bounds.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._cells = {}
+
+    def observe(self, value):
+        """
+        * *value* (float): Observed value.
+
+        Record an observation.
+        """
+        try:
+            cell = self._cells[threading.get_ident()]
+        except KeyError:
+            # Bucket counts, followed by the +Inf bucket, sum and count.
+            cell = self._cells[threading.get_ident()] = \
+                [0] * (len(self.buckets) + 3)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @property
+    def value(self):
+        """
+        *Property.* Return a tuple of the per-bucket (non-cumulative) counts
+        including the +Inf bucket, the sum and the count of the observations.
+        """
+        totals = [0] * (len(self.buckets) + 3)
+        for cell in list(self._cells.values()):
+            for (index, value) in enumerate(cell):
+                totals[index] += value
+        return (totals[:-2], totals[-2], totals[-1])
+
+
+class MetricsRegistry(object):
+    """
+    Collection of metrics keyed by name.
+    """
+
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(list(self._metrics.values()))
+
+    def counter(self, name, help=""):
+        """
+        Return the :class:`Counter` with the given name, creating it if needed.
+        """
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        """
+        Return the :class:`Gauge` with the given name, creating it if needed.
+        """
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        """
+        Return the :class:`Histogram` with the given name, creating it if
+        needed.
+        """
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def snapshot(self):
+        """
+        Return a dictionary mapping metric names to their current values. The
+        value of a histogram is a dictionary with its count and sum.
+        """
+        values = collections.OrderedDict()
+        for metric in self:
+            if metric.kind == "histogram":
+                (counts, total, count) = metric.value
+                values[metric.name] = {"count": count, "sum": total}
+            else:
+                values[metric.name] = metric.value
+        return values
+
+    def _get(self, cls, name, help, **kwargs):
+        """
+        Return an existing metric, or register a new one.
+        """
+        name = sanitize_name(name)
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, help, **kwargs)
+        if not isinstance(metric, cls):
+            raise ValueError("Metric %s is already registered as a %s"
+                             % (name, metric.kind))
+        return metric
+
+
+class PrometheusTextfileExporter(object):
+    """
+    Export metrics in the Prometheus text format to a file read by the
+    node-exporter textfile collector. The file is replaced atomically so the
+    collector never reads a partial file.
+
+    * *registry* (:class:`MetricsRegistry`): Metrics to export.
+    * *path* (str): Output file path, which should end with ``.prom``.
+    * *labels* (dict): Labels added to every exported sample.
+    * *interval* (float): If set, :meth:`start()` exports every *interval*
+      seconds from a background thread.
+    """
+
+    def __init__(self, registry, path, labels=None, interval=None):
+        self._registry = registry
+        self._path = path
+        self._labels = labels or {}
+        self._interval = interval
+        self._event = threading.Event()
+        self._thread = None
+
+    def export(self):
+        """
+        Write all of the metrics to the output file.
+        """
+        atomic_write(self._path, self.format(), fsync=False)
+
+    def format(self):
+        """
+        Format all of the metrics in the Prometheus text exposition format.
+
+        *Returns:* A string.
+        """
+        lines = []
+        for metric in self._registry:
+            if metric.help:
+                lines.append("# HELP {} {}".format(
+                    metric.name,
+                    metric.help.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+
+            if metric.kind == "histogram":
+                (counts, total, count) = metric.value
+                cumulative = 0
+                bounds = [self._format_value(bound)
+                          for bound in metric.buckets] + ["+Inf"]
+                for (bound, bucket_count) in zip(bounds, counts):
+                    cumulative += bucket_count
+                    lines.append("{}_bucket{} {}".format(
+                        metric.name, self._format_labels(le=bound),
+                        cumulative))
+                lines.append("{}_sum{} {}".format(
+                    metric.name, self._format_labels(),
+                    self._format_value(total)))
+                lines.append("{}_count{} {}".format(
+                    metric.name, self._format_labels(), count))
+            else:
+                lines.append("{}{} {}".format(
+                    metric.name, self._format_labels(),
+                    self._format_value(metric.value)))
+
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        """
+        Start exporting periodically if an interval was given.
+        """
+        if self._interval:
+            self._thread = threading.Thread(target=self._export_loop,
+                                            name="jaraf-prometheus-exporter")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop exporting periodically and do a final export.
+        """
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def _export_loop(self):
+        """
+        Export every interval seconds until stopped.
+        """
+        while not self._event.wait(self._interval):
+            self.export()
+
+    def _format_labels(self, **extra):
+        """
+        Format the labels of a sample.
+        """
+        labels = dict(self._labels)
+        labels.update(extra)
+        if not labels:
+            return ""
+        return "{" + ",".join(
+            '{}="{}"'.format(sanitize_name(key),
+                             str(value).replace("\\", "\\\\")
+                             .replace('"', '\\"').replace("\n", "\\n"))
+            for (key, value) in sorted(labels.items())) + "}"
+
+    @staticmethod
+    def _format_value(value):
+        """
+        Format a sample value.
+        """
+        if isinstance(value, float):
+            if math.isinf(value):
+                return "+Inf" if value > 0 else "-Inf"
+            return repr(value)
+        return str(value)
+
+
+class StatsDExporter(object):
+    """
+    Export metrics to a StatsD daemon over UDP.
+
+    Counters are sent as count deltas since the previous export and gauges as
+    their current values. Since observations are aggregated locally, a
+    histogram is sent as the deltas of its ``.count`` and ``.sum`` counters.
+
+    * *registry* (:class:`MetricsRegistry`): Metrics to export.
+    * *host* (str): StatsD host.
+    * *port* (int): StatsD port.
+    * *prefix* (str): Prefix added to every metric name.
+    * *interval* (float): If set, :meth:`start()` exports every *interval*
+      seconds from a background thread.
+    """
+
+    # Keep datagrams below the typical path MTU.
+    MAX_PACKET_SIZE = 1432
+
+    def __init__(self, registry, host="127.0.0.1", port=8125, prefix="",
+                 interval=None):
+        self._registry = registry
+        self._address = (host, port)
+        self._prefix = prefix
+        self._interval = interval
+        self._sent = {}
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self):
+        """
+        Send the metrics that changed since the previous export.
+        """
+        with self._lock:
+            lines = []
+            for metric in self._registry:
+                name = self._prefix + metric.name
+                if metric.kind == "counter":
+                    self._add_delta(lines, name, metric.value)
+                elif metric.kind == "gauge":
+                    lines.append("{}:{}|g".format(name, metric.value))
+                else:
+                    (counts, total, count) = metric.value
+                    self._add_delta(lines, name + ".count", count)
+                    self._add_delta(lines, name + ".sum", total)
+            self._send(lines)
+
+    def start(self):
+        """
+        Start exporting periodically if an interval was given.
+        """
+        if self._interval:
+            self._thread = threading.Thread(target=self._export_loop,
+                                            name="jaraf-statsd-exporter")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop exporting periodically, do a final export and close the socket.
+        """
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+        self.export()
+        self._socket.close()
+
+    def _add_delta(self, lines, name, value):
+        """
+        Add a counter line for the change in a value since the last export.
+        """
+        delta = value - self._sent.get(name, 0)
+        if delta:
+            lines.append("{}:{}|c".format(name, delta))
+            self._sent[name] = value
+
+    def _export_loop(self):
+        """
+        Export every interval seconds until stopped.
+        """
+        while not self._event.wait(self._interval):
+            self.export()
+
+    def _send(self, lines):
+        """
+        Send lines in as few datagrams as possible.
+        """
+        packets = []
+        packet = []
+        size = 0
+        for line in lines:
+            if packet and size + len(line) + 1 > self.MAX_PACKET_SIZE:
+                packets.append(packet)
+                packet = []
+                size = 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            packets.append(packet)
+
+        # StatsD is fire-and-forget, so a daemon that isn't listening is not an
+        # error.
+        for packet in packets:
+            try:
+                self._socket.sendto("\n".join(packet).encode(), self._address)
+            except OSError:
+                pass
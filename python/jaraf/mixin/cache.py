@@ -0,0 +1,527 @@
+"""
+Mixin that adds a persistent memoization cache, so that expensive results
+(e.g. parsed reference files or derived data) are computed once and reused by
+later runs. As a mixin, this module is not meant to be used as a standalone
+and requires certain members and methods from the App base class to be
+defined.
+
+Entries are pickled into an sqlite database in WAL mode that can be shared by
+several processes, with a small in-memory tier in front of it for repeated
+lookups within a run. Entries may expire after a TTL, and the least recently
+used entries are evicted when the database exceeds its byte budget. There are
+a few constructor parameters supported to configure the cache:
+
+* *cache* (str): Cache database path (default=a ``.cache.sqlite`` file next to
+  the log). Also set with the ``--cache PATH`` option.
+* *cache_max_bytes* (int): Byte budget of the pickled values (default=256
+  MiB). Also set with the ``--cache-max-bytes N`` option.
+* *cache_ttl* (float): Default number of seconds before an entry expires
+  (default=None, never).
+* *cache_memory_items* (int): Number of entries kept in the in-memory tier
+  (default=1024, 0 to disable it).
+
+Methods of the application are memoized with the :func:`cached` decorator,
+and other functions with :meth:`DiskCache.memoize()`::
+
+    from jaraf import App
+    from jaraf.mixin.cache import CacheMixin, cached
+
+    class MyApp(CacheMixin, App):
+
+        @cached(ttl=86400)
+        def load_reference(self, path, mtime):
+            return parse(path)
+
+    if __name__ == "__main__":
+        app = MyApp(cache_max_bytes=2 ** 30)
+
+Cache keys are SHA-256 hashes of the function name and the :func:`repr` of
+its arguments (excluding *self*), so arguments must have stable
+representations, and anything the result depends on (such as the file
+modification time above) must be passed as an argument. The items of sets and
+dictionaries are sorted, and arguments with the default representation,
+which includes their memory address, raise a :class:`TypeError`. Entries that
+can no longer be unpickled (e.g. after a cached class was renamed) are
+deleted and treated as misses. The hits, misses and evictions are reported in
+the footer.
+"""
+
+import collections
+import functools
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+# Marker for cache misses, since None is a valid cached value.
+_MISSING = object()
+
+# Memory address in a default representation, e.g. <object at 0x7f...>.
+_ADDRESS_RE = re.compile(r" at 0x[0-9a-fA-F]+")
+
+# Types whose representation is always stable.
+_PLAIN_TYPES = (str, bytes, int, float, complex, bool, type(None))
+
+
+class DiskCache(object):
+    """
+    Cache stored in an sqlite database that can be shared by several
+    processes.
+
+    * *path* (str): Database file path.
+    * *max_bytes* (int): Byte budget of the stored values.
+    * *ttl* (float): Default number of seconds before an entry expires, or
+      None for no expiration.
+    * *memory_items* (int): Number of entries kept in the in-memory tier.
+    * *busy_timeout* (float): Number of seconds to wait for another process to
+      finish a transaction.
+
+    Values returned from the in-memory tier are the cached objects themselves,
+    so they must not be modified. The in-memory tier doesn't see entries that
+    other processes delete or replace, so it should only be used for the
+    lifetime of a run.
+    """
+
+    # Fraction of the byte budget kept after an eviction, so that evictions
+    # don't happen on every write once the cache is full.
+    _EVICT_TO = 0.9
+
+    def __init__(self, path, max_bytes=256 * 2 ** 20, ttl=None,
+                 memory_items=1024, busy_timeout=30):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._memory_items = memory_items
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, timeout=busy_timeout,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries "
+                         "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, "
+                         "expires REAL, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed "
+                         "ON entries (accessed)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_expires "
+                         "ON entries (expires)")
+        # Running total of the entry sizes, so that checking the byte budget
+        # doesn't scan the table.
+        self._db.execute("CREATE TABLE IF NOT EXISTS total (bytes INTEGER)")
+        self._db.execute("INSERT INTO total SELECT COALESCE(SUM(size), 0) "
+                         "FROM entries WHERE NOT EXISTS "
+                         "(SELECT * FROM total)")
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the database file path.
+        """
+        return self._path
+
+    def clear(self):
+        """
+        Remove all of the entries.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("UPDATE total SET bytes = 0")
+            self._db.execute("COMMIT")
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def delete(self, key):
+        """
+        * *key* (str): Entry key.
+
+        Remove an entry.
+        """
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete([(key,)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get(self, key, default=None):
+        """
+        * *key* (str): Entry key.
+        * *default*: Value returned if there is no valid entry.
+
+        *Returns:* The cached value, or *default*.
+        """
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    def get_or_call(self, key, func, args=(), kwargs=None, ttl=None):
+        """
+        * *key* (str): Entry key.
+        * *func* (callable): Function computing the value on a miss.
+        * *args* (tuple): Positional arguments of the function.
+        * *kwargs* (dict): Keyword arguments of the function.
+        * *ttl* (float): Number of seconds before the entry expires,
+          defaulting to the cache TTL.
+
+        *Returns:* The cached value, calling the function and caching its
+        result on a miss. Exceptions are not cached.
+        """
+        value = self._get(key)
+        if value is _MISSING:
+            value = func(*args, **(kwargs or {}))
+            self.set(key, value, ttl)
+        return value
+
+    def memoize(self, ttl=None, name=None):
+        """
+        * *ttl* (float): Number of seconds before an entry expires, defaulting
+          to the cache TTL.
+        * *name* (str): Name used in the keys, defaulting to the qualified
+          function name. Changing it invalidates the cached results.
+
+        *Returns:* A decorator that caches the results of a function::
+
+            parse = cache.memoize(ttl=3600)(parse_reference)
+
+        """
+        def decorator(func):
+            prefix = name or "%s.%s" % (func.__module__, func.__qualname__)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.get_or_call(make_key(prefix, args, kwargs), func,
+                                        args, kwargs, ttl)
+            return wrapper
+        return decorator
+
+    def set(self, key, value, ttl=None):
+        """
+        * *key* (str): Entry key.
+        * *value*: Picklable value.
+        * *ttl* (float): Number of seconds before the entry expires,
+          defaulting to the cache TTL.
+
+        Store a value, evicting the least recently used entries if the cache
+        exceeds its byte budget.
+        """
+        ttl = self._ttl if ttl is None else ttl
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete([(key,)])
+                self._db.execute("INSERT INTO entries "
+                                 "(key, value, size, expires, accessed) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (key, data, len(data), expires, now))
+                self._db.execute("UPDATE total SET bytes = bytes + ?",
+                                 (len(data),))
+                evicted = self._evict(now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+            # The in-memory tier is only updated once the value is stored, so
+            # that it never serves a value that the disk store doesn't have.
+            if key in evicted:
+                self._memory.pop(key, None)
+            else:
+                self._remember(key, value, expires)
+
+    def size(self):
+        """
+        *Returns:* The number of entries and their total size in bytes.
+        """
+        with self._lock:
+            return (self._db.execute("SELECT COUNT(*) FROM entries")
+                    .fetchone()[0],
+                    self._db.execute("SELECT bytes FROM total").fetchone()[0])
+
+    def _delete(self, keys):
+        """
+        Delete entries and subtract their sizes from the total. A transaction
+        must be active.
+
+        *Returns:* The number of deleted entries.
+        """
+        deleted = 0
+        for (key,) in keys:
+            row = self._db.execute("SELECT size FROM entries WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is not None:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.execute("UPDATE total SET bytes = bytes - ?", row)
+                deleted += 1
+        return deleted
+
+    def _evict(self, now):
+        """
+        Delete the expired entries, then the least recently used ones while
+        the cache is over its byte budget. A transaction must be active.
+
+        *Returns:* The keys of the deleted entries.
+        """
+        expired = self._db.execute("SELECT key FROM entries "
+                                   "WHERE expires <= ?", (now,)).fetchall()
+        self.evictions += self._delete(expired)
+
+        total = self._db.execute("SELECT bytes FROM total").fetchone()[0]
+        if total <= self._max_bytes:
+            return set(key for (key,) in expired)
+
+        excess = total - int(self._max_bytes * self._EVICT_TO)
+        keys = []
+        for (key, size) in self._db.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.evictions += self._delete(keys)
+        for (key,) in keys:
+            self._memory.pop(key, None)
+        return set(key for (key,) in expired + keys)
+
+    def _get(self, key):
+        """
+        Return the cached value of a key, or _MISSING.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                (expires, value) = entry
+                if expires is None or expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, expires FROM entries "
+                                   "WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses += 1
+                return _MISSING
+
+            try:
+                value = pickle.loads(row[0])
+            except Exception:
+                # Unpickling fails if a cached class was moved or renamed,
+                # so drop the entry rather than fail on every later lookup.
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._delete([(key,)])
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                self.errors += 1
+                self.misses += 1
+                return _MISSING
+
+            # The access time only orders evictions, so a lost update
+            # between processes doesn't matter.
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?",
+                             (now, key))
+            self._remember(key, value, row[1])
+            self.hits += 1
+            return value
+
+    def _remember(self, key, value, expires):
+        """
+        Keep a value in the in-memory tier, dropping the least recently used
+        entry if it is full. The lock must be held.
+        """
+        if self._memory_items <= 0:
+            return
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+
+def cached(ttl=None, name=None):
+    """
+    * *ttl* (float): Number of seconds before an entry expires, defaulting to
+      the cache TTL of the application.
+    * *name* (str): Name used in the keys, defaulting to the qualified method
+      name. Changing it invalidates the cached results.
+
+    *Returns:* A decorator that caches the results of a method of a
+    :class:`CacheMixin` application in its :attr:`~CacheMixin.cache`.
+    """
+    def decorator(func):
+        prefix = name or "%s.%s" % (func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return self.cache.get_or_call(make_key(prefix, args, kwargs),
+                                          func, (self,) + args, kwargs, ttl)
+        return wrapper
+    return decorator
+
+
+def make_key(name, args=(), kwargs=None):
+    """
+    * *name* (str): Function name.
+    * *args* (tuple): Positional arguments.
+    * *kwargs* (dict): Keyword arguments.
+
+    *Returns:* A stable cache key for a function call. Raises a
+    :class:`TypeError` if an argument has no stable representation.
+    """
+    text = "%s%s%s" % (name, _stable_repr(tuple(args)),
+                       _stable_repr(kwargs or {}))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _stable_repr(value):
+    """
+    Return a representation of a value that is the same in every process:
+    set and dictionary items are sorted since their order depends on hash
+    randomization or insertion order, and default representations, which
+    include a memory address, are rejected.
+    """
+    if isinstance(value, _PLAIN_TYPES):
+        return repr(value)
+
+    kind = type(value).__qualname__
+    if isinstance(value, (set, frozenset)):
+        return "%s{%s}" % (kind, ", ".join(sorted(_stable_repr(item)
+                                                  for item in value)))
+    if isinstance(value, dict):
+        return "%s{%s}" % (kind, ", ".join(sorted(
+            "%s: %s" % (_stable_repr(k), _stable_repr(v))
+            for (k, v) in value.items())))
+    if isinstance(value, (list, tuple)):
+        return "%s(%s)" % (kind, ", ".join(_stable_repr(item)
+                                           for item in value))
+
+    text = repr(value)
+    if _ADDRESS_RE.search(text):
+        raise TypeError("Unable to make a stable cache key from %s, which "
+                        "has no stable representation" % text)
+    return text
+
+
+class CacheMixin(object):
+    """
+    Application framework mixin class that adds a persistent memoization
+    cache.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        super(CacheMixin, self).__init__(*args, **kwargs)
+
+        # Cache parameters.
+        self._cache = None
+        self._cache_path = kwargs.get("cache")
+        self._cache_max_bytes = kwargs.get("cache_max_bytes", 256 * 2 ** 20)
+        self._cache_memory_items = kwargs.get("cache_memory_items", 1024)
+        self._cache_ttl = kwargs.get("cache_ttl")
+
+    @property
+    def cache(self):
+        """
+        *Property.* Return the :class:`DiskCache` of the application, opening
+        it the first time.
+        """
+        if self._cache is None:
+            self._cache = DiskCache(self._get_cache_path(),
+                                    max_bytes=self._cache_max_bytes,
+                                    ttl=self._cache_ttl,
+                                    memory_items=self._cache_memory_items)
+        return self._cache
+
+    def _add_arguments(self):
+        """
+        Add CacheMixin command-line arguments.
+        """
+        super(CacheMixin, self)._add_arguments()
+
+        self._arg_parser.add_argument("--cache",
+                                      action="store",
+                                      dest="cache",
+                                      metavar="PATH")
+
+        self._arg_parser.add_argument("--cache-max-bytes",
+                                      action="store",
+                                      dest="cache_max_bytes",
+                                      metavar="N",
+                                      type=int)
+
+    def _get_cache_path(self):
+        """
+        Return the path of the cache database.
+        """
+        if self._cache_path:
+            return os.path.abspath(self._cache_path)
+        return self._get_side_file_path(".cache.sqlite")
+
+    def _log_footer(self):
+        """
+        Append the cache stats to the footer.
+        """
+        super(CacheMixin, self)._log_footer()
+
+        cache = self._cache
+        if cache is not None:
+            lookups = cache.hits + cache.misses
+            self.log.info("- cache: %s", cache.path)
+            self.log.info("  > %d hits (%d in memory), %d misses, "
+                          "%0.1f%% hit rate, %d evictions", cache.hits,
+                          cache.memory_hits, cache.misses,
+                          100.0 * cache.hits / lookups if lookups else 0.0,
+                          cache.evictions)
+            if cache.errors:
+                self.log.warning("  > %d unreadable entries deleted",
+                                 cache.errors)
+
+    def _process_arguments(self, args=None):
+        """
+        Process CacheMixin command-line arguments.
+        """
+        super(CacheMixin, self)._process_arguments(args)
+
+        # Cache.
+        if self._args.cache is not None:
+            self._cache_path = self._args.cache
+        if self._args.cache_max_bytes is not None:
+            self._cache_max_bytes = self._args.cache_max_bytes
+
+    def _shutdown(self):
+        """
+        Close the cache.
+        """
+        if self._cache is not None:
+            self._cache.close()
+
+        super(CacheMixin, self)._shutdown()
@@ -141,6 +141,13 @@ class LogFileMixin(object):
                                       action="store",
                                       dest="log_file")
 
+    def _get_side_file_path(self, suffix):
+        """
+        Overload the _get_side_file_path() method to keep output files that
+        accompany the log in the log directory, named after the log file.
+        """
+        return "{}{}".format(os.path.splitext(self.log_file)[0], suffix)
+
     def _process_arguments(self, args=None):
         """
         Process AppLogFileMixin command-line arguments.
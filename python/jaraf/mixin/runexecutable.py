@@ -2,13 +2,59 @@
 Mixin that adds convenience methods for running an executable. As a mixin, this
 module is not meant to be used as a standalone and requires certain members and
 methods from the App base class to be defined.
+
+The rate at which executables are launched can be limited to avoid overloading
+shared resources. There are a few constructor parameters supported to control
+the launch limits:
+
+* *launch_rate* (float): Maximum number of executables started per second
+  (default=None, unlimited).
+* *launch_burst* (int): Number of executables that can be started back-to-back
+  before the launch rate applies (default=1).
+* *max_running* (int): Maximum number of executables running at the same time
+  (default=None, unlimited).
+* *launch_limiter* (:class:`LaunchLimiter`): An existing limiter to use instead
+  of creating one from the above parameters. This allows several applications
+  to share the same limits.
+
+::
+
+    from jaraf import App
+    from jaraf.mixin.runexecutable import RunExecutableMixin
+
+    class MyApp(RunExecutableMixin, App):
+        #
+        # Define the rest of the class
+        #
+
+    if __name__ == "__main__":
+        app = MyApp(launch_rate=5, max_running=8)
+
+In the above example, no more than 5 executables are started per second and no
+more than 8 are running at any one time, no matter how many threads are calling
+:meth:`~RunExecutableMixin.run_executable()`.
+
+Each executable is started in its own process group and tracked by the mixin
+until it has exited and been reaped. If the generator returned by
+:meth:`~RunExecutableMixin.run_executable()` is closed before the output is
+fully consumed, or an exception escapes while reading the output, the process
+group is terminated. Any executables still running when the application shuts
+down are terminated as well and reported in the footer. The number of seconds
+to wait after sending SIGTERM before sending SIGKILL can be set with the
+*child_terminate_timeout* constructor parameter (default=5).
 """
 
 import collections
+import logging
+import logging.handlers
 import os
+import re
+import signal
 import sys
+import threading
+import time
 
-from subprocess import Popen, PIPE, STDOUT
+from subprocess import Popen, PIPE, STDOUT, TimeoutExpired
 from jaraf.codes import AppStatusOkay
 from jaraf.errors import AppError
 
@@ -21,6 +67,555 @@ class RunExecutableError(AppError):
     pass
 
 
+class OutputMatcher(object):
+    """
+    Collection of named regular expressions that are evaluated against each
+    line of executable output as it is read by
+    :meth:`RunExecutableMixin.run_executable()`.::
+
+        matcher = OutputMatcher()
+        matcher.add("progress", r"(\d+)% complete", self.on_progress)
+        matcher.add("warning", r"^WARNING")
+
+        for line in self.run_executable(cmd, matcher=matcher,
+                                        matched_only=True):
+            self.log.warning(line.rstrip())
+
+        self.log.info("warnings: %d", matcher.counts["warning"])
+
+    Patterns are compiled when they are added, so invalid expressions raise
+    :class:`re.error` before any executable is launched. Every pattern that
+    matches a line has its counter incremented and its callback called with
+    the match of that pattern alone, so patterns keep their own flags, group
+    names and group numbers.
+
+    Since most lines typically match no pattern, the patterns are also
+    combined into a single alternation, and a line is only checked further if
+    this prefilter finds a match. The patterns that match are then found in
+    one pass by a second combined expression with a named group per pattern,
+    and only the patterns with callbacks are searched again on their own.
+    Patterns with backreferences can't be combined, and are searched
+    separately on every line.
+    """
+
+    # Backreferences and conditional groups, which refer to group numbers or
+    # names that change when patterns are combined. This may also match
+    # escaped backslashes, which only means a pattern isn't combined.
+    _GROUP_REFERENCE_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+    # Global inline flags at the start of a pattern, which are replaced by
+    # scoped flags when the pattern is combined.
+    _GLOBAL_FLAGS_RE = re.compile(r"^(?:\(\?[aiLmsux]+\))+")
+
+    # Flags that can be scoped to part of a combined expression.
+    _SCOPED_FLAGS = ((re.ASCII, "a"), (re.IGNORECASE, "i"),
+                     (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+
+    def __init__(self):
+        self._patterns = collections.OrderedDict()
+        self._callbacks = {}
+        self._counts = collections.OrderedDict()
+        self._order = {}
+        self._prefilter = None
+        self._detector = None
+        self._combined = []
+        self._separate = []
+
+    def add(self, name, pattern, callback=None):
+        """
+        * *name* (str): Name used to identify the pattern. Must be unique
+          within the matcher.
+        * *pattern* (str): Regular expression to search for in each line.
+        * *callback* (callable): Optional function that is called with the
+          :class:`re.Match` object each time the pattern matches a line.
+
+        Register a new pattern. Each pattern is also given a counter that
+        tracks the number of lines it matched, which is available through the
+        :attr:`counts` property.
+
+        *Returns:* The matcher so that calls can be chained.
+        """
+        if name in self._patterns:
+            raise ValueError("Duplicate matcher pattern name: %s" % name)
+
+        self._patterns[name] = re.compile(pattern)
+        self._callbacks[name] = callback
+        self._counts[name] = 0
+        self._order[name] = len(self._order)
+        self._combine()
+        return self
+
+    @property
+    def counts(self):
+        """
+        *Property.* Return a dictionary mapping pattern names to the number of
+        lines each pattern matched.
+        """
+        return dict(self._counts)
+
+    def match(self, line):
+        """
+        * *line* (str): Output line to match against the registered patterns.
+
+        Match a line against all of the registered patterns, updating counters
+        and calling callbacks for each one that matches.
+
+        *Returns:* True if at least one pattern matched the line.
+        """
+        names = []
+        if self._prefilter is not None \
+                and self._prefilter.search(line) is not None:
+            m = self._detector.match(line)
+            names = [name for (group, name) in self._combined
+                     if m.start(group) >= 0]
+        if self._separate:
+            names.extend(name for name in self._separate
+                         if self._patterns[name].search(line) is not None)
+            names.sort(key=self._order.get)
+
+        for name in names:
+            self._counts[name] += 1
+            callback = self._callbacks[name]
+            if callback is not None:
+                callback(self._patterns[name].search(line))
+
+        return bool(names)
+
+    def reset(self):
+        """
+        Reset all of the pattern counters to zero.
+        """
+        for name in self._counts:
+            self._counts[name] = 0
+
+    def _combine(self):
+        """
+        Build the combined prefilter and detector expressions. The prefilter
+        is an alternation of the patterns, which finds whether any of them
+        matches a line. It has no named groups, which would make it about
+        twice as slow. The detector is a sequence of optional lookaheads with
+        a named group each, which finds every pattern that matches anywhere
+        in the line. Patterns that can't be combined (e.g. because they use a
+        group name that an earlier pattern uses too) are searched separately.
+        """
+        alternatives = []
+        lookaheads = []
+        names = []
+        self._separate = []
+        for (name, regex) in self._patterns.items():
+            if not isinstance(regex.pattern, str) \
+                    or self._GROUP_REFERENCE_RE.search(regex.pattern):
+                self._separate.append(name)
+                continue
+
+            flags = "".join(letter for (flag, letter) in self._SCOPED_FLAGS
+                            if regex.flags & flag)
+            pattern = self._GLOBAL_FLAGS_RE.sub("", regex.pattern)
+            # A newline ends any comment at the end of a verbose pattern.
+            if regex.flags & re.VERBOSE:
+                pattern += "\n"
+            alternative = "(?%s:%s)" % (flags, pattern)
+            lookahead = "(?:(?=[\\s\\S]*?(?P<_%d>%s)))?" % (len(names),
+                                                         alternative)
+            try:
+                prefilter = re.compile("|".join(alternatives + [alternative]))
+                detector = re.compile("".join(lookaheads + [lookahead]))
+            except re.error:
+                self._separate.append(name)
+                continue
+
+            alternatives.append(alternative)
+            lookaheads.append(lookahead)
+            names.append(name)
+
+        if names:
+            self._prefilter = prefilter
+            self._detector = detector
+            self._combined = [(detector.groupindex["_%d" % index], name)
+                              for (index, name) in enumerate(names)]
+        else:
+            self._prefilter = self._detector = None
+            self._combined = []
+
+
+class LaunchLimiter(object):
+    """
+    Thread-safe limiter that combines a token bucket, which limits the rate at
+    which executables are started, with a cap on the number of executables
+    running at the same time.::
+
+        limiter = LaunchLimiter(rate=10, burst=2, max_running=4)
+
+        with limiter:
+            # Start and wait for the executable.
+
+    * *rate* (float): Number of launches allowed per second. None disables
+      rate limiting.
+    * *burst* (int): Capacity of the token bucket, i.e. the number of launches
+      that can happen back-to-back after an idle period.
+    * *max_running* (int): Maximum number of concurrent launches. None
+      disables the concurrency cap.
+    """
+
+    def __init__(self, rate=None, burst=1, max_running=None):
+
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if max_running is not None and max_running < 1:
+            raise ValueError("max_running must be at least 1")
+
+        self._rate = rate
+        self._burst = burst
+        self._max_running = max_running
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._running = 0
+
+        # Statistics.
+        self._launches = 0
+        self._wait_time = 0.0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.release()
+
+    @property
+    def launches(self):
+        """
+        *Property.* Return the total number of launches that were allowed.
+        """
+        return self._launches
+
+    @property
+    def running(self):
+        """
+        *Property.* Return the number of launches currently in progress.
+        """
+        return self._running
+
+    @property
+    def wait_time(self):
+        """
+        *Property.* Return the total number of seconds callers spent waiting
+        in :meth:`acquire()`.
+        """
+        return self._wait_time
+
+    def acquire(self, timeout=None):
+        """
+        * *timeout* (float): Maximum number of seconds to wait. None waits
+          forever.
+
+        Block until a launch is allowed by both the rate limit and the
+        concurrency cap. Every successful call must be paired with a call to
+        :meth:`release()`.
+
+        *Returns:* True if the launch is allowed, False if the timeout expired.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                wait = None
+                if self._max_running is None \
+                        or self._running < self._max_running:
+                    if self._rate is None or self._tokens >= 1.0:
+                        break
+                    # Sleep until the next token becomes available.
+                    wait = (1.0 - self._tokens) / self._rate
+
+                if deadline is not None:
+                    if now >= deadline:
+                        self._wait_time += now - start
+                        return False
+                    remaining = deadline - now
+                    wait = remaining if wait is None else min(wait, remaining)
+
+                self._cond.wait(wait)
+
+            if self._rate is not None:
+                self._tokens -= 1.0
+            self._running += 1
+            self._launches += 1
+            self._wait_time += time.monotonic() - start
+
+        return True
+
+    def release(self):
+        """
+        Mark a launch as finished, allowing a waiting caller to proceed if it
+        was blocked by the concurrency cap.
+        """
+        with self._cond:
+            if self._running > 0:
+                self._running -= 1
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        """
+        Add the tokens accumulated since the last refill to the bucket.
+        """
+        if self._rate is not None:
+            self._tokens = min(float(self._burst),
+                               self._tokens
+                               + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+
+class LogForwarder(object):
+    """
+    Forward executable output lines to a logger in batches.
+
+    Logging each line of output through the normal logging methods pays for
+    caller lookup, record creation and a handler lock, write and flush for
+    every line. A forwarder buffers lines and writes each batch to the
+    logger's handlers in one go, taking the handler lock and flushing once per
+    batch. Handlers that aren't plain stream or file handlers, or that have
+    filters, are sent one record per line through the regular
+    :meth:`logging.Handler.handle()` path. Each record keeps the time its line
+    was added as its creation time.
+
+    A background thread flushes buffered lines once the oldest is
+    *flush_secs* old, so output isn't held back while the executable is quiet,
+    and :meth:`close()` flushes what is left at the end of the output.
+
+    * *logger* (:class:`logging.Logger`): Logger whose handlers receive the
+      output.
+    * *level* (int): Logging level for the forwarded lines.
+    * *prefix* (str): String prepended to each forwarded line.
+    * *batch_size* (int): Number of buffered lines that triggers a flush.
+    * *flush_secs* (float): Maximum age in seconds of buffered lines before
+      they are flushed.
+    * *sample* (int): Forward only every Nth line. Lines that are skipped are
+      counted and reported by :meth:`close()`.
+    """
+
+    # Handler emit() implementations that just write the formatted record to
+    # a stream, which means we can do the same thing for a batch of records.
+    _STREAM_EMITS = (logging.StreamHandler.emit,
+                     logging.FileHandler.emit,
+                     logging.handlers.BaseRotatingHandler.emit)
+
+    def __init__(self, logger, level=logging.INFO, prefix="", batch_size=100,
+                 flush_secs=0.5, sample=1):
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if sample < 1:
+            raise ValueError("sample must be at least 1")
+
+        self._logger = logger
+        self._level = level
+        self._prefix = prefix
+        self._batch_size = batch_size
+        self._flush_secs = flush_secs
+        self._sample = sample
+
+        # Buffered (line, arrival time) tuples. The buffer lock is only held
+        # to add or take lines, while the write lock keeps batches written by
+        # the reading thread and the flush thread in order.
+        self._buffer = []
+        self._buffer_lock = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._flush_thread = None
+        self._lines_seen = 0
+        self._lines_forwarded = 0
+
+    @property
+    def lines_forwarded(self):
+        """
+        *Property.* Return the number of lines forwarded to the logger.
+        """
+        return self._lines_forwarded
+
+    @property
+    def lines_seen(self):
+        """
+        *Property.* Return the number of lines passed to :meth:`add()`.
+        """
+        return self._lines_seen
+
+    def add(self, line):
+        """
+        * *line* (str): Output line to forward.
+
+        Add a line to the current batch, flushing the batch if it is full.
+        """
+        self._lines_seen += 1
+        if self._sample > 1 and (self._lines_seen - 1) % self._sample:
+            return
+
+        with self._buffer_lock:
+            buffer = self._buffer
+            buffer.append((line.rstrip("\n"), time.time()))
+            if len(buffer) == 1:
+                # Wake up the flush thread to track the age of the batch.
+                self._buffer_lock.notify()
+            full = len(buffer) >= self._batch_size
+
+        if full:
+            self.flush()
+        elif self._flush_thread is None:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="jaraf-log-forwarder",
+                daemon=True)
+            self._flush_thread.start()
+
+    def close(self):
+        """
+        Stop the flush thread and flush any buffered lines. If sampling skipped
+        any lines, a summary line with the number of lines forwarded is logged
+        as well.
+        """
+        with self._buffer_lock:
+            self._closed = True
+            self._buffer_lock.notify()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+
+        skipped = self._lines_seen - self._lines_forwarded
+        if skipped and self._logger.isEnabledFor(self._level):
+            self._logger.log(self._level, "%sforwarded %d of %d lines",
+                             self._prefix, self._lines_forwarded,
+                             self._lines_seen)
+
+    def flush(self):
+        """
+        Write the buffered lines to the logger's handlers.
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                lines = self._buffer
+                self._buffer = []
+            if lines:
+                self._lines_forwarded += len(lines)
+                self._write(lines)
+
+    def _flush_loop(self):
+        """
+        Flush buffered lines once the oldest one is flush_secs old, until the
+        forwarder is closed. This runs in the flush thread.
+        """
+        lock = self._buffer_lock
+        while True:
+            with lock:
+                if self._closed:
+                    return
+                if not self._buffer:
+                    lock.wait()
+                    continue
+                remaining = self._buffer[0][1] + self._flush_secs \
+                    - time.time()
+                if remaining > 0:
+                    lock.wait(remaining)
+                    continue
+            self.flush()
+
+    def _is_stream_handler(self, handler):
+        """
+        Return True if the handler can have a batch written directly to its
+        stream.
+        """
+        return (isinstance(handler, logging.StreamHandler)
+                and not handler.filters
+                and getattr(handler, "stream", None) is not None
+                and type(handler).emit in self._STREAM_EMITS)
+
+    def _make_record(self, line, created):
+        """
+        Create a log record for an output line that arrived at *created*.
+        """
+        record = self._logger.makeRecord(self._logger.name, self._level, "",
+                                         0, "%s%s", (self._prefix, line),
+                                         None)
+        self._set_created(record, created)
+        return record
+
+    @staticmethod
+    def _set_created(record, created):
+        """
+        Set the creation time of a record, as done by
+        :class:`logging.LogRecord`.
+        """
+        record.created = created
+        record.msecs = int((created - int(created)) * 1000) + 0.0
+        record.relativeCreated = (created - logging._startTime) * 1000
+
+    def _write(self, lines):
+        """
+        Write (line, arrival time) tuples to the logger's handlers.
+        """
+        logger = self._logger
+        if not logger.isEnabledFor(self._level):
+            return
+
+        # Loggers with filters get every record the normal way.
+        if logger.filters:
+            for (line, created) in lines:
+                logger.handle(self._make_record(line, created))
+            return
+
+        # Walk the logger hierarchy the same way Logger.callHandlers() does.
+        record = None
+        current = logger
+        while current is not None:
+            for handler in current.handlers:
+                if self._level < handler.level:
+                    continue
+                if self._is_stream_handler(handler):
+                    if record is None:
+                        record = self._make_record("", lines[0][1])
+                    self._write_batch(handler, record, lines)
+                else:
+                    for (line, created) in lines:
+                        handler.handle(self._make_record(line, created))
+            if not current.propagate:
+                break
+            current = current.parent
+
+    def _write_batch(self, handler, record, lines):
+        """
+        Format the lines with a single reused record, updated with the
+        arrival time of each line, and write them to the handler's stream
+        while holding its lock.
+        """
+        handler.acquire()
+        try:
+            if isinstance(handler, logging.handlers.BaseRotatingHandler) \
+                    and handler.shouldRollover(record):
+                handler.doRollover()
+
+            parts = []
+            for (line, created) in lines:
+                record.args = (self._prefix, line)
+                self._set_created(record, created)
+                parts.append(handler.format(record))
+
+            terminator = handler.terminator
+            handler.stream.write(terminator.join(parts) + terminator)
+            handler.flush()
+
+        except Exception:
+            handler.handleError(record)
+
+        finally:
+            handler.release()
+
+
 class RunExecutableMixin(object):
     """
     Application framework mixin class that adds executable call support.
@@ -33,6 +628,23 @@ class RunExecutableMixin(object):
 
         self._executable_status = AppStatusOkay
 
+        # Launch limits.
+        self._launch_limiter = kwargs.get("launch_limiter")
+        if self._launch_limiter is None and \
+                (kwargs.get("launch_rate") is not None
+                 or kwargs.get("max_running") is not None):
+            self._launch_limiter = LaunchLimiter(
+                rate=kwargs.get("launch_rate"),
+                burst=kwargs.get("launch_burst", 1),
+                max_running=kwargs.get("max_running"))
+
+        # Child process supervision. Running children are tracked by pid so
+        # they can be terminated if the application exits before they do.
+        self._child_terminate_timeout = kwargs.get("child_terminate_timeout", 5)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        self._leftover_children = []
+
     @property
     def executable_status(self):
         """
@@ -40,6 +652,42 @@ class RunExecutableMixin(object):
         """
         return self._executable_status
 
+    @property
+    def leftover_children(self):
+        """
+        *Property.* Return a list of (pid, command) tuples for the executables
+        that were still running at shutdown and had to be terminated.
+        """
+        return list(self._leftover_children)
+
+    @property
+    def launch_limiter(self):
+        """
+        *Property.* Return the :class:`LaunchLimiter` used to limit executable
+        launches, or None if launches are not limited.
+        """
+        return self._launch_limiter
+
+    def log_executable(self, cmd, level=logging.INFO, **kwargs):
+        """
+        * *cmd* (list): Executable and arguments to run.
+        * *level* (int): Logging level for the executable output.
+        * *kwargs* (dict): Extra parameters passed to :meth:`run_executable()`.
+
+        Run an executable and forward its output to the application logger in
+        batches instead of yielding it. This replaces the common pattern::
+
+            for line in self.run_executable(cmd):
+                self.log.info(line.rstrip())
+
+        *Returns:* The executable exit status.
+        """
+        kwargs["log_output"] = level
+        kwargs["yield_output"] = False
+        for line in self.run_executable(cmd, **kwargs):
+            pass
+        return self._executable_status
+
     def run_executable(self, cmd, **kwargs):
         """
         * *cmd* (list): List instance in which the first element is the path of
@@ -51,6 +699,20 @@ class RunExecutableMixin(object):
 
           * *expected_statuses* (list): Integer list of values that are
             acceptable exit codes for the executable (default=[0]).
+          * *matcher* (:class:`OutputMatcher`): Matcher that is evaluated
+            against each output line as it is read (default=None).
+          * *matched_only* (bool): If True, only output lines that matched the
+            *matcher* are yielded (default=False).
+          * *yield_output* (bool): If False, no output lines are yielded
+            (default=True).
+          * *log_output* (int): If set, output lines are forwarded in batches
+            to the application logger at this logging level (default=None).
+          * *log_prefix* (str): Prefix for forwarded lines. The "{name}" and
+            "{pid}" placeholders are replaced with the executable name and
+            process id (default="{name}[{pid}]: ").
+          * *log_batch_size* (int): Number of lines forwarded per batch
+            (default=100).
+          * *log_sample* (int): Forward only every Nth line (default=1).
         """
 
         # Reset the exit status.
@@ -67,6 +729,20 @@ class RunExecutableMixin(object):
             expected_statuses = kwargs["expected_statuses"]
             del(kwargs["expected_statuses"])
 
+        # Extract the output matcher parameters.
+        matcher = kwargs.pop("matcher", None)
+        matched_only = kwargs.pop("matched_only", False)
+        if matched_only and matcher is None:
+            raise ValueError("matched_only requires a matcher")
+        yield_output = kwargs.pop("yield_output", True)
+
+        # Extract the log forwarding parameters.
+        log_output = kwargs.pop("log_output", None)
+        log_prefix = kwargs.pop("log_prefix", "{name}[{pid}]: ")
+        log_batch_size = kwargs.pop("log_batch_size", 100)
+        log_sample = kwargs.pop("log_sample", 1)
+        forwarder = None
+
         # Build the kwargs for the popen command. There are certain options that
         # we always want set, but we extend it with any user-provided kwargs.
         popen_kwargs = {"bufsize": 1,
@@ -75,24 +751,76 @@ class RunExecutableMixin(object):
                         "stdout": PIPE}
         popen_kwargs.update(kwargs)
 
-        # Run the command with popen, redirecting sterr to stdout and piping the
-        # output so it can be captured.
-        p = Popen(cmd, **popen_kwargs)
-
-        # Run the command and capture stdout and yield the output a line at a
-        # time to the caller.
-        pout = p.stdout
-        while True:
-            line = pout.readline()
-            if line != "":
-                output.append(line.rstrip())
-                yield line
+        # Start the executable in its own process group, unless the caller
+        # chose otherwise, so that it can be terminated along with its own
+        # children. Unlike a new session, a process group keeps the
+        # controlling terminal, which e.g. password prompts need.
+        if not any(key in kwargs for key in ("start_new_session",
+                                             "process_group", "preexec_fn")):
+            if sys.version_info >= (3, 11):
+                popen_kwargs["process_group"] = 0
             else:
-                break
+                popen_kwargs["preexec_fn"] = os.setpgrp
+        own_group = bool(popen_kwargs.get("start_new_session")
+                         or popen_kwargs.get("process_group") == 0
+                         or popen_kwargs.get("preexec_fn") is os.setpgrp)
 
-        # Close the filehandle then wait for the process to complete.
-        pout.close()
-        p.wait()
+        # Wait for the launch limiter, if any, to allow the command to start.
+        # The slot is held until the process has exited.
+        limiter = self._launch_limiter
+        if limiter is not None:
+            limiter.acquire()
+
+        p = None
+        try:
+            # Run the command with popen, redirecting sterr to stdout and piping
+            # the output so it can be captured.
+            p = Popen(cmd, **popen_kwargs)
+            self._add_child(p, cmd, own_group)
+
+            if log_output is not None:
+                prefix = log_prefix.format(name=os.path.basename(cmd[0]),
+                                           pid=p.pid)
+                forwarder = LogForwarder(self.log, log_output, prefix,
+                                         batch_size=log_batch_size,
+                                         sample=log_sample)
+
+            # Run the command and capture stdout and yield the output a line at
+            # a time to the caller.
+            pout = p.stdout
+            while True:
+                line = pout.readline()
+                if line != "":
+                    output.append(line.rstrip())
+                    if forwarder is not None:
+                        forwarder.add(line)
+                    if matcher is not None:
+                        if not matcher.match(line) and matched_only:
+                            continue
+                    if yield_output:
+                        yield line
+                else:
+                    break
+
+            # Close the filehandle then wait for the process to complete.
+            pout.close()
+            p.wait()
+
+        finally:
+            if forwarder is not None:
+                forwarder.close()
+
+            # If we got here before the process exited, the generator was
+            # closed early or an exception was raised, so don't leave the
+            # process running.
+            if p is not None:
+                if p.poll() is None:
+                    self._terminate_child(p)
+                p.stdout.close()
+                self._remove_child(p)
+
+            if limiter is not None:
+                limiter.release()
 
         # Capture the exit status of the executable.
         self._executable_status = p.returncode
@@ -111,3 +839,108 @@ class RunExecutableMixin(object):
 
             # Raise the exception with the error message.
             raise RunExecutableError("\n".join(msg))
+
+    def _abort(self):
+        """
+        Terminate the executables that are still running before the
+        application aborts, so that their process groups aren't orphaned.
+        This runs in the watchdog thread, so it only sends signals and polls,
+        and never waits on a child the main thread may be waiting on.
+        """
+        with self._children_lock:
+            children = list(self._children.values())
+
+        def signal_children(sig):
+            for (p, cmd, own_group) in children:
+                try:
+                    if own_group:
+                        os.killpg(p.pid, sig)
+                    elif p.poll() is None:
+                        p.send_signal(sig)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        if children:
+            self.log.error("Terminating %d running executables",
+                           len(children))
+            signal_children(signal.SIGTERM)
+            deadline = time.monotonic() + self._child_terminate_timeout
+            while time.monotonic() < deadline and \
+                    any(p.poll() is None for (p, cmd, own_group) in children):
+                time.sleep(0.05)
+            # Also kill what is left of the groups whose leader exited.
+            signal_children(signal.SIGKILL)
+
+        super(RunExecutableMixin, self)._abort()
+
+    def _add_child(self, p, cmd, own_group):
+        """
+        Start tracking a child process.
+        """
+        with self._children_lock:
+            self._children[p.pid] = (p, cmd, own_group)
+
+    def _log_footer(self):
+        """
+        Append any executables that had to be terminated at shutdown to the
+        footer.
+        """
+        super(RunExecutableMixin, self)._log_footer()
+
+        if self._leftover_children:
+            self.log.info("- leftover children: %d",
+                          len(self._leftover_children))
+            for (pid, cmd) in self._leftover_children:
+                self.log.info("  > %d: %s", pid, " ".join(cmd))
+
+    def _remove_child(self, p):
+        """
+        Stop tracking a child process.
+        """
+        with self._children_lock:
+            self._children.pop(p.pid, None)
+
+    def _shutdown(self):
+        """
+        Terminate and reap any executables that are still running.
+        """
+        with self._children_lock:
+            children = list(self._children.values())
+            self._children.clear()
+
+        for (p, cmd, own_group) in children:
+            if p.poll() is None:
+                self.log.warning("Terminating leftover child %d: %s",
+                                 p.pid, " ".join(cmd))
+                self._leftover_children.append((p.pid, cmd))
+                self._terminate_child(p, own_group)
+
+        super(RunExecutableMixin, self)._shutdown()
+
+    def _terminate_child(self, p, own_group=None):
+        """
+        Terminate a child process, along with the rest of its process group if
+        it was started in its own group, then reap it. SIGTERM is sent first and
+        SIGKILL follows if the process doesn't exit in time.
+        """
+        if own_group is None:
+            with self._children_lock:
+                own_group = self._children.get(p.pid, (None, None, False))[2]
+
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                if own_group:
+                    os.killpg(p.pid, sig)
+                else:
+                    p.send_signal(sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+            try:
+                p.wait(timeout=self._child_terminate_timeout)
+                return
+            except TimeoutExpired:
+                continue
+
+        # Wait indefinitely after the SIGKILL.
+        p.wait()
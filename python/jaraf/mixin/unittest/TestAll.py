@@ -19,14 +19,18 @@ sys.path.insert(0, _path[:_path.find("/jaraf/")])
 
 import unittest
 
+from TestAppCacheMixin import Test as TestAppCacheMixin
 from TestAppLogFileMixin import Test as TestAppLogFileMixin
 from TestAppRunExecutableMixin import Test as TestAppRunExecutableMixin
+from TestAppWorkQueueMixin import Test as TestAppWorkQueueMixin
 
 
 # Initialize a test suite and add all of the TestCases.
 TestHandlerSuite = unittest.TestSuite()
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAppCacheMixin))
 TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAppLogFileMixin))
 TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAppRunExecutableMixin))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAppWorkQueueMixin))
 
 
 if __name__ == "__main__":
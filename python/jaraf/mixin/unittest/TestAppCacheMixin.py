@@ -0,0 +1,232 @@
+"""
+Unit tests for the CacheMixin class.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf import App
+from jaraf.codes import AppStatusOkay
+from jaraf.mixin.cache import CacheMixin, DiskCache, cached, make_key
+
+
+class TestApp(CacheMixin, App):
+
+    def __init__(self, *args, **kwargs):
+
+        super(TestApp, self).__init__(*args, **kwargs)
+
+        self.calls = []
+        self.results = []
+
+    @cached()
+    def square(self, x, offset=0):
+        self.calls.append(x)
+        return x * x + offset
+
+    def main(self):
+        for x in (1, 2, 1, 3, 2):
+            self.results.append(self.square(x))
+        self.results.append(self.square(1, offset=1))
+
+
+def fill_cache(path, start):
+    """
+    Write entries to a cache from a separate process.
+    """
+    cache = DiskCache(path, max_bytes=20000)
+    for i in range(start, start + 200):
+        cache.set("key-%d" % i, "x" * 100)
+    cache.close()
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+        # Remove the log handlers added by the runs, since loggers are
+        # singletons and other tests expect their own handler to be first.
+        log = App.get_logger()
+        for handler in list(log.handlers):
+            handler.close()
+            log.removeHandler(handler)
+
+    def test_cached(self):
+        """
+        Verify that method results are memoized within a run and across runs.
+        """
+        app = TestApp(silent=True)
+        status = app.run(["--cache", self.path])
+        self.assertEqual(status, AppStatusOkay)
+        self.assertEqual(app.results, [1, 4, 1, 9, 4, 2])
+        self.assertEqual(app.calls, [1, 2, 3, 1])
+        self.assertEqual((app.cache.hits, app.cache.misses), (2, 4))
+
+        app = TestApp(silent=True, cache=self.path)
+        app.run([])
+        self.assertEqual(app.results, [1, 4, 1, 9, 4, 2])
+        self.assertEqual(app.calls, [])
+        self.assertEqual(app.cache.memory_hits, 2)
+
+    def test_concurrency(self):
+        """
+        Verify that several processes can write to the same cache and that the
+        byte budget holds.
+        """
+        workers = [multiprocessing.Process(target=fill_cache,
+                                           args=(self.path, start))
+                   for start in (0, 1000, 2000)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        cache = DiskCache(self.path)
+        (count, size) = cache.size()
+        self.assertTrue(0 < size <= 20000)
+        self.assertEqual(size, sum(len(cache._db.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)).fetchone()[0])
+            for (key,) in cache._db.execute("SELECT key FROM entries")))
+        cache.close()
+
+    def test_evict(self):
+        """
+        Verify that the least recently used entries are evicted over the byte
+        budget, and that expired entries are not returned.
+        """
+        cache = DiskCache(self.path, max_bytes=1000, memory_items=0)
+        for i in range(5):
+            cache.set(i, b"x" * 180)
+            time.sleep(0.01)
+        cache.get(0)
+        cache.set(5, b"x" * 180)
+
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(cache.get(0), b"x" * 180)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertTrue(cache.size()[1] <= 900)
+
+        cache.set("short", None, ttl=0.05)
+        self.assertIsNone(cache.get("short", "missing"))
+        time.sleep(0.1)
+        self.assertEqual(cache.get("short", "missing"), "missing")
+
+        cache.delete(0)
+        self.assertIsNone(cache.get(0))
+        cache.clear()
+        self.assertEqual(cache.size(), (0, 0))
+        cache.close()
+
+    def test_make_key(self):
+        """
+        Verify that keys are stable and depend on all of the arguments.
+        """
+        key = make_key("f", (1, "a"), {"b": 2, "c": 3})
+        self.assertEqual(key, make_key("f", [1, "a"], {"c": 3, "b": 2}))
+        self.assertNotEqual(key, make_key("g", (1, "a"), {"b": 2, "c": 3}))
+        self.assertNotEqual(key, make_key("f", (1, "a"), {"b": 2}))
+        self.assertEqual(len(key), 64)
+
+        # Default representations include a memory address.
+        self.assertRaises(TypeError, make_key, "f", (object(),))
+        self.assertRaises(TypeError, make_key, "f", (), {"func": lambda: 0})
+
+    def test_make_key_sets(self):
+        """
+        Verify that keys of set arguments don't depend on hash randomization.
+        """
+        script = ("import sys; sys.path.insert(0, %r)\n"
+                  "from jaraf.mixin.cache import make_key\n"
+                  "print(make_key('f', ({'apple', 'banana', 'cherry'},), "
+                  "{'tags': frozenset(['x', 'y', 'z'])}))\n"
+                  % _path[:_path.find("/jaraf/")])
+        keys = set()
+        for seed in ("1", "2", "3"):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            keys.add(subprocess.check_output([sys.executable, "-c", script],
+                                             env=env))
+        self.assertEqual(len(keys), 1)
+
+    def test_unpickling_error(self):
+        """
+        Verify that an entry that can't be unpickled is deleted and treated
+        as a miss.
+        """
+        cache = DiskCache(self.path, memory_items=0)
+        cache.set("key", "value")
+        cache._db.execute("UPDATE entries SET value = ?", (b"garbage",))
+
+        self.assertEqual(cache.get_or_call("key", lambda: "new"), "new")
+        self.assertEqual(cache.errors, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.get("key"), "new")
+        self.assertEqual(cache.size()[0], 1)
+        cache.close()
+
+    def test_failed_set(self):
+        """
+        Verify that a value that couldn't be stored isn't served from the
+        in-memory tier.
+        """
+        def evict(now):
+            raise sqlite3.OperationalError("database or disk is full")
+
+        cache = DiskCache(self.path)
+        cache.set("key", "old")
+        cache._evict = evict
+
+        with self.assertRaises(sqlite3.OperationalError):
+            cache.set("key", "new")
+        self.assertEqual(cache.get("key"), "old")
+        with self.assertRaises(sqlite3.OperationalError):
+            cache.set("other", "value")
+        self.assertIsNone(cache.get("other"))
+        del cache._evict
+        cache.close()
+
+    def test_memoize(self):
+        """
+        Verify that memoize() caches function results, including None.
+        """
+        cache = DiskCache(self.path)
+        calls = []
+
+        def lookup(x):
+            calls.append(x)
+            return None
+
+        lookup = cache.memoize()(lookup)
+        self.assertIsNone(lookup(1))
+        self.assertIsNone(lookup(1))
+        self.assertEqual(calls, [1])
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
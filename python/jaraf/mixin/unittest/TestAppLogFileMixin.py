@@ -126,6 +126,13 @@ class Test(unittest.TestCase):
             app.log.removeHandler(app.log.handlers[0])
             shutil.rmtree(test_dir)
 
+    def test_get_side_file_path(self):
+        """
+        Verify that files accompanying the log are placed next to it.
+        """
+        app = TestApp(log_file="/foo/bar.log")
+        self.assertEqual(app._get_side_file_path(".pstats"), "/foo/bar.pstats")
+
     def test_init1(self):
         """
         Verify default logging parameters.
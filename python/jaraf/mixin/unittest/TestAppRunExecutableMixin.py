@@ -2,8 +2,14 @@
 Unit tests for the AppRunExecutableMixin class.
 """
 
+import io
+import logging
 import os
+import re
+import subprocess
 import sys
+import threading
+import time
 import unittest
 
 ##
@@ -19,7 +25,10 @@ sys.path.insert(0, _path[:_path.find("/jaraf/")])
 ##
 
 from jaraf import App
-from jaraf.codes import AppStatusOkay
+from jaraf.codes import AppStatusOkay, AppStatusStalled
+from jaraf.mixin.runexecutable import LaunchLimiter
+from jaraf.mixin.runexecutable import LogForwarder
+from jaraf.mixin.runexecutable import OutputMatcher
 from jaraf.mixin.runexecutable import RunExecutableMixin
 from jaraf.mixin.runexecutable import RunExecutableError
 
@@ -30,6 +39,15 @@ class TestApp(RunExecutableMixin, App):
 
         super(TestApp, self).__init__(*args, **kwargs)
 
+        self.pid = None
+
+    def main(self):
+        # Start a long running executable and return without consuming all
+        # of its output.
+        output = self.run_executable(["sh", "-c", "echo $$; sleep 30"])
+        self.pid = int(next(output))
+        self._output = output
+
 
 class Test(unittest.TestCase):
 
@@ -98,6 +116,349 @@ class Test(unittest.TestCase):
             pass
         self.assertEqual(app.executable_status, 1)
 
+    def test_children1(self):
+        """
+        Verify that closing a partially consumed generator terminates the
+        executable and its process group.
+        """
+        cmd = ["sh", "-c", "sleep 30 & echo $!; wait"]
+        app = TestApp()
+        output = app.run_executable(cmd)
+        grandchild_pid = int(next(output))
+        output.close()
+
+        self.assertEqual(app._children, {})
+        self.assertFalse(self._pid_alive(grandchild_pid))
+
+    def test_children2(self):
+        """
+        Verify that executables still running at shutdown are terminated and
+        reported.
+        """
+        app = TestApp(silent=True)
+        app.run(args=[])
+
+        self.assertFalse(self._pid_alive(app.pid))
+        self.assertEqual(len(app.leftover_children), 1)
+        self.assertEqual(app.leftover_children[0][0], app.pid)
+
+    def test_children3(self):
+        """
+        Verify that a watchdog abort terminates the process groups of running
+        executables.
+        """
+        script = ("import sys, time; sys.path.insert(0, %r)\n"
+                  "from jaraf import App\n"
+                  "from jaraf.mixin.runexecutable import RunExecutableMixin\n"
+                  "class StallApp(RunExecutableMixin, App):\n"
+                  "    def main(self):\n"
+                  "        output = self.run_executable(\n"
+                  "            ['sh', '-c', 'sleep 30 & echo $!; wait'])\n"
+                  "        print(next(output).strip(), flush=True)\n"
+                  "        time.sleep(10)\n"
+                  "sys.exit(StallApp(silent=True).run())\n"
+                  % _path[:_path.find("/jaraf/")])
+        p = subprocess.Popen([sys.executable, "-c", script, "--watchdog",
+                              "0.5", "--watchdog-abort"],
+                             stdout=subprocess.PIPE)
+        try:
+            grandchild_pid = int(p.stdout.readline())
+            self.assertEqual(p.wait(5), AppStatusStalled)
+            self.assertFalse(self._pid_alive(grandchild_pid))
+        finally:
+            if p.poll() is None:
+                p.kill()
+                p.wait()
+            p.stdout.close()
+
+    def test_children4(self):
+        """
+        Verify that executables get their own process group but stay in the
+        session of the application, keeping its controlling terminal.
+        """
+        cmd = [sys.executable, "-c",
+               "import os; print(os.getpid(), os.getpgid(0), os.getsid(0))"]
+        app = TestApp()
+        (pid, pgid, sid) = [int(value) for value in
+                            "".join(app.run_executable(cmd)).split()]
+
+        self.assertEqual(pgid, pid)
+        self.assertEqual(sid, os.getsid(0))
+
+    def test_launch_limiter1(self):
+        """
+        Verify that the token bucket limits the launch rate after the initial
+        burst.
+        """
+        limiter = LaunchLimiter(rate=50, burst=2)
+
+        start = time.monotonic()
+        for i in range(6):
+            limiter.acquire()
+            limiter.release()
+        elapsed = time.monotonic() - start
+
+        # Two launches are free and the remaining four each need a token at
+        # 50 tokens per second.
+        self.assertTrue(elapsed >= 0.07)
+        self.assertEqual(limiter.launches, 6)
+        self.assertEqual(limiter.running, 0)
+
+    def test_launch_limiter2(self):
+        """
+        Verify that the concurrency cap is enforced across threads.
+        """
+        limiter = LaunchLimiter(max_running=2)
+        lock = threading.Lock()
+        peak = [0]
+
+        def worker():
+            with limiter:
+                with lock:
+                    peak[0] = max(peak[0], limiter.running)
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=worker) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(limiter.launches, 6)
+
+    def test_launch_limiter3(self):
+        """
+        Verify that acquire() returns False when the timeout expires.
+        """
+        limiter = LaunchLimiter(max_running=1)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        limiter.release()
+        self.assertTrue(limiter.acquire(timeout=0.01))
+
+    def test_launch_limiter4(self):
+        """
+        Verify that run_executable() uses and releases the launch limiter.
+        """
+        app = TestApp(launch_rate=100, max_running=1)
+        for line in app.run_executable(["true"]):
+            pass
+
+        self.assertEqual(app.launch_limiter.launches, 1)
+        self.assertEqual(app.launch_limiter.running, 0)
+
+    def test_log_executable(self):
+        """
+        Verify that log_executable() forwards the output to the application
+        logger with the default prefix.
+        """
+        app = TestApp()
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        app.log.addHandler(handler)
+        app.log.setLevel(logging.INFO)
+
+        try:
+            status = app.log_executable(["seq", "1", "3"])
+        finally:
+            app.log.removeHandler(handler)
+
+        self.assertEqual(status, AppStatusOkay)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("INFO seq["))
+        self.assertTrue(lines[2].endswith("]: 3"))
+
+    def test_log_forwarder1(self):
+        """
+        Verify that batched lines are written to stream handlers and to other
+        handlers one record at a time.
+        """
+        records = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+
+        logger = logging.getLogger("jaraf:test:forwarder1")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        stream = io.StringIO()
+        logger.addHandler(logging.StreamHandler(stream))
+        logger.addHandler(ListHandler())
+
+        forwarder = LogForwarder(logger, logging.INFO, "cmd: ", batch_size=2)
+        for line in ["a\n", "b\n", "c\n"]:
+            forwarder.add(line)
+
+        # The first two lines were flushed as a batch.
+        self.assertEqual(stream.getvalue(), "cmd: a\ncmd: b\n")
+
+        forwarder.close()
+        self.assertEqual(stream.getvalue(), "cmd: a\ncmd: b\ncmd: c\n")
+        self.assertEqual(records, ["cmd: a", "cmd: b", "cmd: c"])
+
+    def test_log_forwarder2(self):
+        """
+        Verify that sampling forwards every Nth line and reports the count.
+        """
+        logger = logging.getLogger("jaraf:test:forwarder2")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        stream = io.StringIO()
+        logger.addHandler(logging.StreamHandler(stream))
+
+        forwarder = LogForwarder(logger, logging.INFO, sample=3)
+        for i in range(7):
+            forwarder.add("%d\n" % i)
+        forwarder.close()
+
+        self.assertEqual(stream.getvalue().splitlines(),
+                         ["0", "3", "6", "forwarded 3 of 7 lines"])
+        self.assertEqual(forwarder.lines_seen, 7)
+        self.assertEqual(forwarder.lines_forwarded, 3)
+
+    def test_log_forwarder3(self):
+        """
+        Verify that a buffered line is flushed while no more lines arrive, and
+        that records keep the arrival time of their lines.
+        """
+        logger = logging.getLogger("jaraf:test:forwarder3")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(created)f %(message)s"))
+        logger.addHandler(handler)
+
+        forwarder = LogForwarder(logger, logging.INFO, flush_secs=0.05)
+        start = time.time()
+        forwarder.add("first\n")
+        time.sleep(0.3)
+        self.assertTrue(stream.getvalue().endswith(" first\n"))
+
+        forwarder.add("second\n")
+        forwarder.close()
+        created = [float(line.split()[0])
+                   for line in stream.getvalue().splitlines()]
+        self.assertTrue(start <= created[0] < start + 0.1)
+        self.assertTrue(created[1] >= created[0] + 0.3)
+
+    def test_output_matcher1(self):
+        """
+        Verify that matcher counters and callbacks are updated for every
+        pattern that matches a line.
+        """
+        values = []
+        matcher = OutputMatcher()
+        matcher.add("number", r"(\d+)", lambda m: values.append(m.group(1)))
+        matcher.add("even", r"[02468]$")
+        matcher.add("never", r"^never$")
+
+        for line in ["1", "2", "three", "44"]:
+            matcher.match(line)
+
+        self.assertEqual(values, ["1", "2", "44"])
+        self.assertEqual(matcher.counts, {"number": 3, "even": 2, "never": 0})
+
+        matcher.reset()
+        self.assertEqual(matcher.counts["number"], 0)
+
+    def test_output_matcher2(self):
+        """
+        Verify that duplicate pattern names are rejected.
+        """
+        matcher = OutputMatcher().add("foo", "foo")
+        self.assertRaises(ValueError, matcher.add, "foo", "bar")
+
+    def test_output_matcher3(self):
+        """
+        Verify that patterns keep their own flags, group names and
+        backreferences, and that invalid patterns are rejected when added.
+        """
+        matcher = OutputMatcher()
+        matcher.add("error", r"(?i)^error: (?P<msg>.*)")
+        matcher.add("warning", r"^warning: (?P<msg>.*)")
+        matcher.add("repeat", r"(b)\1")
+        self.assertRaises(re.error, matcher.add, "bad", r"(")
+
+        for line in ("ERROR: x", "warning: y", "abba", "nothing"):
+            matcher.match(line)
+        self.assertEqual(matcher.counts,
+                         {"error": 1, "warning": 1, "repeat": 1})
+
+    def test_output_matcher4(self):
+        """
+        Verify that combined patterns all match when their matches overlap,
+        and that callbacks get the match of their own pattern.
+        """
+        groups = []
+        matcher = OutputMatcher()
+        matcher.add("word", r"(\w+) (\w+)",
+                    lambda m: groups.append(m.group(2)))
+        matcher.add("last", r"(?P<last>\w+)$",
+                    lambda m: groups.append(m.group("last")))
+        matcher.add("verbose", r"(?x) b \s c  # comment")
+        self.assertEqual(matcher._separate, [])
+
+        self.assertTrue(matcher.match("a b c"))
+        self.assertFalse(matcher.match("!"))
+        self.assertEqual(groups, ["b", "c"])
+        self.assertEqual(matcher.counts, {"word": 1, "last": 1, "verbose": 1})
+
+        # A group name used by an earlier pattern can't be combined.
+        matcher.add("again", r"(?P<last>x)")
+        self.assertEqual(matcher._separate, ["again"])
+        self.assertTrue(matcher.match("x"))
+        self.assertEqual(matcher.counts["again"], 1)
+        self.assertEqual(matcher.counts["last"], 2)
+
+    def test_run_executable4(self):
+        """
+        Verify that only matched lines are yielded when matched_only is set.
+        """
+        matcher = OutputMatcher()
+        matcher.add("even", r"^\d*[02468]$")
+
+        cmd = ["seq", "1", "10"]
+        app = TestApp()
+        lines = [line.strip()
+                 for line in app.run_executable(cmd, matcher=matcher,
+                                                matched_only=True)]
+
+        self.assertEqual(lines, ["2", "4", "6", "8", "10"])
+        self.assertEqual(matcher.counts["even"], 5)
+
+    def test_run_executable5(self):
+        """
+        Verify that all lines are yielded by default when using a matcher.
+        """
+        matcher = OutputMatcher().add("one", r"^1$")
+
+        cmd = ["seq", "1", "10"]
+        app = TestApp()
+        lines = list(app.run_executable(cmd, matcher=matcher))
+
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(matcher.counts["one"], 1)
+
+    @staticmethod
+    def _pid_alive(pid):
+        """
+        Return True if the pid exists and is not a zombie.
+        """
+        for i in range(50):
+            try:
+                with open("/proc/%d/stat" % pid) as fh:
+                    if fh.read().rsplit(")", 1)[1].split()[0] == "Z":
+                        return False
+            except (IOError, OSError):
+                return False
+            time.sleep(0.01)
+        return True
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,159 @@
+"""
+Unit tests for the WorkQueueMixin class.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf import App
+from jaraf.codes import AppStatusError
+from jaraf.mixin.workqueue import WorkQueue, WorkQueueMixin
+
+
+class TestApp(WorkQueueMixin, App):
+
+    def __init__(self, *args, **kwargs):
+
+        super(TestApp, self).__init__(*args, **kwargs)
+
+        self.processed = []
+
+    def main(self):
+        self.consume(self.process, batch_size=3)
+
+    def process(self, payload):
+        if payload == "bad":
+            raise RuntimeError("bad item")
+        self.processed.append(payload)
+
+
+def consume_queue(path, results):
+    """
+    Consume a queue in a separate process and report the processed items.
+    """
+    app = TestApp(silent=True, work_queue=path)
+    app.run([])
+    results.put(app.processed)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "queue.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_consume1(self):
+        """
+        Verify that consume() processes every item and that a failing item is
+        retried, then dead-lettered.
+        """
+        queue = WorkQueue(self.path)
+        queue.enqueue_many(["a", "bad", "b", "c"])
+        queue.close()
+
+        app = TestApp(silent=True, work_max_attempts=2)
+        status = app.run(["--work-queue", self.path])
+        self.assertEqual(status, AppStatusError)
+        self.assertEqual(app.processed, ["a", "b", "c"])
+        self.assertEqual(app.work_queue.dead_lettered, 1)
+
+        queue = WorkQueue(self.path)
+        self.assertEqual(queue.counts(), {"ready": 0, "leased": 0, "dead": 1})
+        self.assertEqual([(payload, attempts, error) for
+                          (_, payload, attempts, error)
+                          in queue.dead_letters()], [("bad", 2, "bad item")])
+        queue.close()
+
+    def test_consume2(self):
+        """
+        Verify that several processes consume a queue without processing an
+        item twice.
+        """
+        queue = WorkQueue(self.path)
+        queue.enqueue_many(range(200))
+        queue.close()
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=consume_queue,
+                                           args=(self.path, results))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        processed = []
+        for worker in workers:
+            processed.extend(results.get(timeout=30))
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(processed), list(range(200)))
+
+    def test_lease(self):
+        """
+        Verify that leased items are hidden until their visibility timeout
+        expires, and that a stale lease can't ack an item leased again.
+        """
+        queue = WorkQueue(self.path, visibility_timeout=0.2, max_attempts=2)
+        queue.enqueue_many(["a", "b"])
+        queue.enqueue("c", delay=60)
+
+        items = queue.lease(5)
+        self.assertEqual([item.payload for item in items], ["a", "b"])
+        self.assertEqual(queue.lease(), [])
+        self.assertEqual(queue.counts(), {"ready": 0, "leased": 3, "dead": 0})
+
+        time.sleep(0.3)
+        again = queue.lease(5)
+        self.assertEqual([item.attempts for item in again], [2, 2])
+        self.assertEqual(queue.ack(items), 0)
+        self.assertEqual(queue.ack(again[0]), 1)
+
+        # The lease of "b" expires after its last attempt.
+        time.sleep(0.3)
+        self.assertEqual(queue.lease(), [])
+        self.assertEqual(queue.counts()["dead"], 1)
+        self.assertEqual(queue.requeue_dead(), 1)
+        self.assertEqual(queue.lease()[0].payload, "b")
+        queue.close()
+
+    def test_nack(self):
+        """
+        Verify that a nacked item is retried after its delay, then
+        dead-lettered after the maximum number of attempts.
+        """
+        queue = WorkQueue(self.path, max_attempts=2)
+        queue.enqueue({"n": 1})
+
+        item = queue.lease()[0]
+        self.assertFalse(queue.nack(item, delay=0.1))
+        self.assertEqual(queue.lease(), [])
+        time.sleep(0.15)
+        item = queue.lease()[0]
+        self.assertEqual(item.payload, {"n": 1})
+        self.assertTrue(queue.nack(item, error="failed"))
+        self.assertEqual(queue.lease(), [])
+        self.assertEqual(queue.dead_letters()[0][2:], (2, "failed"))
+        queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,429 @@
+"""
+Mixin that adds a local work queue shared by several application processes on
+the same host. As a mixin, this module is not meant to be used as a standalone
+and requires certain members and methods from the App base class to be
+defined.
+
+Rather than splitting the input between processes up front, one process (or
+all of them) enqueues work items and every process leases items from the queue
+until it is empty, so that fast workers naturally take more of the work. The
+queue is an sqlite database in WAL mode, so it needs no server and survives
+crashes. There are a few constructor parameters supported to configure the
+queue:
+
+* *work_queue* (str): Queue database path (default=a ``.queue.sqlite`` file
+  next to the log). Also set with the ``--work-queue PATH`` option.
+* *work_visibility_timeout* (float): Number of seconds a leased item is hidden
+  from other workers (default=60). An item that is neither acked nor nacked
+  within this time, e.g. because its worker died, is leased again.
+* *work_max_attempts* (int): Number of leases after which an item that still
+  isn't acked is moved to the dead letters (default=5).
+
+::
+
+    from jaraf import App
+    from jaraf.mixin.workqueue import WorkQueueMixin
+
+    class MyApp(WorkQueueMixin, App):
+
+        def process_arguments(self, args, arg_extras):
+            self.items = arg_extras
+
+        def main(self):
+            self.work_queue.enqueue_many(self.items)
+            self.consume(self.process, batch_size=10)
+
+    if __name__ == "__main__":
+        app = MyApp(work_visibility_timeout=300)
+
+In the above example, every instance adds its arguments to the queue, then
+processes items until the queue is empty. Items are delivered at least once, so
+processing should be idempotent. The numbers of acked, failed and
+dead-lettered items are reported in the footer.
+"""
+
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from jaraf.codes import AppStatusError
+
+# Item leased from a work queue. The token identifies the lease, so that a
+# worker whose lease expired can't ack an item leased again by another worker.
+WorkItem = collections.namedtuple("WorkItem",
+                                  ["id", "payload", "attempts", "token"])
+
+
+class WorkQueue(object):
+    """
+    Work queue stored in an sqlite database that can be shared by several
+    processes.
+
+    * *path* (str): Database file path.
+    * *visibility_timeout* (float): Default number of seconds an item is
+      leased for.
+    * *max_attempts* (int): Number of leases after which an item is
+      dead-lettered.
+    * *busy_timeout* (float): Number of seconds to wait for another process to
+      finish a transaction.
+
+    Payloads must be JSON-serializable. Each :meth:`lease()` and :meth:`ack()`
+    is one transaction whatever the number of items, so leasing and acking
+    items in batches divides the transaction (and fsync) overhead by the batch
+    size.
+    """
+
+    def __init__(self, path, visibility_timeout=60, max_attempts=5,
+                 busy_timeout=30):
+        self._path = path
+        self._visibility_timeout = visibility_timeout
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._token = 0
+        self._token_prefix = "%d-%x-" % (os.getpid(), id(self))
+
+        self._db = sqlite3.connect(path, timeout=busy_timeout,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Committed transactions survive a process crash, but the last ones
+        # may be lost on a power failure, which only causes redeliveries.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS items "
+                         "(id INTEGER PRIMARY KEY, payload TEXT, "
+                         "attempts INTEGER DEFAULT 0, "
+                         "visible_at REAL DEFAULT 0, token TEXT, "
+                         "dead INTEGER DEFAULT 0, error TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS items_visible "
+                         "ON items (dead, visible_at)")
+
+        self.enqueued = 0
+        self.leased = 0
+        self.acked = 0
+        self.nacked = 0
+        self.dead_lettered = 0
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the database file path.
+        """
+        return self._path
+
+    def ack(self, items):
+        """
+        * *items*: A :class:`WorkItem` or a list of them.
+
+        Remove completed items from the queue, in one transaction. Items whose
+        lease expired and that were leased again by another worker are left
+        alone.
+
+        *Returns:* The number of removed items.
+        """
+        if isinstance(items, WorkItem):
+            items = [items]
+        with self._transaction() as db:
+            acked = 0
+            for item in items:
+                acked += db.execute("DELETE FROM items WHERE id = ? AND "
+                                    "token = ?",
+                                    (item.id, item.token)).rowcount
+        self.acked += acked
+        return acked
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def counts(self):
+        """
+        *Returns:* A dictionary with the number of "ready", "leased" and "dead"
+        items.
+        """
+        now = time.time()
+        with self._lock:
+            (ready, leased, dead) = self._db.execute(
+                "SELECT COALESCE(SUM(dead = 0 AND visible_at <= ?), 0), "
+                "COALESCE(SUM(dead = 0 AND visible_at > ?), 0), "
+                "COALESCE(SUM(dead), 0) FROM items",
+                (now, now)).fetchone()
+        return {"ready": ready, "leased": leased, "dead": dead}
+
+    def dead_letters(self):
+        """
+        *Returns:* A list of (id, payload, attempts, error) tuples for the
+        dead-lettered items.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT id, payload, attempts, error "
+                                    "FROM items WHERE dead = 1 "
+                                    "ORDER BY id").fetchall()
+        return [(row[0], json.loads(row[1]), row[2], row[3]) for row in rows]
+
+    def enqueue(self, payload, delay=0):
+        """
+        * *payload*: JSON-serializable work item.
+        * *delay* (float): Number of seconds before the item can be leased.
+
+        Add an item to the queue.
+
+        *Returns:* The item id.
+        """
+        with self._transaction() as db:
+            item_id = db.execute("INSERT INTO items (payload, visible_at) "
+                                 "VALUES (?, ?)",
+                                 (json.dumps(payload),
+                                  time.time() + delay)).lastrowid
+        self.enqueued += 1
+        return item_id
+
+    def enqueue_many(self, payloads):
+        """
+        * *payloads*: Iterable of JSON-serializable work items.
+
+        Add several items to the queue in one transaction.
+
+        *Returns:* The number of added items.
+        """
+        rows = [(json.dumps(payload),) for payload in payloads]
+        with self._transaction() as db:
+            db.executemany("INSERT INTO items (payload) VALUES (?)", rows)
+        self.enqueued += len(rows)
+        return len(rows)
+
+    def lease(self, count=1, timeout=None):
+        """
+        * *count* (int): Maximum number of items to lease.
+        * *timeout* (float): Number of seconds the items are hidden from other
+          workers, defaulting to the queue visibility timeout.
+
+        Lease the oldest visible items. Expired leases of items that already
+        had *max_attempts* leases are dead-lettered instead.
+
+        *Returns:* A list of :class:`WorkItem` tuples, empty if no item is
+        visible.
+        """
+        now = time.time()
+        visible_at = now + (self._visibility_timeout if timeout is None
+                            else timeout)
+        items = []
+        with self._transaction() as db:
+            self.dead_lettered += db.execute(
+                "UPDATE items SET dead = 1, error = 'lease expired' "
+                "WHERE dead = 0 AND visible_at <= ? AND attempts >= ?",
+                (now, self._max_attempts)).rowcount
+
+            rows = db.execute("SELECT id, payload, attempts FROM items "
+                              "WHERE dead = 0 AND visible_at <= ? "
+                              "ORDER BY visible_at, id LIMIT ?",
+                              (now, count)).fetchall()
+            for (item_id, payload, attempts) in rows:
+                self._token += 1
+                token = self._token_prefix + str(self._token)
+                db.execute("UPDATE items SET attempts = ?, visible_at = ?, "
+                           "token = ? WHERE id = ?",
+                           (attempts + 1, visible_at, token, item_id))
+                items.append(WorkItem(item_id, json.loads(payload),
+                                      attempts + 1, token))
+        self.leased += len(items)
+        return items
+
+    def nack(self, item, delay=0, error=None):
+        """
+        * *item* (:class:`WorkItem`): Leased item.
+        * *delay* (float): Number of seconds before the item can be leased
+          again.
+        * *error* (str): Reason for the failure, kept with dead letters.
+
+        Return a failed item to the queue, or move it to the dead letters if it
+        reached the maximum number of attempts.
+
+        *Returns:* True if the item was dead-lettered.
+        """
+        dead = item.attempts >= self._max_attempts
+        with self._transaction() as db:
+            updated = db.execute("UPDATE items SET visible_at = ?, dead = ?, "
+                                 "error = ?, token = NULL "
+                                 "WHERE id = ? AND token = ?",
+                                 (time.time() + delay, int(dead), error,
+                                  item.id, item.token)).rowcount
+        self.nacked += updated
+        if dead and updated:
+            self.dead_lettered += 1
+        return dead and bool(updated)
+
+    def requeue_dead(self):
+        """
+        Return the dead-lettered items to the queue with no attempts, e.g.
+        after fixing the cause of their failure.
+
+        *Returns:* The number of requeued items.
+        """
+        with self._transaction() as db:
+            return db.execute("UPDATE items SET dead = 0, attempts = 0, "
+                              "visible_at = 0, token = NULL, error = NULL "
+                              "WHERE dead = 1").rowcount
+
+    def _transaction(self):
+        """
+        Return a context manager for a write transaction. The database lock is
+        taken when the transaction begins, so that two processes leasing at
+        the same time don't deadlock upgrading their read locks.
+        """
+        return _Transaction(self._db, self._lock)
+
+
+class _Transaction(object):
+    """
+    Context manager running a BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, db, lock):
+        self._db = db
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._db
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        try:
+            self._db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self._lock.release()
+
+
+class WorkQueueMixin(object):
+    """
+    Application framework mixin class that adds a shared local work queue.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        super(WorkQueueMixin, self).__init__(*args, **kwargs)
+
+        # Work queue parameters.
+        self._work_queue = None
+        self._work_queue_path = kwargs.get("work_queue")
+        self._work_visibility_timeout = kwargs.get("work_visibility_timeout",
+                                                   60)
+        self._work_max_attempts = kwargs.get("work_max_attempts", 5)
+
+    @property
+    def work_queue(self):
+        """
+        *Property.* Return the :class:`WorkQueue` of the application, opening
+        it the first time.
+        """
+        if self._work_queue is None:
+            self._work_queue = WorkQueue(self._get_work_queue_path(),
+                                         self._work_visibility_timeout,
+                                         self._work_max_attempts)
+        return self._work_queue
+
+    def consume(self, func, batch_size=1, wait=False, poll_secs=1.0):
+        """
+        * *func* (callable): Function called with the payload of each item.
+        * *batch_size* (int): Number of items leased at a time. Larger batches
+          reduce the number of transactions, but an item may wait for the rest
+          of its batch before it is acked.
+        * *wait* (bool): If True, keep polling for new items when the queue is
+          empty instead of returning.
+        * *poll_secs* (float): Number of seconds between polls while waiting.
+
+        Process items from the queue until it is empty or a shutdown is
+        requested. Each batch is acked in one transaction. An item whose
+        function raises an exception is logged, sets the application status to
+        an error and is nacked so that it is retried, up to the maximum number
+        of attempts.
+
+        *Returns:* The number of successfully processed items.
+        """
+        queue = self.work_queue
+        processed = 0
+        while not self.shutdown_requested:
+            items = queue.lease(batch_size)
+            if not items:
+                if not wait or self.shutdown_event.wait(poll_secs):
+                    break
+                continue
+
+            done = []
+            for item in items:
+                try:
+                    func(item.payload)
+                    done.append(item)
+                except Exception as err:
+                    self._status = AppStatusError
+                    self.log.error("Unable to process work item %d "
+                                   "(attempt %d): %.200r", item.id,
+                                   item.attempts, item.payload)
+                    self.log_exception()
+                    queue.nack(item, error=str(err))
+                self.heartbeat()
+            processed += queue.ack(done)
+        return processed
+
+    def _add_arguments(self):
+        """
+        Add WorkQueueMixin command-line arguments.
+        """
+        super(WorkQueueMixin, self)._add_arguments()
+
+        self._arg_parser.add_argument("--work-queue",
+                                      action="store",
+                                      dest="work_queue",
+                                      metavar="PATH")
+
+    def _get_work_queue_path(self):
+        """
+        Return the path of the work queue database.
+        """
+        if self._work_queue_path:
+            return os.path.abspath(self._work_queue_path)
+        return self._get_side_file_path(".queue.sqlite")
+
+    def _log_footer(self):
+        """
+        Append the work queue stats to the footer.
+        """
+        super(WorkQueueMixin, self)._log_footer()
+
+        queue = self._work_queue
+        if queue is not None:
+            self.log.info("- work queue: %s", queue.path)
+            self.log.info("  > enqueued %d, leased %d, acked %d, nacked %d, "
+                          "dead-lettered %d", queue.enqueued, queue.leased,
+                          queue.acked, queue.nacked, queue.dead_lettered)
+
+    def _process_arguments(self, args=None):
+        """
+        Process WorkQueueMixin command-line arguments.
+        """
+        super(WorkQueueMixin, self)._process_arguments(args)
+
+        # Work queue.
+        if self._args.work_queue is not None:
+            self._work_queue_path = self._args.work_queue
+
+    def _shutdown(self):
+        """
+        Close the work queue.
+        """
+        if self._work_queue is not None:
+            self._work_queue.close()
+
+        super(WorkQueueMixin, self)._shutdown()
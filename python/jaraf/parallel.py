@@ -0,0 +1,181 @@
+"""
+Parallel map used by the :meth:`~jaraf.App.map()` method.
+
+Items are submitted to a :mod:`concurrent.futures` executor in chunks, and only
+a bounded number of chunks are in flight at a time, so the input iterable is
+consumed lazily and can be larger than memory.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import time
+import traceback
+
+BACKENDS = ("thread", "process")
+
+
+class MapStats(object):
+    """
+    Item counts and elapsed time of one or more parallel maps.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.failures = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """
+        *Property.* Return the number of items processed per second.
+        """
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def parallel_map(func, iterable, workers=None, backend="thread", chunksize=1,
+                 ordered=True, on_error=None, stats=None):
+    """
+    * *func* (callable): Function called with each item. With the process
+      backend, the function and items must be picklable.
+    * *iterable*: Items to process.
+    * *workers* (int): Maximum number of workers, defaulting to the executor
+      default.
+    * *backend* (str): "thread" or "process".
+    * *chunksize* (int): Number of items sent to a worker at a time.
+    * *ordered* (bool): If True, results are yielded in input order, otherwise
+      as soon as they are completed.
+    * *on_error* (callable): Called with the item and the formatted traceback
+      of each item that raises an exception.
+    * *stats* (:class:`MapStats`): Stats object to update.
+
+    Call a function on every item in parallel. Items that raise an exception
+    are passed to *on_error* and produce no result. If a whole chunk fails,
+    e.g. because its results can't be pickled, each of its items is passed to
+    *on_error*. If the executor breaks, e.g. because a worker process was
+    killed, the items of the chunks in flight are passed to *on_error* and the
+    rest of the input is left unread.
+
+    *Returns:* A generator of the function results.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Invalid map backend: %s" % backend)
+    if chunksize < 1:
+        raise ValueError("chunksize must be positive")
+    return _map(func, iterable, workers, backend, chunksize, ordered,
+                on_error, stats)
+
+
+def _map(func, iterable, workers, backend, chunksize, ordered, on_error,
+         stats):
+    """
+    Generator that implements :func:`parallel_map()`, which validates the
+    arguments before the first result is requested.
+    """
+    # Use the same default number of workers as the executors.
+    cpus = os.cpu_count() or 1
+    if backend == "thread":
+        workers = workers or min(32, cpus + 4)
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    else:
+        workers = workers or cpus
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+
+    # Keep every worker busy with one chunk queued behind the running one.
+    window = 2 * workers
+    items = iter(iterable)
+    pending = collections.deque()
+    chunks = {}
+    broken = False
+    start_time = time.monotonic()
+
+    def submit():
+        if broken:
+            return False
+        chunk = list(itertools.islice(items, chunksize))
+        if not chunk:
+            return False
+        try:
+            future = executor.submit(_call_chunk, func, chunk)
+        except concurrent.futures.BrokenExecutor as e:
+            # Report the chunk like the ones that were in flight.
+            future = concurrent.futures.Future()
+            future.set_exception(e)
+        chunks[future] = chunk
+        pending.append(future)
+        return True
+
+    try:
+        while len(pending) < window and submit():
+            pass
+
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                (done, not_done) = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            chunk = chunks.pop(future)
+            submit()
+
+            try:
+                results = future.result()
+            except concurrent.futures.BrokenExecutor:
+                # The executor can't run anything else, so the chunks in
+                # flight fail as well and no more are submitted.
+                broken = True
+                results = _fail_chunk(chunk)
+            except Exception:
+                results = _fail_chunk(chunk)
+
+            for (ok, item, value) in results:
+                if stats is not None:
+                    stats.items += 1
+                if ok:
+                    yield value
+                else:
+                    if stats is not None:
+                        stats.failures += 1
+                    if on_error is not None:
+                        on_error(item, value)
+
+    finally:
+        # Also reached if the consumer stops early, in which case the queued
+        # chunks are dropped.
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if stats is not None:
+            stats.elapsed += time.monotonic() - start_time
+
+
+def _call_chunk(func, chunk):
+    """
+    Call a function on every item of a chunk in a worker. Exceptions are
+    formatted in the worker since tracebacks can't be sent between processes.
+
+    *Returns:* A list of (ok, item, result or traceback) tuples. Items are only
+    returned for failures.
+    """
+    results = []
+    for item in chunk:
+        try:
+            results.append((True, None, func(item)))
+        except Exception:
+            results.append((False, item, traceback.format_exc()))
+    return results
+
+
+def _fail_chunk(chunk):
+    """
+    Mark every item of a chunk whose results couldn't be retrieved as failed,
+    with the traceback of the exception being handled.
+
+    *Returns:* A list of (ok, item, traceback) tuples like
+    :func:`_call_chunk()`.
+    """
+    exc_text = traceback.format_exc()
+    return [(False, item, exc_text) for item in chunk]
@@ -0,0 +1,251 @@
+"""
+Profiling helpers used by the :class:`~jaraf.App` class to support the
+``--profile`` and ``--trace-memory`` command-line options.
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+
+
+class Profiler(object):
+    """
+    Run a function under :mod:`cProfile` and summarize the results.
+
+    * *sort* (str): :mod:`pstats` sort key used to rank functions (e.g.
+      "cumulative", "tottime", "ncalls").
+    * *top* (int): Number of functions to include in the summary.
+    * *restrictions* (list): Optional list of regular expressions used to
+      restrict the summary to matching functions, applied in order like the
+      restrictions passed to :meth:`pstats.Stats.print_stats()`.
+    """
+
+    def __init__(self, sort="cumulative", top=20, restrictions=None):
+        self._sort = sort
+        self._top = top
+        self._restrictions = list(restrictions or [])
+        self._profile = cProfile.Profile()
+        self._stats = None
+
+    @property
+    def stats(self):
+        """
+        *Property.* Return the :class:`pstats.Stats` collected by
+        :meth:`run()`, or None if nothing has been profiled yet.
+        """
+        return self._stats
+
+    def dump(self, path):
+        """
+        * *path* (str): Output file path.
+
+        Write the collected stats to a ``.pstats`` file that can be loaded with
+        :class:`pstats.Stats` or tools such as snakeviz.
+        """
+        self._stats.dump_stats(path)
+
+    def run(self, func, *args, **kwargs):
+        """
+        * *func* (callable): Function to profile.
+
+        Call a function with profiling enabled. The stats are collected even if
+        the function raises an exception.
+
+        *Returns:* The function return value.
+        """
+        self._profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._profile.disable()
+            self._stats = pstats.Stats(self._profile)
+            self._stats.sort_stats(self._sort)
+
+    def top_lines(self):
+        """
+        Format the top functions as a list of strings with the call count,
+        internal time and cumulative time of each function.
+
+        *Returns:* A list of formatted lines, starting with a header line.
+        """
+        if self._stats is None:
+            return []
+
+        restrictions = self._restrictions + [self._top]
+        (width, funcs) = self._stats.get_print_list(restrictions)
+
+        lines = ["%10s %10s %10s  %s" % ("ncalls", "tottime", "cumtime",
+                                         "function")]
+        for func in funcs or []:
+            (cc, nc, tt, ct, callers) = self._stats.stats[func]
+            ncalls = str(nc) if nc == cc else "%d/%d" % (nc, cc)
+            lines.append("%10s %10.3f %10.3f  %s"
+                         % (ncalls, tt, ct, pstats.func_std_string(func)))
+        return lines
+
+
+class MemoryTracer(object):
+    """
+    Trace memory allocations with :mod:`tracemalloc` and summarize the top
+    allocation sites and the growth between snapshots.
+
+    * *frames* (int): Number of stack frames stored for each allocation.
+    * *top* (int): Number of allocation sites to include in the summaries.
+    * *dump_dir* (str): Optional directory to dump each snapshot to so that
+      they can be compared offline with :meth:`tracemalloc.Snapshot.load()`.
+    * *dump_prefix* (str): File name prefix for dumped snapshots.
+
+    Only the first and latest snapshots are kept in memory. The total traced
+    size of every snapshot is recorded so that the growth over the whole run can
+    be reported.
+    """
+
+    # Allocations made by the tracing machinery itself are not interesting.
+    _FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"))
+
+    def __init__(self, frames=1, top=10, dump_dir=None, dump_prefix="memory"):
+        self._frames = frames
+        self._top = top
+        self._dump_dir = dump_dir
+        self._dump_prefix = dump_prefix
+
+        self._lock = threading.Lock()
+        self._first = None
+        self._last = None
+        self._totals = []
+        self._peak = 0
+        self._started = False
+
+        self._interval_event = threading.Event()
+        self._interval_thread = None
+
+    @property
+    def peak(self):
+        """
+        *Property.* Return the peak traced memory size in bytes.
+        """
+        return self._peak
+
+    @property
+    def totals(self):
+        """
+        *Property.* Return a list of (label, total bytes) tuples for every
+        snapshot taken.
+        """
+        return list(self._totals)
+
+    def growth_lines(self):
+        """
+        Format the allocation sites that grew the most between the first and
+        latest snapshots.
+
+        *Returns:* A list of formatted lines.
+        """
+        if self._first is None or self._last is self._first:
+            return []
+
+        lines = []
+        stats = self._last[1].compare_to(self._first[1], "lineno")
+        for stat in stats[:self._top]:
+            lines.append("%+10.1f KiB %+8d blocks  %s"
+                         % (stat.size_diff / 1024.0, stat.count_diff,
+                            self._format_traceback(stat.traceback)))
+        return lines
+
+    def snapshot(self, label):
+        """
+        * *label* (str): Label identifying the snapshot.
+
+        Take a snapshot of the traced allocations.
+        """
+        if not tracemalloc.is_tracing():
+            return
+
+        snap = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+        total = sum(stat.size for stat in snap.statistics("filename"))
+        self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+
+        with self._lock:
+            index = len(self._totals)
+            self._totals.append((label, total))
+            if self._first is None:
+                self._first = (label, snap)
+            self._last = (label, snap)
+
+        if self._dump_dir is not None:
+            if not os.path.exists(self._dump_dir):
+                os.makedirs(self._dump_dir, 0o777)
+            name = "{}-{:04d}-{}.snapshot".format(self._dump_prefix, index,
+                                                  label)
+            snap.dump(os.path.join(self._dump_dir, name))
+
+    def start(self, interval=None):
+        """
+        * *interval* (float): If set, take a snapshot every *interval* seconds
+          from a background thread.
+
+        Start tracing and take the initial "start" snapshot. If tracing was
+        already started, e.g. with ``PYTHONTRACEMALLOC``, it is left running
+        with its own number of frames.
+        """
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(self._frames)
+        self.snapshot("start")
+
+        if interval:
+            self._interval_thread = threading.Thread(
+                target=self._interval_loop, args=(interval,),
+                name="jaraf-memory-tracer")
+            self._interval_thread.daemon = True
+            self._interval_thread.start()
+
+    def stop(self):
+        """
+        Take the final "finish" snapshot and stop tracing if it was started
+        by this tracer.
+        """
+        if self._interval_thread is not None:
+            self._interval_event.set()
+            self._interval_thread.join()
+            self._interval_thread = None
+
+        self.snapshot("finish")
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def top_lines(self):
+        """
+        Format the top allocation sites of the latest snapshot.
+
+        *Returns:* A list of formatted lines.
+        """
+        if self._last is None:
+            return []
+
+        lines = []
+        for stat in self._last[1].statistics("lineno")[:self._top]:
+            lines.append("%10.1f KiB %8d blocks  %s"
+                         % (stat.size / 1024.0, stat.count,
+                            self._format_traceback(stat.traceback)))
+        return lines
+
+    def _interval_loop(self, interval):
+        """
+        Take a snapshot every interval seconds until stopped.
+        """
+        while not self._interval_event.wait(interval):
+            self.snapshot("interval")
+
+    @staticmethod
+    def _format_traceback(tb):
+        """
+        Format the most recent frame of an allocation traceback.
+        """
+        frame = tb[-1]
+        return "{}:{}".format(frame.filename, frame.lineno)
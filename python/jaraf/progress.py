@@ -0,0 +1,142 @@
+"""
+Progress tracking used by the :meth:`~jaraf.App.progress()` method to report
+the rate and ETA of long loops.
+
+Reading the clock for every item would cost more than many loop bodies, so
+the clock is only read every N items, with N adjusted after each check so
+that checks happen a few times per second whatever the item rate. The
+duration of the item processed right after each check is measured, which
+samples the per-item times evenly over the run in bounded memory.
+"""
+
+import time
+
+from jaraf.timers import Histogram
+
+
+class Progress(object):
+    """
+    Iterable wrapper that counts items and calls a report function
+    periodically.
+
+    * *iterable*: Items to iterate over.
+    * *total* (int): Expected number of items, used for the percentage and
+      ETA. Defaults to ``len(iterable)`` if available.
+    * *every_secs* (float): Number of seconds between reports.
+    * *report* (callable): Called with the :class:`Progress` object every
+      *every_secs* seconds.
+    * *name* (str): Name used in the reports.
+    """
+
+    # Number of clock checks per report interval, at most one every
+    # _MAX_CHECK_SECS seconds.
+    _CHECKS_PER_REPORT = 10
+    _MAX_CHECK_SECS = 1.0
+
+    def __init__(self, iterable, total=None, every_secs=10.0, report=None,
+                 name="items"):
+        if total is None and hasattr(iterable, "__len__"):
+            total = len(iterable)
+        self._iterable = iterable
+        self._every_secs = every_secs
+        self._report = report
+        self._check_secs = min(every_secs / self._CHECKS_PER_REPORT,
+                               self._MAX_CHECK_SECS)
+        self._check_every = 1
+        self._checked_count = 0
+        self._checked_time = None
+        self._reported_time = None
+        self._start_time = None
+        self._end_time = None
+        self.name = name
+        self.total = total
+        self.count = 0
+        self.checks = 0
+        self.reports = 0
+        self.histogram = Histogram()
+
+    def __iter__(self):
+        self._start_time = self._checked_time = self._reported_time = \
+            time.perf_counter()
+        countdown = self._check_every
+        try:
+            for item in self._iterable:
+                self.count += 1
+                countdown -= 1
+                if countdown:
+                    yield item
+                    continue
+
+                self._check()
+                countdown = self._check_every
+                start = time.perf_counter()
+                yield item
+                self.histogram.add(int((time.perf_counter() - start) * 1e9))
+        finally:
+            self._end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """
+        *Property.* Return the number of seconds since the iteration started.
+        """
+        if self._start_time is None:
+            return 0.0
+        end_time = self._end_time
+        if end_time is None:
+            end_time = time.perf_counter()
+        return end_time - self._start_time
+
+    @property
+    def eta(self):
+        """
+        *Property.* Return the estimated number of seconds left, or None if
+        the total or the rate is unknown.
+        """
+        rate = self.rate
+        if self.total is None or not rate:
+            return None
+        return max(0, self.total - self.count) / rate
+
+    @property
+    def rate(self):
+        """
+        *Property.* Return the average number of items per second.
+        """
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def percentile(self, pct):
+        """
+        * *pct* (float): Percentile to return, from 0 to 100.
+
+        *Returns:* An approximate percentile of the sampled per-item times in
+        seconds, or None if no item was sampled.
+        """
+        value = self.histogram.percentile(pct)
+        return None if value is None else value / 1e9
+
+    def _check(self):
+        """
+        Read the clock, report if the report interval elapsed, and adjust the
+        number of items between checks to the current item rate.
+        """
+        now = time.perf_counter()
+        self.checks += 1
+        if now - self._reported_time >= self._every_secs:
+            self._reported_time = now
+            self.reports += 1
+            if self._report is not None:
+                self._report(self)
+
+        # Aim for one check every _check_secs, but at most double the number
+        # of items between checks at a time in case the rate drops.
+        elapsed = now - self._checked_time
+        items = self.count - self._checked_count
+        if elapsed > 0:
+            target = int(items * self._check_secs / elapsed)
+            self._check_every = max(1, min(target, 2 * self._check_every))
+        else:
+            self._check_every *= 2
+        self._checked_time = now
+        self._checked_count = self.count
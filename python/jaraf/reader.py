@@ -0,0 +1,128 @@
+"""
+Chunk-parallel reader used by the :meth:`~jaraf.App.map_chunks()` method to
+scan large line-oriented files with several workers.
+
+The file is memory-mapped to find chunk boundaries that fall just after a
+newline, so no line is split between two chunks, and each worker maps the
+file again to read its own chunks. Only the chunk offsets are sent to the
+workers, so the process backend doesn't copy the file contents between
+processes.
+"""
+
+import functools
+import mmap
+import os
+
+from jaraf.parallel import parallel_map
+
+# Default chunk size in bytes.
+DEFAULT_CHUNK_SIZE = 16 * 2 ** 20
+
+
+def chunk_ranges(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    * *path* (str): File path.
+    * *chunk_size* (int): Approximate chunk size in bytes. Chunks are extended
+      to the end of their last line.
+
+    *Returns:* A list of (start, end) byte offsets of newline-aligned chunks.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+    size = os.path.getsize(path)
+    ranges = []
+    if size == 0:
+        return ranges
+
+    with open(path, "rb") as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                newline = data.find(b"\n", end - 1)
+                end = size if newline < 0 else newline + 1
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def map_chunks(path, func, workers=None, backend="process",
+               chunk_size=DEFAULT_CHUNK_SIZE, ordered=True, encoding="utf-8",
+               on_error=None, stats=None):
+    """
+    * *path* (str): File path.
+    * *func* (callable): Function called in a worker with the list of lines
+      of a chunk, without their newlines. With the process backend, the
+      function must be picklable, e.g. a module-level function.
+    * *workers* (int): Maximum number of workers.
+    * *backend* (str): "process" for CPU-bound parsing or "thread" for
+      functions that release the GIL.
+    * *chunk_size* (int): Approximate chunk size in bytes.
+    * *ordered* (bool): If True, results are yielded in file order, otherwise
+      as soon as they are completed.
+    * *encoding* (str): Encoding used to decode the lines, or None to pass
+      them as bytes, which is faster if they are parsed as bytes anyway.
+    * *on_error* (callable): Called with the (start, end) offsets and the
+      formatted traceback of each chunk whose function raises an exception.
+    * *stats* (:class:`~jaraf.parallel.MapStats`): Stats object to update,
+      counting chunks.
+
+    Call a function on every chunk of a file in parallel::
+
+        def parse(lines):
+            return sum(int(line.split(",")[2]) for line in lines)
+
+        total = sum(map_chunks("data.csv", parse, workers=8))
+
+    *Returns:* A generator of the function results, one per chunk.
+    """
+    ranges = chunk_ranges(path, chunk_size)
+    return parallel_map(functools.partial(_read_chunk, path, func, encoding),
+                        ranges, workers=workers, backend=backend,
+                        ordered=ordered, on_error=on_error, stats=stats)
+
+
+def reduce_chunks(path, func, reducer, initial=None, **kwargs):
+    """
+    * *path* (str): File path.
+    * *func* (callable): Function called with the lines of each chunk, as for
+      :func:`map_chunks()`.
+    * *reducer* (callable): Function called with the accumulated value and a
+      chunk result, returning the new accumulated value.
+    * *initial*: Initial accumulated value.
+    * *kwargs*: Other :func:`map_chunks()` parameters.
+
+    Combine the results of the chunks as they arrive, e.g. to merge
+    per-chunk counters. With *ordered* set to False, the reducer must not
+    depend on the order of the chunks.
+
+    *Returns:* The accumulated value.
+    """
+    value = initial
+    for result in map_chunks(path, func, **kwargs):
+        value = reducer(value, result)
+    return value
+
+
+def _read_chunk(path, func, encoding, chunk_range):
+    """
+    Read a chunk of a file in a worker and call the function with its lines.
+    """
+    (start, end) = chunk_range
+    with open(path, "rb") as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunk = data[start:end]
+
+    if encoding is not None:
+        chunk = chunk.decode(encoding)
+        newline = "\n"
+    else:
+        newline = b"\n"
+    lines = chunk.split(newline)
+    if not lines[-1]:
+        lines.pop()
+    return func(lines)
@@ -0,0 +1,203 @@
+"""
+Background resource sampler used by the :class:`~jaraf.App` class to support
+the ``--sample-resources`` command-line option.
+
+Samples are read from ``/proc/self`` so the sampler is only available on Linux.
+"""
+
+import array
+import json
+import os
+import threading
+import time
+
+# Sample fields in output order.
+SAMPLE_FIELDS = ("elapsed", "rss", "cpu", "threads", "fds", "children")
+
+
+def percentile(values, pct):
+    """
+    * *values* (list): Sorted list of values.
+    * *pct* (float): Percentile to return, from 0 to 100.
+
+    Return the nearest-rank percentile of a sorted list of values.
+
+    *Returns:* The percentile value, or None if there are no values.
+    """
+    if not values:
+        return None
+    rank = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class ResourceSampler(object):
+    """
+    Thread that periodically samples the resource usage of the current process.
+
+    * *path* (str): Optional output file. Samples are written as JSON lines if
+      the path ends with ``.jsonl``, otherwise as CSV.
+    * *interval* (float): Number of seconds between samples.
+
+    Each sample records the elapsed seconds since the sampler started, the
+    resident set size in bytes, the CPU utilization in percent since the
+    previous sample, the number of threads, the number of open file
+    descriptors and the number of child processes. Sample values are also kept
+    in compact arrays so that peaks and percentiles can be summarized when
+    sampling stops.
+    """
+
+    _CLOCK_TICKS = float(os.sysconf("SC_CLK_TCK"))
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+    def __init__(self, path=None, interval=1.0):
+        self._path = path
+        self._interval = interval
+
+        self._values = dict((field, array.array("d"))
+                            for field in SAMPLE_FIELDS[1:])
+        self._event = threading.Event()
+        self._thread = None
+        self._fh = None
+
+        self._start_time = None
+        self._last_time = None
+        self._last_cpu = None
+
+    @property
+    def count(self):
+        """
+        *Property.* Return the number of samples taken.
+        """
+        return len(self._values["rss"])
+
+    @property
+    def path(self):
+        """
+        *Property.* Return the sample output file path.
+        """
+        return self._path
+
+    @staticmethod
+    def is_supported():
+        """
+        Return True if the platform provides the ``/proc/self`` files read by
+        the sampler.
+        """
+        return os.path.exists("/proc/self/stat")
+
+    def sample(self):
+        """
+        Take a sample, record it and write it to the output file. This can
+        also be called without starting the sampler thread to take a single
+        sample.
+
+        *Returns:* A dictionary with the sample values.
+        """
+        now = time.monotonic()
+        if self._start_time is None:
+            self._start_time = now
+        with open("/proc/self/stat") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+
+        # Fields are numbered from the state field, which is the third field of
+        # the stat file.
+        cpu = (int(fields[11]) + int(fields[12])) / self._CLOCK_TICKS
+        if self._last_time is None or now <= self._last_time:
+            cpu_percent = 0.0
+        else:
+            cpu_percent = (100.0 * (cpu - self._last_cpu)
+                           / (now - self._last_time))
+        self._last_time = now
+        self._last_cpu = cpu
+
+        sample = {"elapsed": round(now - self._start_time, 3),
+                  "rss": int(fields[21]) * self._PAGE_SIZE,
+                  "cpu": round(cpu_percent, 1),
+                  "threads": int(fields[17]),
+                  "fds": len(os.listdir("/proc/self/fd")),
+                  "children": self._count_children()}
+
+        for field in SAMPLE_FIELDS[1:]:
+            self._values[field].append(sample[field])
+
+        if self._fh is not None:
+            if self._path.endswith(".jsonl"):
+                self._fh.write(json.dumps(sample, sort_keys=True) + "\n")
+            else:
+                self._fh.write(",".join(str(sample[field])
+                                        for field in SAMPLE_FIELDS) + "\n")
+            self._fh.flush()
+
+        return sample
+
+    def start(self):
+        """
+        Take the first sample and start the sampler thread.
+        """
+        if self._path is not None:
+            self._fh = open(self._path, "w")
+            if not self._path.endswith(".jsonl"):
+                self._fh.write(",".join(SAMPLE_FIELDS) + "\n")
+
+        self._start_time = time.monotonic()
+        self.sample()
+
+        self._thread = threading.Thread(target=self._sample_loop,
+                                        name="jaraf-resource-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the sampler thread, take a final sample and close the output file.
+        """
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+            self.sample()
+
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def summary(self):
+        """
+        Summarize the samples.
+
+        *Returns:* A dictionary mapping each sampled field to a dictionary with
+        its "peak", "p50" and "p95" values.
+        """
+        summary = {}
+        for (field, values) in self._values.items():
+            values = sorted(values)
+            summary[field] = {"peak": values[-1] if values else None,
+                              "p50": percentile(values, 50),
+                              "p95": percentile(values, 95)}
+        return summary
+
+    @staticmethod
+    def _count_children():
+        """
+        Count the child processes of all of the threads of this process. The
+        children files are only available if the kernel was built with
+        CONFIG_PROC_CHILDREN, so return 0 if they are missing.
+        """
+        count = 0
+        try:
+            for tid in os.listdir("/proc/self/task"):
+                try:
+                    with open("/proc/self/task/%s/children" % tid) as fh:
+                        count += len(fh.read().split())
+                except (IOError, OSError):
+                    pass
+        except (IOError, OSError):
+            pass
+        return count
+
+    def _sample_loop(self):
+        """
+        Take a sample every interval seconds until stopped.
+        """
+        while not self._event.wait(self._interval):
+            self.sample()
@@ -0,0 +1,143 @@
+"""
+Schedules used by the :class:`~jaraf.App` service mode to decide when to run
+the next iteration of :meth:`~jaraf.App.main()`.
+"""
+
+import datetime
+import time
+
+
+class IntervalSchedule(object):
+    """
+    Schedule that runs every *interval* seconds, measured from the start of
+    the previous run.
+
+    * *interval* (float): Number of seconds between runs.
+    """
+
+    def __init__(self, interval):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self._interval = interval
+
+    def next_time(self, previous, now):
+        """
+        * *previous* (float): Start time of the previous run, or None if there
+          was no previous run.
+        * *now* (float): Current time.
+
+        Return the start time of the next run. Runs that were missed because
+        the previous run took longer than the interval are skipped rather than
+        started back-to-back.
+
+        *Returns:* A timestamp in seconds.
+        """
+        if previous is None:
+            return now
+        missed = max(0, int((now - previous) // self._interval))
+        return previous + (missed + 1) * self._interval
+
+
+class CronSchedule(object):
+    """
+    Schedule defined by a standard five field cron expression (minute, hour,
+    day of month, month and day of week) evaluated in local time. Each field
+    supports ``*``, numbers, ranges (``1-5``), steps (``*/15``, ``0-30/10``)
+    and comma-separated lists. As in cron, if both the day of month and day of
+    week are restricted, a day matches if either of them matches. Day of week
+    0 and 7 are both Sunday.
+
+    * *expression* (str): Cron expression, e.g. ``"*/5 * * * *"``.
+    """
+
+    # (minimum, maximum) of each field.
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Invalid cron expression: %s" % expression)
+
+        self._expression = expression
+        values = [self._parse_field(field, low, high)
+                  for (field, (low, high)) in zip(fields, self._RANGES)]
+        (self._minutes, self._hours, self._days, self._months,
+         self._weekdays) = values
+
+        # Sunday can be given as either 0 or 7.
+        if 7 in self._weekdays:
+            self._weekdays = self._weekdays | set([0])
+
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def __str__(self):
+        return self._expression
+
+    def next_time(self, previous, now):
+        """
+        * *previous* (float): Start time of the previous run. Not used.
+        * *now* (float): Current time.
+
+        Return the start of the first matching minute after *now*.
+
+        *Returns:* A timestamp in seconds.
+        """
+        t = datetime.datetime.fromtimestamp(now).replace(second=0,
+                                                         microsecond=0)
+        t += datetime.timedelta(minutes=1)
+
+        # Skip over whole months, days and hours that don't match so that the
+        # search stays short. Every expression matches within 5 years (a
+        # February 29th schedule may need 4).
+        limit = t + datetime.timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self._months:
+                t = (t.replace(day=1, hour=0, minute=0)
+                     + datetime.timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif t.hour not in self._hours:
+                t = t.replace(minute=0) + datetime.timedelta(hours=1)
+            elif t.minute not in self._minutes:
+                t += datetime.timedelta(minutes=1)
+            else:
+                return time.mktime(t.timetuple())
+
+        raise ValueError("Cron expression never matches: %s"
+                         % self._expression)
+
+    def _day_matches(self, t):
+        """
+        Return True if the day of month and day of week match.
+        """
+        day = t.day in self._days
+        # Python weekdays start at Monday=0, cron weekdays at Sunday=0.
+        weekday = (t.weekday() + 1) % 7 in self._weekdays
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        """
+        Parse a cron field into the set of values it matches.
+        """
+        values = set()
+        for part in field.split(","):
+            (spec, sep, step) = part.partition("/")
+            step = int(step) if sep else 1
+            if spec == "*":
+                (start, end) = (low, high)
+            elif "-" in spec:
+                (start, end) = [int(value) for value in spec.split("-", 1)]
+            else:
+                start = int(spec)
+                end = high if sep else start
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError("Invalid cron field: %s" % field)
+            values.update(range(start, end + 1, step))
+        return values
+
@@ -0,0 +1,45 @@
+"""
+Command-line verification that the shards of an input file (one item per
+line) are complete and disjoint::
+
+    $ python -m jaraf.shardcli --shard-count 4 manifest.txt
+
+This is kept out of :mod:`jaraf.sharding`, which the :mod:`jaraf` package
+imports, since running an already imported module with ``python -m`` makes
+:mod:`runpy` warn about unpredictable behavior.
+"""
+
+import argparse
+import sys
+
+from jaraf.sharding import METHODS, verify_shards
+
+
+def main(argv=None):
+    """
+    Verify the shards of an input file and print the per-shard counts.
+
+    *Returns:* 0 if the shards are complete and disjoint, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m jaraf.shardcli",
+        description="Verify that the shards of an input file (one item per "
+                    "line) are complete and disjoint.")
+    parser.add_argument("--shard-count", required=True, type=int)
+    parser.add_argument("--shard-method", choices=METHODS, default="hash")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    with open(args.path) as fh:
+        items = [line.rstrip("\n") for line in fh]
+
+    result = verify_shards(items, args.shard_count, args.shard_method)
+    for (index, count) in enumerate(result["counts"]):
+        print("shard %d: %d items" % (index, count))
+    print("total: %d items, %d missing, %d duplicated"
+          % (len(items), len(result["missing"]), len(result["duplicates"])))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Deterministic sharding used by the :class:`~jaraf.App` class to split one
+input set across several instances (e.g. on different machines) without any
+coordination.
+
+Every instance sees the same input and keeps only the items of its own shard.
+Two methods are supported:
+
+* "hash" assigns an item by the CRC32 of its key, which is stable across
+  processes, machines and Python versions (unlike :func:`hash()`), and
+  doesn't depend on the order or number of the other items.
+* "range" splits the input into contiguous, nearly equal ranges by position,
+  which keeps neighboring items together but needs the total number of items
+  and the same input order on every instance.
+
+The :mod:`jaraf.shardcli` module verifies the shards of an input file from the
+command line.
+"""
+
+import zlib
+
+# Sharding methods.
+METHODS = ("hash", "range")
+
+
+def shard_of(key, count):
+    """
+    * *key*: Item key. Keys other than bytes are converted to strings.
+    * *count* (int): Number of shards.
+
+    *Returns:* The index of the hash shard of a key.
+    """
+    if not isinstance(key, bytes):
+        key = str(key).encode()
+    return zlib.crc32(key) % count
+
+
+def shard_items(items, index, count, method="hash", key=None, total=None):
+    """
+    * *items*: Items to shard. The "range" method reads other iterables into
+      a list to count them, unless the *total* number of items is given.
+    * *index* (int): Index of the shard to return, from 0 to *count* - 1.
+    * *count* (int): Number of shards.
+    * *method* (str): "hash" or "range".
+    * *key* (callable): Function returning the key of an item for the "hash"
+      method. Defaults to the item itself.
+    * *total* (int): Number of items, for the "range" method.
+
+    *Returns:* A generator of the items of the shard, in input order. Raises a
+    :class:`ValueError` if the number of items can't be determined.
+    """
+    if method not in METHODS:
+        raise ValueError("Invalid shard method: %s" % method)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("Invalid shard %d of %d" % (index, count))
+
+    if method == "range":
+        if total is None:
+            if not hasattr(items, "__len__"):
+                try:
+                    items = list(items)
+                except TypeError:
+                    raise ValueError("The range shard method needs the total "
+                                     "number of items, or iterable items")
+            total = len(items)
+        elif total < 0:
+            raise ValueError("Invalid total number of items %d" % total)
+        # Item i belongs to shard i * count // total.
+        start = -(-index * total // count)
+        end = -(-(index + 1) * total // count)
+        return _range_items(items, start, end)
+
+    return (item for item in items
+            if shard_of(item if key is None else key(item), count) == index)
+
+
+def verify_shards(items, count, method="hash", key=None):
+    """
+    * *items* (list): All of the items.
+    * *count* (int): Number of shards.
+    * *method* (str): "hash" or "range".
+    * *key* (callable): Key function, as for :func:`shard_items()`.
+
+    Check that every item is assigned to exactly one shard.
+
+    *Returns:* A dictionary with the per-shard item "counts", the positions of
+    the "missing" items (in no shard) and "duplicates" (in several shards),
+    and "ok", which is True if the shards are complete and disjoint.
+    """
+    # Shard the positions of the items so that equal items are told apart.
+    keys = [item if key is None else key(item) for item in items]
+    positions = list(range(len(keys)))
+
+    seen = [0] * len(keys)
+    counts = []
+    for index in range(count):
+        shard = list(shard_items(positions, index, count, method,
+                                 keys.__getitem__))
+        counts.append(len(shard))
+        for position in shard:
+            seen[position] += 1
+
+    missing = [position for (position, n) in enumerate(seen) if n == 0]
+    duplicates = [position for (position, n) in enumerate(seen) if n > 1]
+    return {"counts": counts,
+            "missing": missing,
+            "duplicates": duplicates,
+            "ok": not missing and not duplicates}
+
+
+def _range_items(items, start, end):
+    """
+    Yield the items from position start up to position end.
+    """
+    for (position, item) in enumerate(items):
+        if position >= end:
+            break
+        if position >= start:
+            yield item
@@ -0,0 +1,360 @@
+"""
+Named phase timers used by the :meth:`~jaraf.App.timer()` method.
+
+Timers are meant to be cheap enough to use inside hot loops, so they record
+integer nanoseconds and keep their distribution in a small fixed-size
+histogram instead of storing every duration.
+"""
+
+import bisect
+import collections
+import contextvars
+import functools
+import sys
+import threading
+
+from _thread import get_ident
+from time import perf_counter_ns, process_time_ns
+
+# Each power of two is split into 2 ** _SUB_BITS histogram buckets, which
+# bounds the percentile error to about 19%.
+_SUB_BITS = 2
+_SUB_COUNT = 1 << _SUB_BITS
+_SUB_MASK = _SUB_COUNT - 1
+
+# Initial minimum duration, which is larger than any real duration.
+_NO_MIN = 1 << 63
+
+# Number of durations buffered by a timer before they are added to its stats.
+_BATCH_SIZE = 256
+
+# Loaded modules, used to check for a running event loop without importing
+# asyncio.
+_modules = sys.modules
+
+
+class Histogram(object):
+    """
+    Fixed-size log-linear histogram of non-negative integers below 2 ** 63,
+    such as durations in nanoseconds.
+    """
+
+    __slots__ = ("buckets",)
+
+    def __init__(self):
+        self.buckets = [0] * (64 * _SUB_COUNT)
+
+    @property
+    def count(self):
+        """
+        *Property.* Return the number of values added to the histogram.
+        """
+        return sum(self.buckets)
+
+    def add(self, value):
+        """
+        * *value* (int): Value to add.
+
+        Add a value to the histogram.
+        """
+        self.buckets[self.bucket_index(value)] += 1
+
+    @staticmethod
+    def bucket_index(value):
+        """
+        Return the index of the bucket a value falls into. Values below
+        2 ** _SUB_BITS get their own bucket, while larger values are bucketed
+        by their bit length and the _SUB_BITS bits below the leading bit.
+        """
+        bits = value.bit_length()
+        if bits > _SUB_BITS:
+            return (bits << _SUB_BITS) \
+                | ((value >> (bits - _SUB_BITS - 1)) & _SUB_MASK)
+        return value
+
+    def percentile(self, pct):
+        """
+        * *pct* (float): Percentile to return, from 0 to 100.
+
+        Return an approximation of a percentile, which is the upper bound of
+        the bucket containing it.
+
+        *Returns:* The percentile value, or None if the histogram is empty.
+        """
+        total = self.count
+        if not total:
+            return None
+
+        rank = max(1, int(round(pct / 100.0 * total)))
+        seen = 0
+        for (index, count) in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return self._upper_bound(index)
+        return self._upper_bound(len(self.buckets) - 1)
+
+    @staticmethod
+    def _upper_bound(index):
+        """
+        Return the largest value that falls into a bucket.
+        """
+        if index < _SUB_COUNT:
+            return index
+        bits = index >> _SUB_BITS
+        sub = index & _SUB_MASK
+        shift = bits - _SUB_BITS - 1
+        return ((_SUB_COUNT | sub) + 1 << shift) - 1
+
+
+class PhaseTimer(object):
+    """
+    Timer that records the wall and, optionally, CPU time spent in a named
+    phase. A timer is used as a context manager or as a function decorator::
+
+        timer = PhaseTimer("parse")
+
+        with timer:
+            parse()
+
+        @timer
+        def parse():
+            pass
+
+    A timer can be re-entered while it is already running (e.g. by a recursive
+    function), in which case every entry is counted separately. The start times
+    of running entries are kept per thread, or per task when entered from a
+    running asyncio event loop, so a timer can be shared by several threads or
+    tasks, each of which measures its own entries.
+
+    Entering and exiting a timer costs well under a microsecond. To keep it
+    that way, durations are buffered and added to the stats in batches, when
+    the buffer is full or the stats are read. The buffer is swapped without a
+    lock, so concurrent updates from several threads may rarely be lost.
+
+    * *name* (str): Name of the phase.
+    * *cpu* (bool): If True, CPU time is recorded as well. Reading the process
+      CPU clock is a system call that costs several times more than reading the
+      wall clock, and it measures the whole process rather than the phase when
+      other threads are busy, so it is off by default.
+    """
+
+    __slots__ = ("name", "cpu", "cpu_total", "_count", "_total", "_max",
+                 "_min", "_histogram", "_pending", "_thread_starts",
+                 "_task_starts")
+
+    def __init__(self, name, cpu=False):
+        self.name = name
+        self.cpu = cpu
+        self.cpu_total = 0
+        self._count = 0
+        self._total = 0
+        self._max = 0
+        self._min = _NO_MIN
+        self._histogram = Histogram()
+        self._pending = []
+        # Start times of the running entries, as a stack per thread of wall
+        # clock starts, or (start, cpu_start) tuples when recording CPU time,
+        # or, for asyncio tasks that share a thread, as a
+        # (start, cpu_start, previous, thread_id) linked list in a context
+        # variable, which is slower to set.
+        self._thread_starts = _ThreadStack()
+        self._task_starts = contextvars.ContextVar("jaraf.timer." + name,
+                                                   default=None)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        # Where the start time is kept is decided here, once per entry, and
+        # __exit__() only has to read the context variable to find it. The
+        # asyncio module is only imported by applications that use it, so
+        # there is no event loop to look for if it isn't loaded.
+        asyncio = _modules.get("asyncio")
+        if asyncio is not None and asyncio._get_running_loop() is not None:
+            starts = self._task_starts
+            starts.set((perf_counter_ns(),
+                        process_time_ns() if self.cpu else 0, starts.get(),
+                        get_ident()))
+        elif self.cpu:
+            self._thread_starts.stack.append((perf_counter_ns(),
+                                              process_time_ns()))
+        else:
+            self._thread_starts.stack.append(perf_counter_ns())
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        end = perf_counter_ns()
+        # A task entry can also be seen from a thread that copied the task
+        # context (e.g. with asyncio.to_thread()), hence the thread check.
+        node = self._task_starts.get()
+        if node is None or node[3] != get_ident():
+            start = self._thread_starts.stack.pop()
+            if start.__class__ is tuple:
+                self.cpu_total += process_time_ns() - start[1]
+                start = start[0]
+        else:
+            self._task_starts.set(node[2])
+            start = node[0]
+            if self.cpu:
+                self.cpu_total += process_time_ns() - node[1]
+        pending = self._pending
+        pending.append(end - start)
+        if len(pending) >= _BATCH_SIZE:
+            self._add_pending()
+
+    @property
+    def count(self):
+        """
+        *Property.* Return the number of recorded durations.
+        """
+        self._add_pending()
+        return self._count
+
+    @property
+    def histogram(self):
+        """
+        *Property.* Return the :class:`Histogram` of the recorded durations.
+        """
+        self._add_pending()
+        return self._histogram
+
+    @property
+    def max(self):
+        """
+        *Property.* Return the longest recorded duration in nanoseconds, or 0
+        if the timer was never exited.
+        """
+        self._add_pending()
+        return self._max
+
+    @property
+    def min(self):
+        """
+        *Property.* Return the shortest recorded duration in nanoseconds, or
+        None if the timer was never exited.
+        """
+        self._add_pending()
+        return None if self._min == _NO_MIN else self._min
+
+    @property
+    def running(self):
+        """
+        *Property.* Return True if the timer has been entered and not exited
+        in the current thread or task.
+        """
+        node = self._task_starts.get()
+        if node is not None and node[3] == get_ident():
+            return True
+        return bool(self._thread_starts.stack)
+
+    @property
+    def total(self):
+        """
+        *Property.* Return the sum of the recorded durations in nanoseconds.
+        """
+        self._add_pending()
+        return self._total
+
+    def _add_pending(self):
+        """
+        Add the buffered durations to the stats.
+        """
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+
+        pending.sort()
+        self._count += len(pending)
+        self._total += sum(pending)
+        self._min = min(self._min, pending[0])
+        self._max = max(self._max, pending[-1])
+
+        # Durations are mostly close to each other, so counting the sorted
+        # durations of each bucket with a binary search is much faster than
+        # adding them one at a time.
+        # Histogram.bucket_index() and Histogram._upper_bound() are inlined.
+        buckets = self._histogram.buckets
+        position = 0
+        size = len(pending)
+        while position < size:
+            value = pending[position]
+            bits = value.bit_length()
+            if bits > _SUB_BITS:
+                shift = bits - _SUB_BITS - 1
+                top = value >> shift
+                index = (bits << _SUB_BITS) | (top & _SUB_MASK)
+                upper = ((top + 1) << shift) - 1
+            else:
+                index = upper = value
+            end = bisect.bisect_right(pending, upper, position)
+            buckets[index] += end - position
+            position = end
+
+
+class _ThreadStack(threading.local):
+    """
+    Thread-local stack, initialized empty in every thread.
+    """
+
+    def __init__(self):
+        self.stack = []
+
+
+class TimerRegistry(object):
+    """
+    Collection of :class:`PhaseTimer` objects keyed by name, in the order they
+    were created.
+    """
+
+    def __init__(self):
+        self._timers = collections.OrderedDict()
+
+    def __iter__(self):
+        return iter(list(self._timers.values()))
+
+    def __len__(self):
+        return len(self._timers)
+
+    def get(self, name, cpu=False):
+        """
+        * *name* (str): Name of the phase.
+        * *cpu* (bool): Whether a newly created timer records CPU time.
+
+        Return the timer for a phase, creating it if it doesn't exist.
+
+        *Returns:* A :class:`PhaseTimer` instance.
+        """
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers.setdefault(name, PhaseTimer(name, cpu))
+        return timer
+
+    def table_lines(self):
+        """
+        Format the timer stats as a table with one line per phase. Times are in
+        seconds.
+
+        *Returns:* A list of formatted lines, starting with a header line.
+        """
+        if not self._timers:
+            return []
+
+        width = max(5, max(len(name) for name in self._timers))
+        header = "%-*s %10s %12s %12s %12s %12s %12s %12s" \
+            % (width, "phase", "count", "total", "cpu", "min", "max", "p50",
+               "p95")
+        lines = [header]
+        for timer in self:
+            cpu = "%12.6f" % (timer.cpu_total / 1e9) if timer.cpu \
+                else "%12s" % "-"
+            lines.append("%-*s %10d %12.6f %s %12.6f %12.6f %12.6f %12.6f"
+                         % (width, timer.name, timer.count, timer.total / 1e9,
+                            cpu, (timer.min or 0) / 1e9, timer.max / 1e9,
+                            (timer.histogram.percentile(50) or 0) / 1e9,
+                            (timer.histogram.percentile(95) or 0) / 1e9))
+        return lines
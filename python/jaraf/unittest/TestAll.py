@@ -20,13 +20,43 @@ sys.path.insert(0, _path[:_path.find("/jaraf/")])
 import unittest
 
 from TestApp import Test as TestApp
+from TestAtomic import Test as TestAtomic
+from TestCheckpoint import Test as TestCheckpoint
 from TestErrors import Test as TestErrors
+from TestEventLoop import Test as TestEventLoop
+from TestForkServer import Test as TestForkServer
+from TestLock import Test as TestLock
+from TestManifest import Test as TestManifest
+from TestMetrics import Test as TestMetrics
+from TestParallel import Test as TestParallel
+from TestProgress import Test as TestProgress
+from TestReader import Test as TestReader
+from TestSampler import Test as TestSampler
+from TestSchedule import Test as TestSchedule
+from TestSharding import Test as TestSharding
+from TestTimers import Test as TestTimers
+from TestWatchdog import Test as TestWatchdog
 
 
 # Initialize a test suite and add all of the TestCases.
 TestHandlerSuite = unittest.TestSuite()
 TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestApp))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAtomic))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCheckpoint))
 TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestErrors))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestEventLoop))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestForkServer))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestLock))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestManifest))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMetrics))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestParallel))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestProgress))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestReader))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestSampler))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestSchedule))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestSharding))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestTimers))
+TestHandlerSuite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestWatchdog))
 
 
 if __name__ == "__main__":
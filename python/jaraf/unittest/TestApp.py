@@ -2,11 +2,22 @@
 Unit tests for the App class.
 """
 
+import asyncio
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import pstats
+import shutil
+import signal
+import subprocess
 import sys
+import tempfile
 import time
+import tracemalloc
 import unittest
+import unittest.mock
 
 ##
 # BOOTSTRAP: BEGIN
@@ -21,8 +32,15 @@ sys.path.insert(0, _path[:_path.find("/jaraf")])
 ##
 
 from jaraf import App
-from jaraf.codes import AppStatusOkay, AppStatusError
-from jaraf.errors import AppArgumentError
+from jaraf.codes import (AppStatusArgumentError,
+                         AppStatusError,
+                         AppStatusInitializationError,
+                         AppStatusInterrupted,
+                         AppStatusLocked,
+                         AppStatusOkay,
+                         AppStatusStalled)
+from jaraf.errors import AppArgumentError, AppInterruptedError
+from jaraf.lock import InstanceLock
 
 
 class TestApp(App):
@@ -81,6 +99,111 @@ class Test(unittest.TestCase):
         app.run()
         self.assertTrue(app.add_arguments_called)
 
+    def test_async_main1(self):
+        """
+        Verify that a coroutine main() is run on an event loop and that its
+        exceptions are handled like those of a regular main().
+        """
+        async def main():
+            await asyncio.sleep(0)
+            app.main_called = True
+
+        app = TestApp(silent=True)
+        app.main = main
+        self.assertEqual(app.run(), AppStatusOkay)
+        self.assertTrue(app.main_called)
+        self.assertTrue(app._loop is None)
+
+        async def main_error():
+            await asyncio.sleep(0)
+            raise RuntimeError
+
+        app = TestApp(silent=True)
+        app.main = main_error
+        self.assertEqual(app.run(), AppStatusError)
+
+        async def main_app_error():
+            raise AppArgumentError
+
+        app = TestApp(silent=True)
+        app.main = main_app_error
+        self.assertEqual(app.run(), AppStatusOkay)
+
+        async def main_cancelled():
+            asyncio.current_task().cancel()
+            await asyncio.sleep(0)
+
+        app = TestApp(silent=True)
+        app.main = main_cancelled
+        self.assertEqual(app.run(), AppStatusError)
+
+    def test_async_main2(self):
+        """
+        Verify that pending tasks are cancelled, and that the loop policy and
+        loop lag options are used.
+        """
+        cancelled = []
+
+        async def wait():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def main():
+            asyncio.ensure_future(wait())
+            await asyncio.sleep(0.05)
+
+        app = TestApp(silent=True)
+        app.main = main
+        app.run(args=["--loop-policy", "asyncio:DefaultEventLoopPolicy",
+                      "--loop-lag-interval", "0.01"])
+
+        self.assertEqual(cancelled, [True])
+        self.assertTrue(app._loop_lag_monitor.count >= 1)
+
+    def test_checkpoint(self):
+        """
+        Verify that a failed run keeps its checkpoint, a resumed run skips the
+        completed units, and a successful run removes the checkpoint.
+        """
+        test_dir = tempfile.mkdtemp()
+        path = os.path.join(test_dir, "test.sqlite")
+        processed = []
+
+        def main(fail_at=None):
+            for item in app.checkpoint.skip_done(range(5)):
+                if item == fail_at:
+                    raise RuntimeError
+                processed.append(item)
+
+        try:
+            app = TestApp(silent=True, checkpoint=path)
+            app.main = lambda: main(fail_at=3)
+            self.assertEqual(app.run(), AppStatusError)
+            self.assertTrue(os.path.exists(path))
+
+            app = TestApp(silent=True, checkpoint=path)
+            app.main = main
+            self.assertEqual(app.run(args=["--resume"]), AppStatusOkay)
+            self.assertEqual(processed, [0, 1, 2, 3, 4])
+            self.assertEqual(app.checkpoint.resumed, 3)
+            self.assertFalse(os.path.exists(path))
+
+            # Without --resume, an existing checkpoint is discarded.
+            app = TestApp(silent=True, checkpoint=path)
+            app.main = lambda: main(fail_at=1)
+            app.run()
+            app = TestApp(silent=True, checkpoint=path)
+            app.main = main
+            app.run()
+            self.assertEqual(app.checkpoint.resumed, 0)
+            self.assertEqual(processed, [0, 1, 2, 3, 4, 0, 0, 1, 2, 3, 4])
+
+        finally:
+            shutil.rmtree(test_dir)
+
     def test_execute1(self):
         """
         Verify the base App class execute() method raises a NotImplementedError.
@@ -133,6 +256,205 @@ class Test(unittest.TestCase):
         self.assertTrue(app._silent)
         self.assertTrue(app._log_level, logging.DEBUG)
 
+    def test_init3(self):
+        """
+        Verify that importing the package doesn't import the optional
+        subsystems.
+        """
+        script = ("import sys; sys.path.insert(0, %r)\n"
+                  "import jaraf\n"
+                  "print(sorted(name for name in ('asyncio', 'jaraf.metrics', "
+                  "'jaraf.parallel', 'jaraf.profiling', 'jaraf.sampler', "
+                  "'jaraf.schedule', 'jaraf.forkserver', 'sqlite3') "
+                  "if name in sys.modules))\n"
+                  % _path[:_path.find("/jaraf/")])
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.strip(), b"[]")
+
+    def test_instance_lock(self):
+        """
+        Verify that a run is skipped or times out while another instance holds
+        the lock, and that the lock is released at exit.
+        """
+        test_dir = tempfile.mkdtemp()
+
+        try:
+            app = TestApp(silent=True, lock_dir=test_dir)
+            holder = InstanceLock(os.path.join(test_dir, "testapp.lock"))
+            holder.acquire()
+
+            status = app.run(args=["--instance-lock", "skip"])
+            self.assertEqual(status, AppStatusLocked)
+            self.assertFalse(app.main_called)
+
+            app = TestApp(silent=True, lock_dir=test_dir)
+            status = app.run(args=["--instance-lock", "wait",
+                                   "--lock-timeout", "0.1"])
+            self.assertEqual(status, AppStatusLocked)
+            self.assertTrue(app._lock.wait_time >= 0.1)
+
+            # Runs with different arguments use different locks.
+            app = TestApp(silent=True, lock_dir=test_dir, lock_by_args=True)
+            status = app.run(args=["--instance-lock", "skip"])
+            self.assertEqual(status, AppStatusOkay)
+
+            holder.release()
+            app = TestApp(silent=True, lock_dir=test_dir)
+            status = app.run(args=["--instance-lock", "skip"])
+            self.assertEqual(status, AppStatusOkay)
+            self.assertTrue(app.main_called)
+            self.assertFalse(app._lock.locked)
+
+            # A lock file that can't be opened is a clean startup error.
+            os.remove(os.path.join(test_dir, "testapp.lock"))
+            os.symlink(os.path.join(test_dir, "target"),
+                       os.path.join(test_dir, "testapp.lock"))
+            app = TestApp(silent=True, lock_dir=test_dir)
+            status = app.run(args=["--instance-lock", "skip"])
+            self.assertEqual(status, AppStatusInitializationError)
+            self.assertFalse(app.main_called)
+            self.assertFalse(os.path.exists(os.path.join(test_dir, "target")))
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_manifest(self):
+        """
+        Verify that a manifest given with --manifest is read lazily and used
+        as the default input of shard().
+        """
+        test_dir = tempfile.mkdtemp()
+        path = os.path.join(test_dir, "manifest.txt")
+        with open(path, "w") as fh:
+            fh.write("\0".join("item-%d" % i for i in range(100)))
+
+        def main():
+            app.count = app.manifest.count()
+            app.selected = list(app.shard())
+
+        try:
+            app = TestApp(silent=True)
+            app.main = main
+            status = app.run(args=["--manifest", path, "--shard-index", "1",
+                                   "--shard-count", "2", "--shard-method",
+                                   "range", "extra"])
+            self.assertEqual(status, AppStatusOkay)
+            self.assertEqual(app.count, 100)
+            self.assertEqual(app.selected,
+                             ["item-%d" % i for i in range(50, 100)])
+            self.assertEqual(app.manifest.items_read, 100)
+
+            app = TestApp(silent=True)
+            app.run(args=[])
+            self.assertIsNone(app.manifest)
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_map(self):
+        """
+        Verify that map() yields the results of the items that succeed, sets
+        an error status for the items that fail and records the stats.
+        """
+        app = TestApp(silent=True)
+        results = []
+
+        def invert(value):
+            return 1.0 / value
+
+        app.main = lambda: results.extend(app.map(invert, [1, 0, 2],
+                                                  workers=2))
+        app.run()
+
+        self.assertEqual(results, [1.0, 0.5])
+        self.assertEqual(app.status, AppStatusError)
+        self.assertEqual(app._map_stats["invert"].items, 3)
+        self.assertEqual(app._map_stats["invert"].failures, 1)
+
+    def test_map_chunks(self):
+        """
+        Verify that map_chunks() scans a file and records an error status for
+        the chunks that fail.
+        """
+        test_dir = tempfile.mkdtemp()
+        path = os.path.join(test_dir, "data.txt")
+        with open(path, "w") as fh:
+            fh.write("".join("%d\n" % i for i in range(100)) + "x\n")
+
+        def total(lines):
+            return sum(int(line) for line in lines)
+
+        app = TestApp(silent=True)
+        results = []
+        app.main = lambda: results.extend(app.map_chunks(
+            path, total, backend="thread", chunk_size=50))
+
+        try:
+            app.run([])
+        finally:
+            shutil.rmtree(test_dir)
+
+        self.assertTrue(sum(results) < 4950)
+        self.assertEqual(app.status, AppStatusError)
+        self.assertEqual(app._map_stats["total chunks"].failures, 1)
+
+    def test_metrics(self):
+        """
+        Verify that app metrics and the built-in run metrics are exported to
+        a Prometheus textfile.
+        """
+        test_dir = tempfile.mkdtemp()
+        test_file = os.path.join(test_dir, "testapp.prom")
+
+        try:
+            app = TestApp(silent=True)
+            app.main = lambda: app.counter("records_total").inc(5)
+            app.run(args=["--metrics-textfile", test_file])
+
+            with open(test_file) as fh:
+                text = fh.read()
+
+            self.assertTrue('records_total{app="testapp"} 5' in text)
+            self.assertTrue('jaraf_exit_status{app="testapp"} 0' in text)
+            self.assertTrue("jaraf_max_rss_bytes" in text)
+            self.assertEqual(app.metrics.gauge("jaraf_exit_status").value, 0)
+
+            # Resource usage gauges are live during the run.
+            values = {}
+
+            def main():
+                for name in ("jaraf_cpu_seconds", "jaraf_max_rss_bytes"):
+                    values[name] = app.metrics.gauge(name).value
+
+            app = TestApp(silent=True)
+            app.main = main
+            app.run(args=["--metrics-textfile", test_file])
+            self.assertTrue(values["jaraf_cpu_seconds"] > 0)
+            self.assertTrue(values["jaraf_max_rss_bytes"] > 0)
+
+        finally:
+            shutil.rmtree(test_dir)
+
+        # Without exporters or a run report, metrics aren't set up unless the
+        # application uses them.
+        script = ("import sys; sys.path.insert(0, %r)\n"
+                  "import jaraf\n"
+                  "class NoMetricsApp(jaraf.App):\n"
+                  "    def main(self):\n"
+                  "        pass\n"
+                  "NoMetricsApp(silent=True).run(args=[])\n"
+                  "print(sorted(name for name in ('jaraf.atomic', "
+                  "'jaraf.metrics', 'socket') if name in sys.modules))\n"
+                  % _path[:_path.find("/jaraf/")])
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.strip(), b"[]")
+
+        app = TestApp(silent=True)
+        app.main = lambda: app.counter("records_total").inc()
+        app.run(args=[])
+        self.assertEqual(app.metrics.gauge("jaraf_exit_status").value, 0)
+        self.assertTrue(app.metrics.gauge("jaraf_end_time_seconds").value > 0)
+
     def test_name_to_log_level1(self):
         """
         Verify the name_to_log_level() function correctly maps log level names
@@ -158,6 +480,43 @@ class Test(unittest.TestCase):
         self.assertEqual(app.name_to_log_level("TEST", logging.DEBUG),
                          logging.DEBUG)
 
+    def test_open_output(self):
+        """
+        Verify that output files are committed on success, removed on failure
+        and recorded in the run stats.
+        """
+        test_dir = tempfile.mkdtemp()
+        path = os.path.join(test_dir, "out.csv.gz")
+
+        def main():
+            with app.open_output(path, "w") as fh:
+                fh.write("a,b\n" * 1000)
+            with app.open_output(path + ".empty"):
+                pass
+            with app.open_output(path + ".partial") as fh:
+                fh.write(b"partial")
+                raise RuntimeError
+
+        try:
+            app = TestApp(silent=True)
+            app.main = main
+            app.run([])
+            self.assertEqual(app.status, AppStatusError)
+            self.assertEqual(sorted(os.listdir(test_dir)),
+                             ["out.csv.gz", "out.csv.gz.empty"])
+            with gzip.open(path, "rt") as fh:
+                self.assertEqual(fh.read(), "a,b\n" * 1000)
+
+            # The empty output was committed as well.
+            stats = app._run_stats
+            self.assertEqual(stats["output_files"], 2)
+            self.assertEqual(stats["output_bytes"], 4000)
+            self.assertEqual(stats["output_stored_bytes"],
+                             os.path.getsize(path))
+
+        finally:
+            shutil.rmtree(test_dir)
+
     def test_process_arguments1(self):
         """
         Verify the base App class process_arguments() method exists and is a
@@ -195,6 +554,453 @@ class Test(unittest.TestCase):
         self.assertEqual(app.test_arg, "foobar")
         self.assertTrue(app.test_flag)
 
+    def test_profile1(self):
+        """
+        Verify that main() is profiled and the stats are written to the
+        specified path.
+        """
+        test_dir = tempfile.mkdtemp()
+        test_file = os.path.join(test_dir, "testapp.pstats")
+
+        try:
+            app = TestApp(silent=True)
+            app.run(args=["--profile", test_file, "--profile-top", "3"])
+
+            self.assertTrue(os.path.exists(test_file))
+            stats = pstats.Stats(test_file)
+            self.assertTrue(stats.total_calls > 0)
+
+            # A header line plus at most 3 functions.
+            lines = app._profiler.top_lines()
+            self.assertTrue(1 < len(lines) <= 4)
+            self.assertTrue("cumtime" in lines[0])
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_profile2(self):
+        """
+        Verify that the profile is written to the default path and that
+        restrictions limit the listed functions.
+        """
+        test_dir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+
+        try:
+            os.chdir(test_dir)
+            app = TestApp(silent=True, profile=True)
+            app.run(args=["--profile-restrict", "main"])
+
+            self.assertTrue(os.path.exists(
+                os.path.join(test_dir, "testapp.pstats")))
+            for line in app._profiler.top_lines()[1:]:
+                self.assertTrue("main" in line)
+
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(test_dir)
+
+    def test_progress(self):
+        """
+        Verify that progress() logs progress lines and a footer summary.
+        """
+        app = TestApp(log_level="INFO")
+        handler = logging.handlers.BufferingHandler(10000)
+        app.log.addHandler(handler)
+
+        def main():
+            for _ in app.progress(range(20), every_secs=0.02, name="records"):
+                time.sleep(0.005)
+
+        app.main = main
+        try:
+            with unittest.mock.patch("sys.stdout"):
+                self.assertEqual(app.run([]), AppStatusOkay)
+        finally:
+            app.log.removeHandler(handler)
+
+        messages = [record.getMessage() for record in handler.buffer]
+        self.assertTrue(any(message.startswith("Progress: ") and
+                            "/20 records (" in message and "ETA" in message
+                            for message in messages))
+        self.assertTrue(any(message.startswith("- progress records: 20 items")
+                            for message in messages))
+
+    def test_run_report1(self):
+        """
+        Verify that the run report contains the run stats and custom metrics.
+        """
+        test_dir = tempfile.mkdtemp()
+        test_file = os.path.join(test_dir, "report.json")
+
+        try:
+            app = TestApp(silent=True)
+            app.main = lambda: app.set_run_metric("records", 42)
+            app.run(args=["--run-report", test_file, "--test-flag"])
+
+            with open(test_file) as fh:
+                report = json.load(fh)
+
+            self.assertEqual(report["app"], "testapp")
+            self.assertEqual(report["argv"], ["--run-report", test_file,
+                                              "--test-flag"])
+            self.assertEqual(report["exit_status"], AppStatusOkay)
+            self.assertEqual(report["metrics"]["records"], 42)
+            self.assertTrue("jaraf_elapsed_seconds" in report["metrics"])
+            self.assertTrue(report["end_time"] >= report["start_time"])
+            self.assertTrue("ru_maxrss" in report["rusage_self"])
+            self.assertTrue("ru_utime" in report["rusage_children"])
+            self.assertEqual(os.listdir(test_dir), ["report.json"])
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_run_report2(self):
+        """
+        Verify that the run report records a failed run.
+        """
+        test_dir = tempfile.mkdtemp()
+        test_file = os.path.join(test_dir, "report.json")
+
+        try:
+            app = TestApp(silent=True, run_report=test_file)
+            app.main = app.main_error
+            app.run(args=[])
+
+            with open(test_file) as fh:
+                report = json.load(fh)
+            self.assertEqual(report["exit_status"], AppStatusError)
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_sample_resources(self):
+        """
+        Verify that resource sampling writes to the requested path while main()
+        runs.
+        """
+        test_dir = tempfile.mkdtemp()
+        test_file = os.path.join(test_dir, "samples.csv")
+
+        try:
+            app = TestApp(silent=True)
+            app.run(args=["--sample-resources", test_file,
+                          "--sample-interval", "0.01"])
+
+            self.assertEqual(app._sampler.path, test_file)
+            self.assertTrue(app._sampler.count >= 2)
+            self.assertTrue(os.path.exists(test_file))
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_service1(self):
+        """
+        Verify that service mode runs main() up to the maximum number of
+        iterations and that a failing iteration doesn't stop the service.
+        """
+        app = TestApp(silent=True)
+        statuses = []
+
+        def main():
+            statuses.append(app.service_iteration)
+            if app.service_iteration == 2:
+                raise RuntimeError
+
+        app.main = main
+        status = app.run(args=["--service-interval", "0.01",
+                               "--service-max-iterations", "3"])
+
+        self.assertEqual(statuses, [1, 2, 3])
+        self.assertEqual(status, AppStatusOkay)
+        self.assertEqual(app._service_failures, 1)
+        self.assertEqual(app.timer("service iteration").count, 3)
+
+    def test_service2(self):
+        """
+        Verify that request_shutdown() and SIGTERM stop the service after the
+        current iteration, and that an invalid schedule is an argument error.
+        """
+        app = TestApp(silent=True)
+        app.main = app.request_shutdown
+        app.run(args=["--service-interval", "0.01"])
+        self.assertEqual(app.service_iteration, 1)
+
+        app = TestApp(silent=True)
+        app.main = lambda: os.kill(os.getpid(), signal.SIGTERM)
+        app.run(args=["--service-interval", "0.01"])
+        self.assertEqual(app.service_iteration, 1)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+        app = TestApp(silent=True)
+        status = app.run(args=["--service-schedule", "* * *"])
+        self.assertEqual(status, AppStatusArgumentError)
+        self.assertFalse(app.main_called)
+
+    def test_service3(self):
+        """
+        Verify that an interruption stops the service instead of only failing
+        the current iteration.
+        """
+        app = TestApp(silent=True)
+
+        def main():
+            os.kill(os.getpid(), signal.SIGTERM)
+            os.kill(os.getpid(), signal.SIGTERM)
+            time.sleep(5)
+            app.main_called = True
+
+        app.main = main
+        status = app.run(args=["--service-interval", "0.01"])
+        self.assertEqual(status, AppStatusInterrupted)
+        self.assertEqual(app.service_iteration, 1)
+        self.assertFalse(app.main_called)
+
+        app = TestApp(silent=True)
+
+        def main():
+            app._status = AppStatusInterrupted
+            raise AppInterruptedError
+
+        app.main = main
+        status = app.run(args=["--service-interval", "0.01",
+                               "--service-max-iterations", "3"])
+        self.assertEqual(status, AppStatusInterrupted)
+        self.assertEqual(app.service_iteration, 1)
+        self.assertEqual(app._service_failures, 1)
+
+    def test_shard(self):
+        """
+        Verify that the shards of the extra arguments and of a manifest are
+        complete and disjoint, and that invalid shard options are argument
+        errors.
+        """
+        items = ["item-%d" % i for i in range(50)]
+        test_dir = tempfile.mkdtemp()
+        manifest = os.path.join(test_dir, "manifest.txt")
+        with open(manifest, "w") as fh:
+            fh.write("\n".join(items) + "\n\n")
+
+        def main():
+            app.selected = list(app.shard())
+            app.selected_manifest = list(app.shard(manifest=manifest))
+
+        try:
+            for method in ("hash", "range"):
+                selected = []
+                for index in range(3):
+                    app = TestApp(silent=True)
+                    app.main = main
+                    status = app.run(args=["--shard-index", str(index),
+                                           "--shard-count", "3",
+                                           "--shard-method", method] + items)
+                    self.assertEqual(status, AppStatusOkay)
+                    self.assertEqual(app.selected, app.selected_manifest)
+                    selected.extend(app.selected)
+                self.assertEqual(sorted(selected), sorted(items))
+
+            app = TestApp(silent=True)
+            app.main = main
+            app.run(args=items)
+            self.assertEqual(app.selected, items)
+            self.assertEqual(app._shard_items, 100)
+
+        finally:
+            shutil.rmtree(test_dir)
+
+        for args in (["--shard-index", "3", "--shard-count", "3"],
+                     ["--shard-index", "0", "--shard-count", "0"],
+                     ["--shard-index", "0"],
+                     ["--shard-index", "0", "--shard-count", "2",
+                      "--shard-method", "range", "--manifest", "-"]):
+            app = TestApp(silent=True)
+            self.assertEqual(app.run(args=args), AppStatusArgumentError)
+            self.assertFalse(app.main_called)
+
+    def test_signals1(self):
+        """
+        Verify that the first SIGTERM or SIGINT requests a shutdown that main()
+        can poll, and that the handlers are restored.
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(signum)
+            app = TestApp(silent=True)
+
+            def main():
+                os.kill(os.getpid(), signum)
+                while not app.shutdown_requested:
+                    time.sleep(0.01)
+
+            app.main = main
+            self.assertEqual(app.run(), AppStatusOkay)
+            self.assertTrue(app.shutdown_event.is_set())
+            self.assertEqual(app._shutdown_signal, signum)
+            self.assertEqual(signal.getsignal(signum), previous)
+
+    def test_signals2(self):
+        """
+        Verify that a second SIGTERM interrupts the application.
+        """
+        app = TestApp(silent=True)
+
+        def main():
+            os.kill(os.getpid(), signal.SIGTERM)
+            os.kill(os.getpid(), signal.SIGTERM)
+            time.sleep(5)
+            app.main_called = True
+
+        app.main = main
+        self.assertEqual(app.run(), AppStatusInterrupted)
+        self.assertFalse(app.main_called)
+
+    def test_signals3(self):
+        """
+        Verify that SIGUSR1 logs diagnostics without stopping the application.
+        """
+        app = TestApp(log_level="INFO")
+        handler = logging.handlers.BufferingHandler(10000)
+        app.log.addHandler(handler)
+
+        def main():
+            with app.timer("work"):
+                os.kill(os.getpid(), signal.SIGUSR1)
+                for i in range(100):
+                    if any(record.getMessage().startswith("- thread")
+                           for record in handler.buffer):
+                        break
+                    time.sleep(0.01)
+            app.main_called = True
+
+        app.main = main
+        try:
+            with unittest.mock.patch("sys.stdout"):
+                self.assertEqual(app.run(), AppStatusOkay)
+        finally:
+            app.log.removeHandler(handler)
+
+        messages = [record.getMessage() for record in handler.buffer]
+        self.assertTrue(app.main_called)
+        self.assertTrue("DIAGNOSTICS (SIGUSR1)" in messages)
+        self.assertTrue(any("work" in message for message in messages))
+        self.assertTrue(any("main()" in message or "in main" in message
+                            for message in messages))
+
+        # Signal handlers can be disabled.
+        app = TestApp(silent=True, signal_handlers=False)
+        app.main = lambda: self.assertEqual(signal.getsignal(signal.SIGUSR1),
+                                            signal.SIG_DFL)
+        app.run()
+
+    def test_timer(self):
+        """
+        Verify that timer() returns the same named timer across calls.
+        """
+        app = TestApp(silent=True)
+
+        def main():
+            for i in range(3):
+                with app.timer("loop", cpu=False):
+                    pass
+
+        app.main = main
+        app.run()
+
+        timer = app.timer("loop")
+        self.assertEqual(timer.count, 3)
+        self.assertFalse(timer.cpu)
+
+    def test_watchdog1(self):
+        """
+        Verify that a stall is detected and diagnosed, and that heartbeats
+        prevent it.
+        """
+        app = TestApp(silent=True)
+        diagnostics = []
+        app._log_diagnostics = diagnostics.append
+
+        def main():
+            for i in range(20):
+                app.heartbeat()
+                time.sleep(0.01)
+            time.sleep(0.5)
+
+        app.main = main
+        self.assertEqual(app.run(args=["--watchdog", "0.2"]), AppStatusOkay)
+        self.assertEqual(app._watchdog.stalls, 1)
+        self.assertEqual(diagnostics, ["stalled"])
+
+    def test_watchdog2(self):
+        """
+        Verify that a stalled application aborts with the stalled status.
+        """
+        script = ("import sys, time; sys.path.insert(0, %r)\n"
+                  "from jaraf import App\n"
+                  "class StallApp(App):\n"
+                  "    def main(self):\n"
+                  "        time.sleep(10)\n"
+                  "sys.exit(StallApp(silent=True).run())\n"
+                  % _path[:_path.find("/jaraf/")])
+        start_time = time.time()
+        status = subprocess.call([sys.executable, "-c", script,
+                                  "--watchdog", "0.2", "--watchdog-abort"])
+        self.assertEqual(status, AppStatusStalled)
+        self.assertTrue(time.time() - start_time < 5)
+
+    def test_trace_memory1(self):
+        """
+        Verify that memory tracing takes the start, custom and finish snapshots
+        and reports the allocation sites.
+        """
+        app = TestApp(silent=True)
+        app.main = lambda: (app.memory_snapshot("middle"),
+                            setattr(app, "blob", [bytearray(1024)
+                                                  for i in range(1000)]))
+        app.run(args=["--trace-memory"])
+
+        tracer = app._memory_tracer
+        self.assertEqual([label for (label, total) in tracer.totals],
+                         ["start", "middle", "finish"])
+        self.assertTrue(tracer.totals[-1][1] - tracer.totals[0][1] >= 1024000)
+        self.assertTrue(tracer.top_lines())
+        self.assertTrue(tracer.growth_lines())
+
+    def test_trace_memory2(self):
+        """
+        Verify that snapshots are dumped to the requested directory and that
+        memory_snapshot() is a no-op without tracing.
+        """
+        test_dir = tempfile.mkdtemp()
+
+        try:
+            app = TestApp(silent=True)
+            app.memory_snapshot("ignored")
+            app.run(args=["--trace-memory", "--trace-memory-dump", test_dir])
+
+            self.assertEqual(sorted(os.listdir(test_dir)),
+                             ["testapp-0000-start.snapshot",
+                              "testapp-0001-finish.snapshot"])
+
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_trace_memory3(self):
+        """
+        Verify that memory tracing started outside of the application is left
+        running.
+        """
+        tracemalloc.start()
+        try:
+            app = TestApp(silent=True)
+            app.run(args=["--trace-memory"])
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertEqual(len(app._memory_tracer.totals), 2)
+        finally:
+            tracemalloc.stop()
+
+        app = TestApp(silent=True)
+        app.run(args=["--trace-memory"])
+        self.assertFalse(tracemalloc.is_tracing())
+
     def test_run1(self):
         """
         Verify that AppError exceptions are handled correctly.
@@ -0,0 +1,142 @@
+"""
+Unit tests for the atomic file helpers.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.atomic import AtomicWriter, atomic_write
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_atomic_writer1(self):
+        """
+        Verify that compressed output is written in each format and that the
+        byte counts are recorded.
+        """
+        data = "".join("line %d\n" % i for i in range(10000))
+        for (name, module) in (("out.gz", gzip), ("out.bz2", bz2),
+                               ("out.xz", lzma)):
+            path = os.path.join(self.test_dir, name)
+            writer = AtomicWriter(path, "w", compression="auto",
+                                  buffer_size=1024)
+            with writer as fh:
+                for line in data.splitlines(True):
+                    fh.write(line)
+                self.assertFalse(os.path.exists(path))
+
+            with module.open(path, "rt") as fh:
+                self.assertEqual(fh.read(), data)
+            self.assertEqual(writer.bytes_written, len(data))
+            self.assertEqual(writer.bytes_stored, os.path.getsize(path))
+            self.assertTrue(writer.bytes_stored < writer.bytes_written)
+
+        path = os.path.join(self.test_dir, "out.bin")
+        committed = []
+        writer = AtomicWriter(path, compression="auto", fsync=False,
+                              on_commit=committed.append)
+        with writer as fh:
+            fh.write(b"data")
+        self.assertEqual((writer.bytes_written, writer.bytes_stored), (4, 4))
+        self.assertTrue(writer.committed)
+        self.assertEqual(committed, [writer])
+
+        self.assertRaises(ValueError, AtomicWriter, path, compression="zip")
+        self.assertRaises(ValueError, AtomicWriter, path, mode="a")
+
+    def test_atomic_writer2(self):
+        """
+        Verify that an exception leaves the destination untouched and removes
+        the temporary file.
+        """
+        path = os.path.join(self.test_dir, "test.txt.gz")
+        atomic_write(path, "foo")
+
+        committed = []
+        writer = AtomicWriter(path, "w", compression="gzip",
+                              on_commit=committed.append)
+        with self.assertRaises(RuntimeError):
+            with writer as fh:
+                fh.write("bar")
+                raise RuntimeError
+        self.assertFalse(writer.committed)
+        self.assertEqual(committed, [])
+
+        with open(path) as fh:
+            self.assertEqual(fh.read(), "foo")
+        self.assertEqual(os.listdir(self.test_dir), ["test.txt.gz"])
+
+    def test_atomic_write1(self):
+        """
+        Verify that text and bytes are written and existing files replaced.
+        """
+        path = os.path.join(self.test_dir, "test.txt")
+
+        atomic_write(path, "foo")
+        with open(path) as fh:
+            self.assertEqual(fh.read(), "foo")
+
+        atomic_write(path, b"bar", fsync=False)
+        with open(path, "rb") as fh:
+            self.assertEqual(fh.read(), b"bar")
+
+        self.assertEqual(os.listdir(self.test_dir), ["test.txt"])
+
+    def test_atomic_write2(self):
+        """
+        Verify that a failed write leaves the destination untouched and removes
+        the temporary file.
+        """
+        path = os.path.join(self.test_dir, "test.txt")
+        atomic_write(path, "foo")
+
+        self.assertRaises(TypeError, atomic_write, path, 42)
+
+        with open(path) as fh:
+            self.assertEqual(fh.read(), "foo")
+        self.assertEqual(os.listdir(self.test_dir), ["test.txt"])
+
+    def test_atomic_write3(self):
+        """
+        Verify that the file permissions follow the umask without the writer
+        changing it.
+        """
+        path = os.path.join(self.test_dir, "test.txt")
+        umask = os.umask(0o027)
+        try:
+            with unittest.mock.patch("os.umask") as mock_umask:
+                atomic_write(path, "foo")
+            mock_umask.assert_not_called()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+
+if __name__ == "__main__":
+    unittest.main()
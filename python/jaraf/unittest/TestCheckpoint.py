@@ -0,0 +1,97 @@
+"""
+Unit tests for the checkpoint store.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.checkpoint import CheckpointStore
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "test.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_mark_done(self):
+        """
+        Verify that completed units are batched, committed and reloaded.
+        """
+        store = CheckpointStore(self.path, batch_size=2, flush_secs=60)
+        store.mark_done("a")
+        store.mark_done(1)
+        store.mark_done("c")
+        self.assertTrue(store.is_done("a"))
+        self.assertTrue(store.is_done(1))
+        self.assertEqual(len(store), 3)
+
+        # Only full batches are committed until the store is flushed.
+        self.assertEqual(CheckpointStore(self.path).resumed, 2)
+        store.close()
+
+        store = CheckpointStore(self.path)
+        self.assertEqual(store.resumed, 3)
+        self.assertTrue(store.is_done("c"))
+        self.assertFalse(store.is_done("d"))
+        store.remove()
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_skip_done(self):
+        """
+        Verify that done items are skipped and that an item is only marked
+        once it has been processed.
+        """
+        store = CheckpointStore(self.path)
+        store.mark_done(2)
+
+        processed = []
+        try:
+            for item in store.skip_done(range(5)):
+                if item == 3:
+                    raise RuntimeError
+                processed.append(item)
+        except RuntimeError:
+            pass
+
+        self.assertEqual(processed, [0, 1])
+        self.assertEqual(sorted(store._done), ["0", "1", "2"])
+        self.assertEqual(list(store.skip_done(range(5))), [3, 4])
+        store.close()
+
+    def test_state(self):
+        """
+        Verify that state values are saved with the buffered units.
+        """
+        store = CheckpointStore(self.path, flush_secs=60)
+        self.assertEqual(store.get_state("cursor", 0), 0)
+        store.mark_done("a")
+        store.set_state("cursor", {"offset": 10})
+
+        other = CheckpointStore(self.path)
+        self.assertEqual(other.get_state("cursor"), {"offset": 10})
+        self.assertTrue(other.is_done("a"))
+        other.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,10 +23,14 @@ sys.path.insert(0, _path[:_path.find("/jaraf")])
 from jaraf.codes import (AppStatusArgumentError,
                          AppStatusError,
                          AppStatusInitializationError,
+                         AppStatusInterrupted,
+                         AppStatusLocked,
                          AppStatusOkay)
 from jaraf.errors import (AppArgumentError,
                           AppError,
-                          AppInitializationError)
+                          AppInitializationError,
+                          AppInterruptedError,
+                          AppLockedError)
 
 
 class Test(unittest.TestCase):
@@ -101,6 +105,26 @@ class Test(unittest.TestCase):
         except AppInitializationError as err:
             self.assertEqual(err.status, 123)
 
+    def test_appinterruptederror(self):
+        """
+        Verify a plain AppInterruptedError exception.
+        """
+
+        try:
+            raise AppInterruptedError
+        except AppInterruptedError as err:
+            self.assertEqual(err.status, AppStatusInterrupted)
+
+    def test_applockederror(self):
+        """
+        Verify a plain AppLockedError exception.
+        """
+
+        try:
+            raise AppLockedError
+        except AppLockedError as err:
+            self.assertEqual(err.status, AppStatusLocked)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the event loop helpers.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.eventloop import (LoopLagMonitor,
+                             cancel_pending_tasks,
+                             load_loop_policy)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_cancel_pending_tasks(self):
+        """
+        Verify that pending tasks are cancelled and finished tasks ignored.
+        """
+        cancelled = []
+
+        async def wait():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        done = self.loop.create_task(asyncio.sleep(0))
+        self.loop.run_until_complete(done)
+        self.loop.create_task(wait())
+        self.loop.create_task(wait())
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(cancel_pending_tasks(self.loop), 2)
+        self.assertEqual(cancelled, [True, True])
+        self.assertEqual(cancel_pending_tasks(self.loop), 0)
+
+    def test_load_loop_policy(self):
+        """
+        Verify that policies are loaded from instances, classes and names.
+        """
+        policy = asyncio.DefaultEventLoopPolicy()
+        self.assertTrue(load_loop_policy(policy) is policy)
+        self.assertTrue(isinstance(
+            load_loop_policy(asyncio.DefaultEventLoopPolicy),
+            asyncio.DefaultEventLoopPolicy))
+        self.assertTrue(isinstance(
+            load_loop_policy("asyncio:DefaultEventLoopPolicy"),
+            asyncio.DefaultEventLoopPolicy))
+        self.assertRaises(ValueError, load_loop_policy, "asyncio")
+
+    def test_loop_lag_monitor(self):
+        """
+        Verify that blocking the loop is measured as lag.
+        """
+        monitor = LoopLagMonitor(0.01)
+
+        async def block():
+            await asyncio.sleep(0.02)
+            time.sleep(0.05)
+            await asyncio.sleep(0.02)
+
+        monitor.start(self.loop)
+        self.loop.run_until_complete(block())
+        monitor.stop(self.loop)
+
+        self.assertTrue(monitor.count >= 2)
+        self.assertTrue(monitor.max >= 0.03 * 1e9)
+        self.assertTrue(monitor.percentile(100) >= 0.03)
+        self.assertEqual(cancel_pending_tasks(self.loop), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
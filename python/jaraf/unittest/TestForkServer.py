@@ -0,0 +1,145 @@
+"""
+Unit tests for the fork server.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf import App
+from jaraf.codes import AppStatusError
+from jaraf.forkserver import ForkServer, client_main, run_client
+
+
+class TestApp(App):
+    """
+    Application that reports its arguments, environment and working
+    directory, and exits with the status given as its first argument.
+    """
+
+    def main(self):
+        sys.stdout.write("%s %s %s %d\n" % (" ".join(self._arg_extras),
+                                            os.environ.get("FORK_TEST"),
+                                            os.getcwd(), os.getpid()))
+        self._status = int(self._arg_extras[0])
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = os.path.realpath(tempfile.mkdtemp())
+        self.socket_path = os.path.join(self.test_dir, "test.sock")
+        self.server = ForkServer(lambda: TestApp(silent=True),
+                                 self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join()
+        shutil.rmtree(self.test_dir)
+
+    def _run(self, args):
+        """
+        Run the test app through the server, capturing its stdout.
+        """
+        (read_fd, write_fd) = os.pipe()
+        try:
+            status = run_client(self.socket_path, args,
+                                stdio=(0, write_fd, 2))
+        finally:
+            os.close(write_fd)
+        with os.fdopen(read_fd) as fh:
+            return (status, fh.read())
+
+    def test_run_client1(self):
+        """
+        Verify that the arguments, environment, working directory and stdio of
+        the client are used by a forked child, and the status is returned.
+        """
+        cwd = os.getcwd()
+        os.environ["FORK_TEST"] = "foo"
+        os.chdir(self.test_dir)
+        try:
+            (status, output) = self._run(["3", "bar"])
+        finally:
+            os.chdir(cwd)
+            del os.environ["FORK_TEST"]
+
+        (args, env, child_cwd, pid) = output.rsplit(" ", 3)
+        self.assertEqual(status, 3)
+        self.assertEqual(args, "3 bar")
+        self.assertEqual(env, "foo")
+        self.assertEqual(child_cwd, self.test_dir)
+        self.assertNotEqual(int(pid), os.getpid())
+
+    def test_run_client2(self):
+        """
+        Verify that each request runs in its own child and that failures are
+        reported as errors.
+        """
+        (status1, output1) = self._run(["0"])
+        (status2, output2) = self._run(["0"])
+        self.assertEqual((status1, status2), (0, 0))
+        self.assertNotEqual(output1.split()[-1], output2.split()[-1])
+
+        # A non-integer status makes main() raise, which App.run() handles.
+        (status, output) = self._run(["foo"])
+        self.assertEqual(status, AppStatusError)
+
+    def test_listen(self):
+        """
+        Verify that a second server can't listen on a socket in use, that a
+        stale socket file is replaced, and that the client reports connection
+        errors.
+        """
+        self.assertRaises(RuntimeError,
+                          ForkServer(TestApp, self.socket_path)._listen)
+
+        stale_path = os.path.join(self.test_dir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        self.assertEqual(client_main([stale_path]), AppStatusError)
+
+        server = ForkServer(TestApp, stale_path)
+        server._listen()
+        self.assertEqual(os.stat(stale_path).st_mode & 0o777, 0o600)
+        server._close()
+        self.assertFalse(os.path.exists(stale_path))
+
+    def test_client_imports(self):
+        """
+        Verify that the client module doesn't import the jaraf package.
+        """
+        script = ("import sys; sys.path.insert(0, %r)\n"
+                  "import jaraf_forkclient\n"
+                  "print(any(name.split('.')[0] == 'jaraf' "
+                  "for name in sys.modules))\n"
+                  % _path[:_path.find("/jaraf/")])
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.strip(), b"False")
+
+
+if __name__ == "__main__":
+    unittest.main()
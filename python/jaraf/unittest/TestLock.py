@@ -0,0 +1,140 @@
+"""
+Unit tests for the instance lock.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.lock import InstanceLock, default_lock_dir
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "test.lock")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_skip(self):
+        """
+        Verify that a held lock is skipped and reports its holder's pid, and
+        that it can be taken once released.
+        """
+        holder = InstanceLock(self.path)
+        self.assertTrue(holder.acquire())
+        self.assertTrue(holder.locked)
+        with open(self.path) as fh:
+            self.assertEqual(fh.read(), "%d\n" % os.getpid())
+
+        lock = InstanceLock(self.path)
+        self.assertFalse(lock.acquire("skip"))
+        self.assertFalse(lock.locked)
+        self.assertEqual(lock.holder_pid, os.getpid())
+
+        holder.release()
+        self.assertTrue(lock.acquire("skip"))
+        lock.release()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_symlink(self):
+        """
+        Verify that a symbolic link planted at the lock path is not followed,
+        so the file it points to is left untouched.
+        """
+        target = os.path.join(self.test_dir, "target")
+        with open(target, "w") as fh:
+            fh.write("keep")
+        os.symlink(target, self.path)
+
+        lock = InstanceLock(self.path)
+        self.assertRaises(OSError, lock.acquire)
+        self.assertFalse(lock.locked)
+        with open(target) as fh:
+            self.assertEqual(fh.read(), "keep")
+
+    def test_default_lock_dir(self):
+        """
+        Verify that the default lock directory is private to the user.
+        """
+        with unittest.mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": ""}), \
+                unittest.mock.patch("tempfile.gettempdir",
+                                    return_value=self.test_dir):
+            path = default_lock_dir()
+            self.assertEqual(os.path.dirname(path), self.test_dir)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+            self.assertEqual(default_lock_dir(), path)
+
+            os.chmod(path, 0o777)
+            self.assertRaises(PermissionError, default_lock_dir)
+
+        with unittest.mock.patch.dict(os.environ,
+                                      {"XDG_RUNTIME_DIR": self.test_dir}):
+            self.assertEqual(default_lock_dir(), self.test_dir)
+
+    def test_wait(self):
+        """
+        Verify that waiting times out, and that the wait time is recorded.
+        """
+        holder = InstanceLock(self.path)
+        holder.acquire()
+
+        lock = InstanceLock(self.path)
+        self.assertFalse(lock.acquire("wait", timeout=0.2))
+        self.assertTrue(lock.wait_time >= 0.2)
+
+        holder.release()
+        self.assertTrue(lock.acquire("wait", timeout=0.2))
+        lock.release()
+
+        self.assertRaises(ValueError, lock.acquire, "foo")
+
+    def test_kill(self):
+        """
+        Verify that the kill policy terminates a holder in another process.
+        """
+        script = ("import sys, time; sys.path.insert(0, %r)\n"
+                  "from jaraf.lock import InstanceLock\n"
+                  "InstanceLock(%r).acquire()\n"
+                  "print('locked', flush=True)\n"
+                  "time.sleep(60)\n"
+                  % (_path[:_path.find("/jaraf/")], self.path))
+        p = subprocess.Popen([sys.executable, "-c", script],
+                             stdout=subprocess.PIPE)
+        try:
+            self.assertEqual(p.stdout.readline().strip(), b"locked")
+
+            lock = InstanceLock(self.path)
+            self.assertTrue(lock.acquire("kill", timeout=0.1, kill_grace=5))
+            self.assertEqual(lock.killed_pid, p.pid)
+            self.assertTrue(p.wait(5) != 0)
+            lock.release()
+
+        finally:
+            if p.poll() is None:
+                p.kill()
+                p.wait()
+            p.stdout.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests for input manifests.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+import jaraf.manifest
+from jaraf.manifest import Manifest
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.items = ["/data/file %d.csv" % i for i in range(1000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data, compress=False):
+        path = os.path.join(self.test_dir, name)
+        with (gzip.open if compress else open)(path, "wb") as fh:
+            fh.write(data)
+        return path
+
+    def test_count(self):
+        """
+        Verify that items are counted correctly, including records split
+        between blocks and blank lines.
+        """
+        data = ("\n\n".join(self.items) + "\n").encode()
+        path = self.write("manifest.txt", data)
+        for block_size in (7, 64, 2 ** 20):
+            with unittest.mock.patch.object(jaraf.manifest, "BLOCK_SIZE",
+                                            block_size):
+                manifest = Manifest(path)
+                self.assertEqual(manifest.count(), 1000)
+                self.assertEqual(list(manifest), self.items)
+
+        with self.assertRaises(ValueError):
+            Manifest("-").count()
+
+    def test_items1(self):
+        """
+        Verify newline and NUL separated manifests, compressed or not.
+        """
+        for (separator, compress) in ((b"\n", False), (b"\0", False),
+                                      (b"\0", True)):
+            data = separator.join(item.encode() for item in self.items)
+            path = self.write("manifest", data, compress)
+            manifest = Manifest(path)
+            self.assertEqual(list(manifest.items()), self.items)
+            self.assertEqual(manifest.count(), 1000)
+            self.assertEqual(manifest.items_read, 1000)
+
+        # An explicit separator keeps newlines in NUL separated items.
+        path = self.write("manifest", b"a\nb\0c")
+        self.assertEqual(list(Manifest(path, separator=b"\0")), ["a\nb", "c"])
+        self.assertEqual(list(Manifest(path, separator=b"\n")), ["a", "b\0c"])
+
+    def test_items2(self):
+        """
+        Verify skipping items, reading the standard input and undecodable
+        file names.
+        """
+        path = self.write("manifest.gz", "\n".join(self.items).encode(),
+                          compress=True)
+        manifest = Manifest(path)
+        self.assertEqual(list(manifest.items(start=990)), self.items[990:])
+        self.assertEqual(manifest.items_read, 10)
+
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(
+            b"x\n\xff\n")))
+        with unittest.mock.patch("sys.stdin", stdin):
+            items = list(Manifest("-"))
+        self.assertEqual(items, ["x", os.fsdecode(b"\xff")])
+        self.assertEqual(os.fsencode(items[1]), b"\xff")
+
+
+if __name__ == "__main__":
+    unittest.main()
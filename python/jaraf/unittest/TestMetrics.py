@@ -0,0 +1,157 @@
+"""
+Unit tests for the metrics classes and exporters.
+"""
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.metrics import (MetricsRegistry,
+                           PrometheusTextfileExporter,
+                           StatsDExporter,
+                           sanitize_name)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_counter(self):
+        """
+        Verify that counter increments from several threads are summed.
+        """
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total")
+
+        def worker():
+            for i in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(0.5)
+
+        self.assertEqual(counter.value, 4000.5)
+        self.assertTrue(registry.counter("test_total") is counter)
+
+    def test_gauge(self):
+        """
+        Verify gauge updates and function gauges.
+        """
+        gauge = MetricsRegistry().gauge("test")
+        gauge.set(5)
+        gauge.inc(2)
+        gauge.dec()
+        self.assertEqual(gauge.value, 6)
+
+        gauge.set_function(lambda: 42)
+        self.assertEqual(gauge.value, 42)
+        gauge.set(1)
+        self.assertEqual(gauge.value, 1)
+
+    def test_histogram(self):
+        """
+        Verify that observations are counted in the right buckets.
+        """
+        histogram = MetricsRegistry().histogram("test", buckets=(1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.value, ([2, 1, 1], 6.0, 4))
+
+    def test_registry(self):
+        """
+        Verify name sanitizing and that a name can't change metric type.
+        """
+        registry = MetricsRegistry()
+        self.assertEqual(sanitize_name("foo.bar-baz"), "foo_bar_baz")
+        self.assertEqual(sanitize_name("1foo"), "_1foo")
+
+        registry.counter("foo")
+        self.assertRaises(ValueError, registry.gauge, "foo")
+        self.assertEqual(registry.snapshot(), {"foo": 0})
+
+    def test_prometheus_textfile(self):
+        """
+        Verify the Prometheus text format output.
+        """
+        registry = MetricsRegistry()
+        registry.counter("records_total", "Records.").inc(3)
+        registry.histogram("latency", buckets=(1,)).observe(0.5)
+
+        path = os.path.join(self.test_dir, "test.prom")
+        PrometheusTextfileExporter(registry, path,
+                                   labels={"app": "test"}).stop()
+
+        with open(path) as fh:
+            lines = fh.read().splitlines()
+
+        self.assertEqual(lines, [
+            "# HELP records_total Records.",
+            "# TYPE records_total counter",
+            'records_total{app="test"} 3',
+            "# TYPE latency histogram",
+            'latency_bucket{app="test",le="1"} 1',
+            'latency_bucket{app="test",le="+Inf"} 1',
+            'latency_sum{app="test"} 0.5',
+            'latency_count{app="test"} 1'])
+
+    def test_statsd(self):
+        """
+        Verify that StatsD packets are sent to a local listener and that
+        counters are sent as deltas.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.settimeout(5)
+        port = listener.getsockname()[1]
+
+        try:
+            registry = MetricsRegistry()
+            counter = registry.counter("records")
+            registry.gauge("queue").set(7)
+            registry.histogram("latency").observe(2)
+
+            exporter = StatsDExporter(registry, "127.0.0.1", port,
+                                      prefix="app.")
+            counter.inc(3)
+            exporter.export()
+            lines = listener.recv(4096).decode().split("\n")
+            self.assertEqual(lines, ["app.records:3|c", "app.queue:7|g",
+                                     "app.latency.count:1|c",
+                                     "app.latency.sum:2|c"])
+
+            counter.inc(2)
+            exporter.stop()
+            lines = listener.recv(4096).decode().split("\n")
+            self.assertEqual(lines, ["app.records:2|c", "app.queue:7|g"])
+
+        finally:
+            listener.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
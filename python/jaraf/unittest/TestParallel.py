@@ -0,0 +1,154 @@
+"""
+Unit tests for the parallel map.
+"""
+
+import itertools
+import os
+import sys
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.parallel import MapStats, parallel_map
+
+
+def _invert(value):
+    return 1.0 / value
+
+
+def _unpicklable(value):
+    if value == 2:
+        return lambda: value
+    return value
+
+
+def _exit(value):
+    if value == 2:
+        time.sleep(0.2)
+        os._exit(1)
+    return value
+
+
+class Test(unittest.TestCase):
+
+    def test_parallel_map1(self):
+        """
+        Verify that ordered results are returned in input order and that
+        failed items are reported without stopping the map.
+        """
+        errors = []
+        stats = MapStats()
+
+        results = list(parallel_map(_invert, [1, 2, 0, 4], workers=2,
+                                    on_error=lambda item, text:
+                                    errors.append((item, text)),
+                                    stats=stats))
+
+        self.assertEqual(results, [1.0, 0.5, 0.25])
+        self.assertEqual([item for (item, text) in errors], [0])
+        self.assertTrue("ZeroDivisionError" in errors[0][1])
+        self.assertEqual((stats.items, stats.failures), (4, 1))
+        self.assertTrue(stats.elapsed > 0)
+
+    def test_parallel_map2(self):
+        """
+        Verify that unordered results are returned as they are completed.
+        """
+        def delay(value):
+            time.sleep(value)
+            return value
+
+        results = list(parallel_map(delay, [0.2, 0.0], workers=2,
+                                    ordered=False))
+        self.assertEqual(results, [0.0, 0.2])
+
+    def test_parallel_map3(self):
+        """
+        Verify that the process backend works with chunks.
+        """
+        stats = MapStats()
+        results = list(parallel_map(_invert, range(1, 11), workers=2,
+                                    backend="process", chunksize=3,
+                                    stats=stats))
+        self.assertEqual(results, [1.0 / value for value in range(1, 11)])
+        self.assertEqual(stats.items, 10)
+
+    def test_parallel_map4(self):
+        """
+        Verify that the input is consumed lazily and that stopping early
+        leaves the rest of the input unread.
+        """
+        counter = itertools.count()
+        items = (next(counter) for i in itertools.count())
+
+        results = parallel_map(lambda value: value, items, workers=2)
+        self.assertEqual(next(counter), 0)
+        self.assertEqual([next(results) for i in range(3)], [1, 2, 3])
+        results.close()
+
+        # One item was read by the test, and at most 2 chunks per worker are
+        # read ahead.
+        self.assertTrue(next(counter) <= 1 + 3 + 4)
+
+    def test_parallel_map6(self):
+        """
+        Verify that every item of a chunk whose results can't be retrieved
+        is reported without stopping the map.
+        """
+        errors = []
+        stats = MapStats()
+
+        results = list(parallel_map(_unpicklable, range(6), workers=2,
+                                    backend="process", chunksize=2,
+                                    on_error=lambda item, text:
+                                    errors.append((item, text)),
+                                    stats=stats))
+
+        self.assertEqual(results, [0, 1, 4, 5])
+        self.assertEqual([item for (item, text) in errors], [2, 3])
+        self.assertTrue("pickle" in errors[0][1])
+        self.assertEqual((stats.items, stats.failures), (6, 2))
+
+    def test_parallel_map7(self):
+        """
+        Verify that the map stops after reporting the chunks in flight when a
+        worker process dies.
+        """
+        errors = []
+        stats = MapStats()
+
+        results = list(parallel_map(_exit, range(100), workers=2,
+                                    backend="process",
+                                    on_error=lambda item, text:
+                                    errors.append((item, text)),
+                                    stats=stats))
+
+        self.assertTrue(2 in [item for (item, text) in errors])
+        self.assertTrue("BrokenProcessPool" in errors[0][1])
+        self.assertEqual(stats.items, len(results) + len(errors))
+        self.assertEqual(stats.failures, len(errors))
+        # Chunks that were completed before the worker died still produce
+        # results, but no more are submitted.
+        self.assertTrue(stats.items <= 2 + 4 + 4)
+
+    def test_parallel_map5(self):
+        """
+        Verify that invalid arguments raise a ValueError immediately.
+        """
+        self.assertRaises(ValueError, parallel_map, _invert, [], backend="foo")
+        self.assertRaises(ValueError, parallel_map, _invert, [], chunksize=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
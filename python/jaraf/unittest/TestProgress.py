@@ -0,0 +1,84 @@
+"""
+Unit tests for progress tracking.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.progress import Progress
+
+
+class Test(unittest.TestCase):
+
+    def test_check_every(self):
+        """
+        Verify that the clock is read far less often than once per item for
+        fast loops.
+        """
+        progress = Progress(range(200000), every_secs=1.0)
+        self.assertEqual(sum(1 for _ in progress), 200000)
+        self.assertEqual(progress.count, 200000)
+        self.assertEqual(progress.total, 200000)
+        self.assertTrue(progress.checks < 1000)
+        self.assertEqual(progress.histogram.count, progress.checks)
+        self.assertTrue(progress.rate > 0)
+        self.assertEqual(progress.eta, 0)
+
+    def test_report(self):
+        """
+        Verify that reports are made every interval with the rate, ETA and
+        per-item time percentiles.
+        """
+        reports = []
+
+        def report(progress):
+            reports.append((progress.count, progress.eta,
+                            progress.percentile(50)))
+
+        progress = Progress(iter(range(40)), total=80, every_secs=0.05,
+                            report=report)
+        for _ in progress:
+            time.sleep(0.005)
+
+        self.assertTrue(2 <= len(reports) <= 8)
+        self.assertEqual(progress.reports, len(reports))
+        (count, eta, p50) = reports[-1]
+        self.assertTrue(0 < count <= 40)
+        self.assertTrue(eta > 0)
+        self.assertTrue(0.004 < p50 < 0.05)
+        self.assertTrue(progress.elapsed >= 0.2)
+
+    def test_unknown_total(self):
+        """
+        Verify that the ETA is unknown without a total, and that the elapsed
+        time stops when the consumer stops early.
+        """
+        progress = Progress(iter(range(100)))
+        self.assertIsNone(progress.total)
+        self.assertEqual(progress.elapsed, 0.0)
+        for item in progress:
+            if item == 9:
+                break
+        self.assertEqual(progress.count, 10)
+        self.assertIsNone(progress.eta)
+        elapsed = progress.elapsed
+        time.sleep(0.01)
+        self.assertEqual(progress.elapsed, elapsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
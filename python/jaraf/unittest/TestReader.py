@@ -0,0 +1,113 @@
+"""
+Unit tests for the chunk-parallel reader.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.parallel import MapStats
+from jaraf.reader import chunk_ranges, map_chunks, reduce_chunks
+
+
+def first_fields(lines):
+    return [line.split(",")[0] for line in lines]
+
+
+def fail_on_empty(lines):
+    if "" in lines:
+        raise ValueError("empty line")
+    return len(lines)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "data.csv")
+        self.lines = ["%d,value %d" % (i, i * i) for i in range(1000)]
+        with open(self.path, "w") as fh:
+            fh.write("\n".join(self.lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_chunk_ranges(self):
+        """
+        Verify that chunks cover the file and end after a newline.
+        """
+        with open(self.path, "rb") as fh:
+            data = fh.read()
+
+        for chunk_size in (1, 10, 1000, 10 ** 6):
+            ranges = chunk_ranges(self.path, chunk_size)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], len(data))
+            for ((_, end), (start, _)) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+                self.assertEqual(data[end - 1:end], b"\n")
+
+        self.assertEqual(len(chunk_ranges(self.path, 10 ** 6)), 1)
+        open(self.path, "w").close()
+        self.assertEqual(chunk_ranges(self.path), [])
+
+    def test_map_chunks(self):
+        """
+        Verify that the lines of every chunk are processed once, in order or
+        not, with both backends.
+        """
+        for backend in ("thread", "process"):
+            results = list(map_chunks(self.path, first_fields, workers=3,
+                                      backend=backend, chunk_size=1000))
+            self.assertTrue(len(results) > 10)
+            self.assertEqual([field for result in results
+                              for field in result],
+                             [str(i) for i in range(1000)])
+
+        results = map_chunks(self.path, first_fields, backend="thread",
+                             chunk_size=1000, ordered=False)
+        fields = sorted(int(field) for result in results for field in result)
+        self.assertEqual(fields, list(range(1000)))
+
+        results = map_chunks(self.path, lambda lines: lines,
+                             backend="thread", encoding=None)
+        self.assertEqual(next(results)[:2], [b"0,value 0", b"1,value 1"])
+
+    def test_reduce_chunks(self):
+        """
+        Verify that chunk results are reduced and that failing chunks are
+        reported.
+        """
+        total = reduce_chunks(self.path, len, lambda total, n: total + n, 0,
+                              chunk_size=500, backend="thread")
+        self.assertEqual(total, 1000)
+
+        with open(self.path, "a") as fh:
+            fh.write("\n\n1,2\n")
+        errors = []
+        stats = MapStats()
+        total = reduce_chunks(self.path, fail_on_empty,
+                              lambda total, n: total + n, 0, chunk_size=500,
+                              on_error=lambda chunk, exc: errors.append(chunk),
+                              stats=stats)
+        self.assertTrue(total < 1000)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(stats.failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Unit tests for the ResourceSampler class.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.sampler import ResourceSampler, SAMPLE_FIELDS, percentile
+
+
+@unittest.skipUnless(ResourceSampler.is_supported(), "requires /proc")
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_percentile(self):
+        """
+        Verify nearest-rank percentiles.
+        """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 50), None)
+
+    def test_sample(self):
+        """
+        Verify that a sample contains sensible values.
+        """
+        sampler = ResourceSampler()
+        sampler._start_time = 0
+        sample = sampler.sample()
+
+        self.assertEqual(sorted(sample), sorted(SAMPLE_FIELDS))
+        self.assertTrue(sample["rss"] > 0)
+        self.assertTrue(sample["threads"] >= 1)
+        self.assertTrue(sample["fds"] >= 3)
+
+    def test_csv(self):
+        """
+        Verify that samples are written to a CSV file and summarized.
+        """
+        path = os.path.join(self.test_dir, "samples.csv")
+        sampler = ResourceSampler(path, interval=0.01)
+        sampler.start()
+        sampler.stop()
+
+        with open(path) as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(lines[0], ",".join(SAMPLE_FIELDS))
+        self.assertEqual(len(lines) - 1, sampler.count)
+        self.assertTrue(sampler.count >= 2)
+
+        summary = sampler.summary()
+        self.assertTrue(summary["rss"]["peak"] >= summary["rss"]["p50"])
+
+    def test_jsonl(self):
+        """
+        Verify that samples are written as JSON lines.
+        """
+        path = os.path.join(self.test_dir, "samples.jsonl")
+        sampler = ResourceSampler(path, interval=0.01)
+        sampler.start()
+        sampler.stop()
+
+        with open(path) as fh:
+            samples = [json.loads(line) for line in fh]
+        self.assertEqual(len(samples), sampler.count)
+        self.assertEqual(sorted(samples[0]), sorted(SAMPLE_FIELDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
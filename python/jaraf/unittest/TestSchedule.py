@@ -0,0 +1,92 @@
+"""
+Unit tests for the service mode schedules.
+"""
+
+import datetime
+import os
+import sys
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.schedule import CronSchedule, IntervalSchedule
+
+
+def _timestamp(*args):
+    return time.mktime(datetime.datetime(*args).timetuple())
+
+
+class Test(unittest.TestCase):
+
+    def test_cron_schedule1(self):
+        """
+        Verify that the next matching minute is returned.
+        """
+        now = _timestamp(2024, 1, 1, 10, 7, 30)
+
+        self.assertEqual(CronSchedule("* * * * *").next_time(None, now),
+                         _timestamp(2024, 1, 1, 10, 8))
+        self.assertEqual(CronSchedule("*/15 * * * *").next_time(None, now),
+                         _timestamp(2024, 1, 1, 10, 15))
+        self.assertEqual(CronSchedule("0 3 * * *").next_time(None, now),
+                         _timestamp(2024, 1, 2, 3, 0))
+        self.assertEqual(CronSchedule("0,30 9-17/4 * * *").next_time(None,
+                                                                     now),
+                         _timestamp(2024, 1, 1, 13, 0))
+        self.assertEqual(CronSchedule("30 2 29 2 *").next_time(None, now),
+                         _timestamp(2024, 2, 29, 2, 30))
+
+    def test_cron_schedule2(self):
+        """
+        Verify the day of week handling. 2024-01-01 is a Monday.
+        """
+        now = _timestamp(2024, 1, 1, 10, 7)
+
+        self.assertEqual(CronSchedule("0 0 * * 0").next_time(None, now),
+                         _timestamp(2024, 1, 7))
+        self.assertEqual(CronSchedule("0 0 * * 7").next_time(None, now),
+                         _timestamp(2024, 1, 7))
+        self.assertEqual(CronSchedule("0 0 * * 1-5").next_time(None, now),
+                         _timestamp(2024, 1, 2))
+
+        # Either the day of month or day of week may match.
+        self.assertEqual(CronSchedule("0 0 15 * 5").next_time(None, now),
+                         _timestamp(2024, 1, 5))
+
+    def test_cron_schedule3(self):
+        """
+        Verify that invalid expressions raise a ValueError.
+        """
+        for expression in ("* * * *", "60 * * * *", "* * 0 * *",
+                           "*/0 * * * *", "5-1 * * * *", "a * * * *"):
+            self.assertRaises(ValueError, CronSchedule, expression)
+
+        self.assertRaises(ValueError, CronSchedule("0 0 31 2 *").next_time,
+                          None, time.time())
+
+    def test_interval_schedule(self):
+        """
+        Verify that the first run is immediate and that missed runs are
+        skipped.
+        """
+        schedule = IntervalSchedule(10)
+
+        self.assertEqual(schedule.next_time(None, 5), 5)
+        self.assertEqual(schedule.next_time(100, 103), 110)
+        self.assertEqual(schedule.next_time(100, 125), 130)
+        self.assertRaises(ValueError, IntervalSchedule, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for deterministic sharding.
+"""
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.shardcli import main
+from jaraf.sharding import shard_items, shard_of, verify_shards
+
+
+class Test(unittest.TestCase):
+
+    def test_main(self):
+        """
+        Verify that the command-line verification reports the shard counts.
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as fh:
+            fh.write("".join("item-%d\n" % i for i in range(100)))
+            fh.flush()
+            with unittest.mock.patch("sys.stdout", new=io.StringIO()) as out:
+                status = main(["--shard-count", "3", fh.name])
+
+            # Running the module must not trigger the runpy warning about a
+            # module imported by its package.
+            output = subprocess.check_output(
+                [sys.executable, "-W", "error", "-m", "jaraf.shardcli",
+                 "--shard-count", "2", fh.name],
+                cwd=_path[:_path.find("/jaraf/")], stderr=subprocess.STDOUT)
+
+        self.assertEqual(status, 0)
+        self.assertIn("shard 2:", out.getvalue())
+        self.assertIn("total: 100 items, 0 missing, 0 duplicated",
+                      out.getvalue())
+        self.assertIn(b"total: 100 items", output)
+
+    def test_shard_items1(self):
+        """
+        Verify that hash shards are stable and don't depend on the other
+        items.
+        """
+        items = ["item-%d" % i for i in range(1000)]
+        shard = list(shard_items(items, 1, 4))
+        self.assertEqual(shard, [item for item in items
+                                 if shard_of(item, 4) == 1])
+        self.assertEqual(list(shard_items(reversed(items), 1, 4)),
+                         shard[::-1])
+        self.assertTrue(200 < len(shard) < 300)
+
+        # CRC32 of the UTF-8 key, which doesn't vary across processes.
+        self.assertEqual(shard_of("item-0", 4), 3)
+        self.assertEqual(shard_of(b"item-0", 4), 3)
+
+        keyed = list(shard_items(enumerate(items), 1, 4,
+                                 key=lambda pair: pair[1]))
+        self.assertEqual([item for (_, item) in keyed], shard)
+
+    def test_shard_items2(self):
+        """
+        Verify that range shards are contiguous and nearly equal.
+        """
+        items = list(range(10))
+        shards = [list(shard_items(items, index, 3, "range"))
+                  for index in range(3)]
+        self.assertEqual(shards, [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(list(shard_items(iter(items), 1, 3, "range",
+                                          total=10)), [4, 5, 6])
+        self.assertEqual(list(shard_items([1], 1, 3, "range")), [])
+
+        # Iterators are counted unless the total is given.
+        self.assertEqual(list(shard_items(iter(items), 1, 3, "range")),
+                         [4, 5, 6])
+        self.assertEqual(list(shard_items((i for i in items), 2, 3,
+                                          "range")), [7, 8, 9])
+        with self.assertRaises(ValueError):
+            shard_items(10, 0, 3, "range")
+        with self.assertRaises(ValueError):
+            shard_items(items, 0, 3, "range", total=-1)
+
+        with self.assertRaises(ValueError):
+            shard_items(items, 3, 3)
+        with self.assertRaises(ValueError):
+            shard_items(items, 0, 3, "modulo")
+
+    def test_verify_shards(self):
+        """
+        Verify that the shards are complete and disjoint, including for
+        duplicate items.
+        """
+        items = ["a", "b", "a"] + [str(i) for i in range(100)]
+        for method in ("hash", "range"):
+            for count in (1, 2, 7, 200):
+                result = verify_shards(items, count, method)
+                self.assertTrue(result["ok"])
+                self.assertEqual(sum(result["counts"]), len(items))
+                self.assertEqual(len(result["counts"]), count)
+
+        result = verify_shards(items, 2, key=lambda item: item[0])
+        self.assertTrue(result["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
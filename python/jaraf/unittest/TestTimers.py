@@ -0,0 +1,229 @@
+"""
+Unit tests for the phase timer classes.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.timers import Histogram, PhaseTimer, TimerRegistry
+
+
+class Test(unittest.TestCase):
+
+    def test_histogram1(self):
+        """
+        Verify that percentiles are within the bucket error of the exact
+        values.
+        """
+        histogram = Histogram()
+        for value in range(1, 10001):
+            histogram.add(value)
+
+        self.assertEqual(histogram.count, 10000)
+        p50 = histogram.percentile(50)
+        p95 = histogram.percentile(95)
+        self.assertTrue(5000 <= p50 <= 5000 * 1.25)
+        self.assertTrue(9500 <= p95 <= 9500 * 1.25)
+
+    def test_histogram2(self):
+        """
+        Verify small values and an empty histogram.
+        """
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), None)
+
+        for value in (0, 1, 2, 3):
+            histogram.add(value)
+        self.assertEqual(histogram.percentile(25), 0)
+        self.assertEqual(histogram.percentile(100), 3)
+
+    def test_phase_timer1(self):
+        """
+        Verify that a timer records counts and durations.
+        """
+        timer = PhaseTimer("test")
+        self.assertEqual(timer.min, None)
+
+        for i in range(3):
+            with timer:
+                time.sleep(0.001)
+
+        self.assertEqual(timer.count, 3)
+        self.assertTrue(timer.total >= 3000000)
+        self.assertTrue(timer.min >= 1000000)
+        self.assertTrue(timer.max >= timer.min)
+        self.assertEqual(timer.histogram.count, 3)
+        self.assertFalse(timer.running)
+
+    def test_phase_timer2(self):
+        """
+        Verify that a timer can be re-entered and used as a decorator.
+        """
+        timer = PhaseTimer("test", cpu=False)
+
+        @timer
+        def recurse(depth):
+            if depth:
+                recurse(depth - 1)
+            return depth
+
+        self.assertEqual(recurse(4), 4)
+        self.assertEqual(timer.count, 5)
+        self.assertEqual(timer.cpu_total, 0)
+
+    def test_phase_timer3(self):
+        """
+        Verify that a timer stops even if an exception is raised.
+        """
+        timer = PhaseTimer("test")
+        try:
+            with timer:
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(timer.count, 1)
+        self.assertFalse(timer.running)
+
+    def test_phase_timer4(self):
+        """
+        Verify that threads sharing a timer each measure their own entries.
+        """
+        timer = PhaseTimer("test")
+
+        def work(secs):
+            for i in range(5):
+                with timer:
+                    time.sleep(secs)
+
+        threads = [threading.Thread(target=work, args=(0.001 * (i + 1),))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(timer.count, 20)
+        self.assertTrue(timer.min >= 1000000)
+        self.assertTrue(timer.max < 40000000)
+
+    def test_phase_timer5(self):
+        """
+        Verify that asyncio tasks sharing a timer each measure their own
+        entries.
+        """
+        timer = PhaseTimer("test")
+
+        async def work(delay):
+            # The first task exits while the second one is running.
+            await asyncio.sleep(delay)
+            with timer:
+                await asyncio.sleep(0.03)
+
+        async def main():
+            await asyncio.gather(work(0), work(0.02))
+            self.assertFalse(timer.running)
+
+        asyncio.run(main())
+        self.assertEqual(timer.count, 2)
+        self.assertTrue(timer.min >= 30000000)
+        self.assertTrue(timer.max < 45000000)
+
+    def test_phase_timer6(self):
+        """
+        Verify that a thread started from a task measures its own entries, and
+        that buffered durations and CPU times are all counted.
+        """
+        timer = PhaseTimer("test", cpu=True)
+
+        def work():
+            for i in range(300):
+                with timer:
+                    pass
+
+        async def main():
+            with timer:
+                await asyncio.to_thread(work)
+
+        asyncio.run(main())
+        self.assertEqual(timer.count, 301)
+        self.assertFalse(timer.running)
+        self.assertTrue(timer.max >= timer.min > 0)
+        self.assertEqual(timer.histogram.count, 301)
+        self.assertTrue(timer.cpu_total > 0)
+
+    def test_phase_timer7(self):
+        """
+        Verify that entering and exiting a timer costs less than a
+        microsecond. This is measured in a new interpreter, without threads
+        left by other tests, using the fastest of many rounds to ignore delays
+        caused by the rest of the system. The check is skipped if even a
+        context manager that only reads the clock is too slow to tell.
+        """
+        script = ("import sys, time; sys.path.insert(0, %r)\n"
+                  "from jaraf.timers import PhaseTimer\n"
+                  "class Baseline(object):\n"
+                  "    def __enter__(self):\n"
+                  "        self.start = time.perf_counter_ns()\n"
+                  "    def __exit__(self, exc_type, exc_value, exc_tb):\n"
+                  "        self.elapsed = time.perf_counter_ns() - self.start\n"
+                  "managers = (PhaseTimer('test'), Baseline())\n"
+                  "best = [float('inf')] * 2\n"
+                  "for i in range(100):\n"
+                  "    for (index, manager) in enumerate(managers):\n"
+                  "        start = time.perf_counter()\n"
+                  "        for j in range(2000):\n"
+                  "            with manager:\n"
+                  "                pass\n"
+                  "        best[index] = min(best[index],\n"
+                  "                          time.perf_counter() - start)\n"
+                  "print(best[0] / 2000, best[1] / 2000)\n"
+                  % _path[:_path.find("/jaraf/")])
+        output = subprocess.check_output([sys.executable, "-c", script])
+        (timer_secs, baseline_secs) = [float(secs)
+                                       for secs in output.split()]
+
+        if baseline_secs > 0.5e-6:
+            self.skipTest("%.3f us per baseline entry" % (baseline_secs * 1e6))
+        self.assertTrue(timer_secs < 1e-6,
+                        "%.3f us per entry" % (timer_secs * 1e6))
+
+    def test_timer_registry(self):
+        """
+        Verify that the registry reuses timers and formats a table.
+        """
+        registry = TimerRegistry()
+        self.assertEqual(registry.table_lines(), [])
+
+        outer = registry.get("outer")
+        self.assertTrue(registry.get("outer") is outer)
+        with outer:
+            with registry.get("inner", cpu=False):
+                pass
+
+        lines = registry.table_lines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("phase"))
+        self.assertTrue(lines[1].startswith("outer"))
+        self.assertTrue(lines[2].startswith("inner"))
+
+
+if __name__ == "__main__":
+    unittest.main()
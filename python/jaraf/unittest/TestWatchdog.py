@@ -0,0 +1,65 @@
+"""
+Unit tests for the stall watchdog.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+##
+# BOOTSTRAP: BEGIN
+#
+# Bootstrapping code to ensure we can find all the right modules. All other
+# local imports should be done after this block.
+##
+_path = os.path.realpath(__file__)
+sys.path.insert(0, _path[:_path.find("/jaraf/")])
+##
+# BOOTSTRAP: END
+##
+
+from jaraf.watchdog import Watchdog
+
+
+class Test(unittest.TestCase):
+
+    def test_check(self):
+        """
+        Verify that a stall is reported once until heartbeats resume.
+        """
+        beats = [time.monotonic()]
+        gaps = []
+        watchdog = Watchdog(10, lambda: beats[-1], gaps.append)
+
+        self.assertFalse(watchdog.check())
+
+        beats.append(time.monotonic() - 20)
+        self.assertTrue(watchdog.check())
+        self.assertTrue(watchdog.check())
+        self.assertEqual(watchdog.stalls, 1)
+        self.assertTrue(gaps[0] >= 20)
+        self.assertTrue(watchdog.max_gap >= 20)
+
+        beats.append(time.monotonic() - 15)
+        self.assertTrue(watchdog.check())
+        self.assertEqual(watchdog.stalls, 2)
+
+    def test_start(self):
+        """
+        Verify that the watchdog thread detects a stall.
+        """
+        last_beat = time.monotonic()
+        gaps = []
+        watchdog = Watchdog(0.05, lambda: last_beat, gaps.append,
+                            interval=0.01)
+        watchdog.start()
+        time.sleep(0.2)
+        watchdog.stop()
+
+        self.assertEqual(watchdog.stalls, 1)
+        self.assertEqual(len(gaps), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
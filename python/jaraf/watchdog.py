@@ -0,0 +1,80 @@
+"""
+Stall watchdog used by the :class:`~jaraf.App` class to detect runs that stop
+making progress.
+"""
+
+import threading
+import time
+
+
+class Watchdog(object):
+    """
+    Thread that checks that heartbeats keep arriving.
+
+    * *timeout* (float): Number of seconds without a heartbeat after which the
+      application is considered stalled.
+    * *last_beat* (callable): Function returning the :func:`time.monotonic()`
+      time of the last heartbeat. Reading the heartbeat through a function
+      keeps the heartbeat itself as cheap as storing a timestamp.
+    * *on_stall* (callable): Called from the watchdog thread with the number
+      of seconds since the last heartbeat when a stall is detected. It is
+      called once per stall, i.e. not again until heartbeats resume.
+    * *interval* (float): Number of seconds between checks, defaulting to a
+      quarter of the timeout (at most 1 second).
+    """
+
+    def __init__(self, timeout, last_beat, on_stall, interval=None):
+        self._timeout = timeout
+        self._last_beat = last_beat
+        self._on_stall = on_stall
+        self._interval = interval or min(timeout / 4.0, 1.0)
+        self._event = threading.Event()
+        self._thread = None
+        self._stalled_beat = None
+        self.max_gap = 0.0
+        self.stalls = 0
+
+    def check(self):
+        """
+        Check the time since the last heartbeat, calling the stall callback if
+        a new stall is detected.
+
+        *Returns:* True if the application is stalled.
+        """
+        last_beat = self._last_beat()
+        gap = time.monotonic() - last_beat
+        if gap > self.max_gap:
+            self.max_gap = gap
+        if gap <= self._timeout:
+            return False
+
+        if last_beat != self._stalled_beat:
+            self._stalled_beat = last_beat
+            self.stalls += 1
+            self._on_stall(gap)
+        return True
+
+    def start(self):
+        """
+        Start the watchdog thread.
+        """
+        self._thread = threading.Thread(target=self._check_loop,
+                                        name="jaraf-watchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the watchdog thread.
+        """
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _check_loop(self):
+        """
+        Check every interval seconds until stopped.
+        """
+        while not self._event.wait(self._interval):
+            self.check()
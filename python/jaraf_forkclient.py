@@ -0,0 +1,109 @@
+"""
+Client of the :mod:`jaraf.forkserver` fork server, installed as the
+``jaraf-fork-client`` command.
+
+This is a top-level module rather than part of the :mod:`jaraf` package so
+that running the client doesn't import the package and its dependencies,
+which is the startup cost the fork server is meant to remove. It must only
+import standard library modules.
+"""
+
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+
+# Generic error exit status, the same as jaraf.codes.AppStatusError.
+STATUS_ERROR = 1
+
+# Request size, child pid and exit status are sent as 4 byte integers.
+INT = struct.Struct("!i")
+
+# Signals forwarded by the client to the child.
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP,
+                     signal.SIGQUIT)
+
+
+def run_client(socket_path, args, stdio=(0, 1, 2)):
+    """
+    * *socket_path* (str): Path of the fork server socket.
+    * *args* (list): Application command-line arguments.
+    * *stdio* (tuple): File descriptors to use as the stdin, stdout and stderr
+      of the application.
+
+    Run an application through a fork server, forwarding SIGINT, SIGTERM,
+    SIGHUP and SIGQUIT to it while it runs (when called from the main thread).
+
+    *Returns:* The application exit status.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    previous_handlers = {}
+    try:
+        sock.connect(socket_path)
+
+        request = json.dumps({"args": list(args),
+                              "cwd": os.getcwd(),
+                              "env": dict(os.environ),
+                              "program": os.path.basename(sys.argv[0])})
+        data = request.encode()
+        socket.send_fds(sock, [INT.pack(len(data)) + data], list(stdio))
+
+        pid = receive_int(sock)
+        if pid is None:
+            return STATUS_ERROR
+
+        if threading.current_thread() is threading.main_thread():
+            def forward(signum, frame):
+                try:
+                    os.kill(pid, signum)
+                except OSError:
+                    pass
+
+            for signum in FORWARDED_SIGNALS:
+                previous_handlers[signum] = signal.signal(signum, forward)
+
+        status = receive_int(sock)
+        return STATUS_ERROR if status is None else status
+
+    finally:
+        for (signum, handler) in previous_handlers.items():
+            signal.signal(signum, handler)
+        sock.close()
+
+
+def client_main(argv=None):
+    """
+    Entry point of the ``jaraf-fork-client`` command, which takes the server
+    socket path followed by the application arguments.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stderr.write("usage: jaraf-fork-client SOCKET [ARGS...]\n")
+        return 2
+
+    try:
+        return run_client(argv[0], argv[1:])
+    except OSError as err:
+        sys.stderr.write("**ERROR** Unable to connect to fork server %s: %s\n"
+                         % (argv[0], err))
+        return STATUS_ERROR
+
+
+def receive_int(sock):
+    """
+    Receive a 4 byte integer, or return None if the connection was closed.
+    """
+    data = b""
+    while len(data) < INT.size:
+        chunk = sock.recv(INT.size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return INT.unpack(data)[0]
+
+
+if __name__ == "__main__":
+    sys.exit(client_main())
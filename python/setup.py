@@ -18,9 +18,15 @@ setuptools.setup(
         "Operating System :: OS Independent"
     ],
     description="A python application framework",
+    entry_points={
+        "console_scripts": [
+            "jaraf-fork-client = jaraf_forkclient:client_main"
+        ]
+    },
     long_description=long_description,
     long_description_content_type="text/markdown",
     packages=setuptools.find_packages(),
+    py_modules=["jaraf_forkclient"],
     url="https://github.com/edlabao/jaraf",
     zip_safe=True
 )